@@ -1,8 +1,8 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, send_file, abort, make_response
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, send_file, send_from_directory, abort, make_response
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
 from flask_cors import CORS
+from flask_caching import Cache
 from datetime import datetime, timedelta
 import json
 import os
@@ -15,11 +15,31 @@ import hashlib
 from collections import defaultdict
 import time
 import sys
+from avatar_store import AvatarProcessor, AvatarError, validate_image, parse_avatar_url, avatar_variant
+from build_assets import BUNDLES, MANIFEST_FILE
+import fragment_cache
+from page_cache import PageCache
+from static_export import SITE_DIR, StaticExporter
+from metrics import MetricsRegistry
+from profiling import sample_stacks, format_collapsed, ProfilerBusy, MemoryTracker, deep_sizeof
+from json_store import JsonStore, Document, StaleWriteError, Unchanged
+from snapshot_store import STORE_FILES, INDEXED_FIELDS, open_store, snapshot_path
+from shared_catalog import CatalogSnapshot, SharedCounters, add_pending, unchanged
+from filter_plan import FilterPlan
+from fuzzy_index import FuzzyIndex
+from search_text import fold, prepare_app, public_app, search_fields
+from unit_of_work import UnitOfWork
+from social_graph import SocialGraph
+from following_feed import FollowingFeed
+from collection_store import CollectionStore
 
 # --- 1. الإعدادات الأساسية للتطبيق ---
 app = Flask(__name__)
 # FIXED: Use absolute path that works on both Windows and Linux
 project_path = os.path.dirname(os.path.abspath(__file__))
+# The store's data (apps_data.json, the user stores, data/, cache/, logs/,
+# exports/); STORE_DATA_DIR points a run (benchmarks, load tests) at a copy
+data_path = os.path.abspath(os.environ.get('STORE_DATA_DIR') or project_path)
 app.config['SECRET_KEY'] = secrets.token_hex(32)
 app.config['UPLOAD_FOLDER'] = 'static/images'
 app.config['AVATAR_FOLDER'] = 'static/images/avatars'
@@ -28,10 +48,50 @@ app.config['SESSION_COOKIE_SECURE'] = False  # Set True in production with HTTPS
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=30)
 app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+# Rendered template fragments (app cards, similar-app strips, review blocks)
+app.config['CACHE_TYPE'] = 'fragment_cache.LRUByteCache'
+app.config['CACHE_FRAGMENT_MAX_BYTES'] = 32 * 1024 * 1024
+app.config['FRAGMENT_CACHE_TIMEOUT'] = 3600
+# Whole-page cache for logged-out visitors (seconds fresh / extra seconds served stale)
+app.config['PAGE_CACHE_FRESH_TTL'] = 30
+app.config['PAGE_CACHE_STALE_TTL'] = 600
+# Per-phase Server-Timing header (off by default) and sampled slow-request log
+app.config['SERVER_TIMING'] = os.environ.get('SERVER_TIMING', '').lower() in ('1', 'true', 'yes')
+app.config['SLOW_REQUEST_LOG'] = os.path.join(data_path, 'logs', 'slow_requests.jsonl')
+app.config['SLOW_REQUEST_THRESHOLD_MS'] = 500
+app.config['SLOW_REQUEST_SAMPLE_RATE'] = 0.25
+# View/download counts shared by all workers in shared memory, written to
+# apps_data.json in batches every COUNTER_FLUSH_SECONDS
+app.config['SHARED_COUNTERS'] = os.environ.get('SHARED_COUNTERS', '1').lower() in ('1', 'true', 'yes')
+app.config['COUNTER_FLUSH_SECONDS'] = 30
+# User records kept decoded per worker (least recently used are dropped;
+# records used in the last USER_CACHE_GRACE_SECONDS never are)
+app.config['USER_CACHE_SIZE'] = int(os.environ.get('USER_CACHE_SIZE', 5000))
+app.config['USER_CACHE_GRACE_SECONDS'] = 60
+# Events of users with more followers than this are merged into feeds when
+# read instead of being copied into every follower's inbox
+app.config['FEED_FANOUT_LIMIT'] = 1000
+app.config['FEED_INBOX_SIZE'] = 500
 
 # Enable CORS for API endpoints
 CORS(app, resources={r"/api/*": {"origins": "*"}})
 
+# Fragment cache; also registers the {% cache %} Jinja tag
+cache = Cache(app)
+
+page_cache = PageCache(os.path.join(data_path, 'cache', 'page_tags'),
+                       fresh_ttl=app.config['PAGE_CACHE_FRESH_TTL'],
+                       stale_ttl=app.config['PAGE_CACHE_STALE_TTL'], logger=app.logger)
+
+# Per-route latency / payload metrics and JSON store I/O, scraped from /metrics
+# (with the METRICS_TOKEN bearer token, or by a logged-in admin)
+metrics = MetricsRegistry(os.path.join(data_path, 'cache', 'metrics'))
+metrics.init_app(app, token=os.environ.get('METRICS_TOKEN'),
+                 allow=lambda: current_user.is_authenticated and current_user.is_admin)
+
+# users/activities/analytics are written once at the end of each request
+unit_of_work = UnitOfWork(app)
+
 # Initialize Flask-Login
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -41,35 +101,141 @@ login_manager.login_view = 'login'
 # --- 2. الدوال المساعدة (Helper Functions) ---
 # تم نقلها هنا عشان تكون مُعرفة قبل استخدامها
 
-def load_apps():
-    """Load apps from the JSON file"""
+_apps_stores = {}
+
+def get_apps_store():
+    """The apps_data.json store (atomic, locked writes shared with the CLI)"""
     # FIXED: Use absolute path for cross-platform compatibility
-    apps_file = os.path.join(project_path, 'apps_data.json')
-    if os.path.exists(apps_file):
+    apps_file = os.path.join(data_path, 'apps_data.json')
+    store = _apps_stores.get(apps_file)
+    if store is None:
+        store = _apps_stores.setdefault(apps_file, JsonStore(
+            apps_file, counters=('views', 'downloads'),
+            dump_kwargs={'indent': 2, 'ensure_ascii': False},
+            on_write=lambda nbytes: metrics.record_io('save_apps', 'write', nbytes),
+            prepare=prepare_app))
+    return store
+
+_catalogs = {}
+
+def get_catalog():
+    """Read-only catalog snapshot of apps_data.json, mmapped by every worker"""
+    snapshot_file = os.path.join(data_path, 'cache', 'catalog.snap')
+    catalog = _catalogs.get(snapshot_file)
+    if catalog is None:
+        catalog = _catalogs.setdefault(snapshot_file, CatalogSnapshot(get_apps_store(), snapshot_file,
+                                                                      logger=app.logger))
+    return catalog
+
+_shared_counters = {}
+
+def get_shared_counters():
+    """Shared-memory view/download counters, or None when disabled/unavailable"""
+    if not app.config['SHARED_COUNTERS']:
+        return None
+    apps_file = os.path.join(data_path, 'apps_data.json')
+    if apps_file not in _shared_counters:
+        # One segment per installation, shared by all of its workers
+        name = 'isc_' + hashlib.sha1(apps_file.encode('utf-8')).hexdigest()[:12]
         try:
-            with open(apps_file, 'r', encoding='utf-8') as f:
-                apps = json.load(f)
-                return apps
-        except json.JSONDecodeError as e:
-            # Log error but return empty list to prevent crashes
-            return []
-    return []
-
-def save_apps(apps):
-    """Save apps to the JSON file"""
-    # FIXED: Use absolute path for cross-platform compatibility
-    apps_file = os.path.join(project_path, 'apps_data.json')
-    with open(apps_file, 'w', encoding='utf-8') as f:
-        json.dump(apps, f, indent=2, ensure_ascii=False)
+            counters = SharedCounters(name, os.path.join(data_path, 'cache', 'counters.lock'),
+                                      flush_seconds=app.config['COUNTER_FLUSH_SECONDS'],
+                                      apply=apply_counter_deltas, logger=app.logger)
+        except OSError as e:
+            app.logger.warning("Shared counters unavailable, writing counts directly: %s", e)
+            counters = None
+        _shared_counters.setdefault(apps_file, counters)
+    return _shared_counters[apps_file]
+
+def apply_counter_deltas(deltas):
+    """Write a batch of pending view/download counts to apps_data.json"""
+    def add_counts(apps):
+        touched = [app for app in apps if app['id'] in deltas]
+        if not touched:
+            raise Unchanged()
+        add_pending(touched, deltas)
+
+    update_apps(add_counts, counters_only=True)
+
+@metrics.timed('load_apps', phase='catalog')
+def load_apps():
+    """Load apps from the JSON file
+
+    Reads go through the shared catalog snapshot and include view/download
+    counts not yet written to the file. A corrupt file raises
+    StoreCorruptError instead of looking like an empty catalog that the next
+    save would write back.
+    """
+    apps = get_catalog().load()
+    metrics.record_io('load_apps', 'read', apps.nbytes)
+    counters = get_shared_counters()
+    pending = counters.pending() if counters is not None else None
+    if pending:
+        # Same counts on the merge base, so saving never writes them twice
+        base = apps.base
+        apps = Document(add_pending(apps, pending), apps.version,
+                        base=lambda: add_pending(base(), pending), nbytes=apps.nbytes)
+    return apps
+
+def get_columns():
+    """Typed catalog columns (with pending view/download counts) for filtering and sorting"""
+    columns = get_catalog().columns()
+    counters = get_shared_counters()
+    return columns.with_counts(counters.pending()) if counters is not None else columns
+
+def find_app(app_id):
+    """One app by id without decoding the whole catalog"""
+    app_data = get_catalog().get(app_id)
+    counters = get_shared_counters()
+    if app_data is not None and counters is not None:
+        add_pending([app_data], counters.pending())
+    return app_data
+
+def count_app_event(app_id, field, current=0):
+    """Add one view/download to an app; returns the new count (``current`` is the count last read)"""
+    counters = get_shared_counters()
+    if counters is not None and counters.add(app_id, field):
+        return current + 1
+
+    def bump(apps):
+        app_item = next((app for app in apps if app['id'] == app_id), None)
+        if not app_item:
+            raise Unchanged(current)
+        app_item[field] = app_item.get(field, 0) + 1
+        return app_item[field]
+
+    return update_apps(bump, counters_only=True)
+
+@metrics.timed('save_apps', phase='persist')
+def save_apps(apps, counters_only=False):
+    """Save apps to the JSON file
+
+    apps loaded with load_apps() are merged onto changes other requests or
+    workers made since (StaleWriteError if both changed the same field).
+    counters_only marks saves that only bump views/downloads; those don't
+    trigger regeneration of the static export.
+    """
+    get_apps_store().save(apps)
+    if not counters_only:
+        static_exporter.schedule()
+
+@metrics.timed('save_apps', phase='persist')
+def update_apps(mutate, counters_only=False):
+    """Apply mutate(apps) to the latest apps under the store lock and save
+
+    Use this for read-modify-write of a few fields (counters, reviews, votes)
+    so concurrent requests never overwrite each other. Returns mutate's
+    result; mutate raises Unchanged(result) to skip the write.
+    """
+    result = get_apps_store().update(mutate)
+    if not counters_only:
+        static_exporter.schedule()
+    return result
 
+@metrics.phase('index')
 def get_categories():
     """Get unique categories from all apps"""
-    apps = load_apps()
-    categories = set()
-    for app_item in apps:
-        if 'category' in app_item:
-            categories.add(app_item['category'])
-    return sorted(list(categories))
+    return [name for name in get_catalog().columns().categories if name]
 
 def log_activity(user_id, activity_type, description):
     """Log user activity"""
@@ -82,10 +248,41 @@ def log_activity(user_id, activity_type, description):
     }
     activities_db[user_id].append(activity)
     activities_db[user_id] = activities_db[user_id][-100:] # Keep last 100
-    # FIXED: Use absolute path for cross-platform compatibility
-    activities_file = os.path.join(project_path, 'activities.json')
-    with open(activities_file, 'w') as f:
-        json.dump(dict(activities_db), f, indent=2)
+    unit_of_work.mark_dirty('activities')
+
+# Feed events and the privacy setting that hides them
+FEED_EVENT_SETTINGS = {'download': 'show_downloads', 'review': None, 'collection': 'show_collections'}
+
+def publish_feed_event(user_id, event_type, **payload):
+    """Put an event in the following feed of the user's followers, unless their settings hide it"""
+    settings = users_db.get(user_id, {}).get('settings', {})
+    setting = FEED_EVENT_SETTINGS[event_type]
+    if not settings.get('profile_public', True) or (setting and not settings.get(setting, True)):
+        return
+    try:
+        get_following_feed().publish(user_id, event_type, **payload)
+    except Exception:
+        # The feed is secondary; never fail the action itself
+        app.logger.exception("Failed to publish %s event of %s", event_type, user_id)
+
+def save_users():
+    """Write users_db back to its snapshot (once, at the end of the request)"""
+    unit_of_work.mark_dirty('users')
+
+@unit_of_work.store('users')
+@metrics.timed('save_users', phase='persist')
+def write_users():
+    metrics.record_io('save_users', 'write', users_db.save())
+
+@unit_of_work.store('activities')
+@metrics.timed('save_activities', phase='persist')
+def write_activities():
+    metrics.record_io('save_activities', 'write', activities_db.save())
+
+@unit_of_work.store('analytics')
+@metrics.timed('save_analytics', phase='persist')
+def write_analytics():
+    metrics.record_io('save_analytics', 'write', analytics_db.save())
 
 def send_notification(user_id, title, message, type='info'):
     """Send notification to user"""
@@ -103,10 +300,11 @@ def send_notification(user_id, title, message, type='info'):
         }
         users_db[user_id]['notifications'].append(notification)
         users_db[user_id]['notifications'] = users_db[user_id]['notifications'][-50:] # Keep last 50
-        # FIXED: Use absolute path for cross-platform compatibility
-        users_file = os.path.join(project_path, 'users.json')
-        with open(users_file, 'w') as f:
-            json.dump(users_db, f, indent=2)
+        save_users()
+
+def referenced_avatar_digests():
+    """Content hashes of every avatar still assigned to a user"""
+    return {parse_avatar_url(u.get('avatar')) for _, u in users_db.scan()} - {None}
 
 def allowed_file(filename):
     """Check if file has allowed extension"""
@@ -126,71 +324,184 @@ def admin_required(f):
 
 # --- 3. تحميل البيانات من ملفات JSON ---
 
-# FIXED: Use absolute paths for all JSON file loading
-users_db = {}
-users_file = os.path.join(project_path, 'users.json')
-if os.path.exists(users_file):
-    with open(users_file, 'r') as f:
-        users_db = json.load(f)
-
-collections_db = {}
-collections_file = os.path.join(project_path, 'collections.json')
-if os.path.exists(collections_file):
-    with open(collections_file, 'r') as f:
-        collections_db = json.load(f)
-
-activities_db = defaultdict(list)
-activities_file = os.path.join(project_path, 'activities.json')
-if os.path.exists(activities_file):
-    with open(activities_file, 'r') as f:
-        activities_db = defaultdict(list, json.load(f))
-
-analytics_db = defaultdict(lambda: defaultdict(int))
-analytics_file = os.path.join(project_path, 'analytics.json')
-if os.path.exists(analytics_file):
-    with open(analytics_file, 'r') as f:
-        loaded_data = json.load(f)
-        for key, value in loaded_data.items():
-            analytics_db[key] = defaultdict(int, value)
+def open_record_store(name, **kwargs):
+    """Open data/<name>.snap lazily, importing <name>.json first if it changed outside the app"""
+    # FIXED: Use absolute paths for all JSON file loading
+    return open_store(os.path.join(data_path, STORE_FILES[name]), snapshot_path(data_path, name),
+                      logger=app.logger, indexed_fields=INDEXED_FIELDS.get(name, ()), **kwargs)
+
+users_db = open_record_store('users', max_loaded=app.config['USER_CACHE_SIZE'],
+                             evict_after=app.config['USER_CACHE_GRACE_SECONDS'])
+activities_db = open_record_store('activities', default_factory=list)
+analytics_db = open_record_store('analytics', default_factory=lambda: defaultdict(int),
+                                 wrap=lambda counts: defaultdict(int, counts))
+
+_social_stores = {}
+
+def get_social_stores():
+    """
+    (SocialGraph, FollowingFeed, CollectionStore) over data/social.db,
+    opened on first use. Follows and collections moved there from users.json
+    and collections.json (or its last snapshot), which are imported once.
+    """
+    db_file = os.path.join(data_path, 'data', 'social.db')
+    stores = _social_stores.get(db_file)
+    if stores is None:
+        graph = SocialGraph(db_file)
+        graph.import_once('users.json', (
+            edge for user_id, user in users_db.scan()
+            for edge in [*((user_id, other) for other in user.get('following', [])),
+                         *((other, user_id) for other in user.get('followers', []))]))
+        feed = FollowingFeed(graph, fanout_limit=app.config['FEED_FANOUT_LIMIT'],
+                             inbox_size=app.config['FEED_INBOX_SIZE'])
+        collections = CollectionStore(graph)
+        collections.import_once('collections.json', lambda: (
+            collection for _, collection in open_store(os.path.join(data_path, 'collections.json'),
+                                                       snapshot_path(data_path, 'collections'),
+                                                       logger=app.logger).scan()))
+        stores = _social_stores.setdefault(db_file, (graph, feed, collections))
+    return stores
+
+def get_social_graph():
+    return get_social_stores()[0]
+
+def get_following_feed():
+    return get_social_stores()[1]
+
+def get_collection_store():
+    return get_social_stores()[2]
+
+avatar_processor = AvatarProcessor(os.path.join(project_path, app.config['AVATAR_FOLDER']),
+                                   referenced_digests=referenced_avatar_digests, logger=app.logger)
+
+@app.template_filter('avatar_size')
+def avatar_size_filter(url, size='md'):
+    """Pick a fixed-size variant of a processed avatar (sm/md/lg)"""
+    return avatar_variant(url, size)
+
+_asset_manifest = {'mtime': None, 'entries': {}}
+
+def load_asset_manifest():
+    """Fingerprinted bundle names written by build_assets.py (reloaded when rebuilt)"""
+    try:
+        mtime = os.path.getmtime(MANIFEST_FILE)
+    except OSError:
+        return {}
+    if mtime != _asset_manifest['mtime']:
+        with open(MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            _asset_manifest['entries'] = json.load(f)
+        _asset_manifest['mtime'] = mtime
+    return _asset_manifest['entries']
+
+@app.template_global()
+def asset_urls(name):
+    """URLs for a bundle: the built file when available, otherwise its source files"""
+    manifest = load_asset_manifest()
+    if name in manifest:
+        return [url_for('dist_asset', filename=manifest[name])]
+    return [url_for('static', filename=source) for source in BUNDLES.get(name, [])]
+
+@app.template_global()
+def fragment_key(*items):
+    """Vary-on key for {% cache %} blocks: app ids + revisions and the theme cookie"""
+    return fragment_cache.fragment_key(*items, theme=request.cookies.get('theme', 'light'))
+
+@app.template_global()
+def reviews_key(app_data):
+    """Vary-on key for an app's review block"""
+    return fragment_cache.fragment_key(app_data.get('id'), fragment_cache.reviews_revision(app_data),
+                                       theme=request.cookies.get('theme', 'light'))
+
+@app.route('/static/dist/<path:filename>')
+def dist_asset(filename):
+    """Serve built bundles, preferring the precompressed .br/.gz copies"""
+    dist_dir = os.path.join(app.static_folder, 'dist')
+    mimetype = mimetypes.guess_type(filename)[0]
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if encoding in request.accept_encodings and os.path.exists(os.path.join(dist_dir, filename + suffix)):
+            response = send_from_directory(dist_dir, filename + suffix, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(dist_dir, filename, mimetype=mimetype)
+    response.headers['Vary'] = 'Accept-Encoding'
+    # File names change whenever the content does
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+@app.after_request
+def add_cache_headers(response):
+    """Content-addressed files never change, so let browsers and CDNs keep them"""
+    if request.path.startswith(f"/{app.config['AVATAR_FOLDER']}/") and parse_avatar_url(request.path):
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
 
 
 # --- 4. تعريف كلاس المستخدم وإعدادات LoginManager ---
 
+def _user_field(name, default=None, factory=None):
+    """Property reading ``name`` from the user's record; assigning it writes the record"""
+    def get(self):
+        record = self.record
+        if name in record:
+            return record[name]
+        return factory() if factory else default
+
+    def set(self, value):
+        self.record[name] = value
+
+    return property(get, set)
+
+
 class User(UserMixin):
-    def __init__(self, id, username, email):
+    """
+    The logged-in user as a view over its users_db record. Nothing is read
+    when it's created (once per request); the record is fetched on first use
+    and its lists are the record's own, not copies.
+    """
+
+    def __init__(self, id, username=None, email=None):
         self.id = id
-        self.username = username
-        self.email = email
-        self.is_admin = users_db.get(id, {}).get('is_admin', False)
-        self.avatar = users_db.get(id, {}).get('avatar', None)
-        self.bio = users_db.get(id, {}).get('bio', '')
-        self.favorites = users_db.get(id, {}).get('favorites', [])
-        self.wishlist = users_db.get(id, {}).get('wishlist', [])
-        self.downloads_history = users_db.get(id, {}).get('downloads_history', [])
-        self.followers = users_db.get(id, {}).get('followers', [])
-        self.following = users_db.get(id, {}).get('following', [])
+        self._record = None
+
+    @property
+    def record(self):
+        if self._record is None:
+            self._record = users_db.get(self.id) or {}
+        return self._record
+
+    username = _user_field('username')
+    email = _user_field('email')
+    is_admin = _user_field('is_admin', False)
+    avatar = _user_field('avatar')
+    bio = _user_field('bio', '')
+    favorites = _user_field('favorites', factory=list)
+    wishlist = _user_field('wishlist', factory=list)
+    downloads_history = _user_field('downloads_history', factory=list)
 
 @login_manager.user_loader
 def load_user(user_id):
-    if user_id in users_db:
-        user_data = users_db[user_id]
-        return User(user_id, user_data['username'], user_data['email'])
-    return None
+    return User(user_id) if user_id in users_db else None
 
 
 # --- 5. مسارات الموقع (Routes) ---
 
 @app.route('/')
+@page_cache.cached(tags=['catalog', 'listings'])
 def index():
-    apps = load_apps()
-    # Exclude Premium Unlocked apps from regular sections
-    regular_apps = [app for app in apps if app.get('category') != 'Premium Unlocked']
+    columns = get_columns()
     categories = get_categories()
-    featured_apps = [app for app in regular_apps if app.get('featured', False)][:6]
-    trending_apps = sorted(regular_apps, key=lambda x: x.get('downloads', 0), reverse=True)[:6]
-    recent_apps = sorted(regular_apps, key=lambda x: x.get('added_date', ''), reverse=True)[:6]
-    # Check if there are any premium unlocked apps
-    has_premium_apps = any(app.get('category') == 'Premium Unlocked' for app in apps)
+    with metrics.phase('index'):
+        # Exclude Premium Unlocked apps from regular sections
+        regular = columns.mask(exclude_category='Premium Unlocked')
+        featured = columns.positions(columns.mask(exclude_category='Premium Unlocked', featured=True))[:6]
+        trending = columns.order('downloads', regular, descending=True, limit=6)
+        recent = columns.order('added', regular, descending=True, limit=6)
+        # Check if there are any premium unlocked apps
+        has_premium_apps = columns.any(columns.mask(category='Premium Unlocked'))
+    # Only the apps on the page are decoded
+    featured_apps, trending_apps, recent_apps = (
+        [find_app(columns.ids[i]) for i in section] for section in (featured, trending, recent))
     return render_template('index.html',
                          featured_apps=featured_apps,
                          trending_apps=trending_apps,
@@ -200,12 +511,20 @@ def index():
 
 @app.route('/app/<app_id>')
 def app_detail(app_id):
+    # Served from the page cache or rendered; unknown apps 404 (never cached) before anything is counted,
+    # and a stale copy only counts if its app still exists
+    response = make_response(render_app_detail(app_id))
+    if response.status_code == 200 and (response.headers.get('X-Cache') != 'STALE' or find_app(app_id)):
+        count_app_event(app_id, 'views')
+    return response
+
+@page_cache.cached(tags=lambda app_id: ['catalog', f'app:{app_id}'])
+def render_app_detail(app_id):
     apps = load_apps()
-    app_data = next((app for app in apps if app['id'] == app_id), None)
+    with metrics.phase('index'):
+        app_data = next((app for app in apps if app['id'] == app_id), None)
     if not app_data:
         abort(404, description="App not found")
-    app_data['views'] = app_data.get('views', 0) + 1
-    save_apps(apps)
     # For Premium Unlocked apps, only show similar Premium Unlocked apps
     if app_data.get('category', '').lower() == 'premium unlocked':
         similar_apps = [app for app in apps
@@ -224,6 +543,7 @@ def app_detail(app_id):
     return render_template('app_detail.html', app=app_data, similar_apps=similar_apps)
 
 @app.route('/category/<category_name>')
+@page_cache.cached(tags=['catalog', 'listings'])
 def category(category_name):
     apps = load_apps()
     # For Premium Unlocked, use special template
@@ -233,54 +553,64 @@ def category(category_name):
                              apps=premium_apps,
                              categories=get_categories())
     # For regular categories, exclude Premium Unlocked apps
-    category_apps = [app for app in apps
-                    if app.get('category', '').lower() == category_name.lower()
-                    and app.get('category', '').lower() != 'premium unlocked']
+    with metrics.phase('index'):
+        category_apps = [app for app in apps
+                        if app.get('category', '').lower() == category_name.lower()
+                        and app.get('category', '').lower() != 'premium unlocked']
     return render_template('category.html',
                          category=category_name,
                          apps=category_apps,
                          categories=get_categories())
 
 @app.route('/search')
+@page_cache.cached(tags=['catalog', 'listings'])
 def search():
     query = request.args.get('q', '').lower()
+    folded = fold(query)
+    fuzzy = False
     apps = load_apps()
-    # By default, exclude Premium Unlocked unless specifically searched
-    if query:
-        # If searching for "premium" or "unlocked", include Premium Unlocked apps
-        if 'premium' in query or 'unlocked' in query or 'mod' in query:
-            results = [app for app in apps if
-                       query in app.get('name', '').lower() or
-                       query in app.get('developer', '').lower() or
-                       query in app.get('description', '').lower() or
-                       query in app.get('category', '').lower() or
-                       query in app.get('mod_features', '').lower()]
+    with metrics.phase('index'):
+        # By default, exclude Premium Unlocked unless specifically searched
+        if folded:
+            # If searching for "premium" or "unlocked", include Premium Unlocked apps
+            if 'premium' in folded or 'unlocked' in folded or 'mod' in folded:
+                fields = ('name', 'developer', 'description', 'category', 'mod_features')
+                results = [app for app in apps
+                           if any(folded in search_fields(app)[field] for field in fields)]
+            else:
+                # Otherwise exclude Premium Unlocked apps
+                fields = ('name', 'developer', 'description', 'category')
+                results = []
+                for app in apps:
+                    text = search_fields(app)
+                    if text['category'] != 'premium unlocked' and any(folded in text[field] for field in fields):
+                        results.append(app)
+            if not results:
+                # Nothing contains the query: show apps with close spellings of its words
+                include_premium = 'premium' in folded or 'unlocked' in folded or 'mod' in folded
+                index = get_catalog().derived('fuzzy', FuzzyIndex.from_apps, recount=unchanged)
+                for app_id, _ in index.search(folded, limit=50):
+                    app_data = find_app(app_id)
+                    if app_data and (include_premium or search_fields(app_data)['category'] != 'premium unlocked'):
+                        results.append(app_data)
+                fuzzy = bool(results)
         else:
-            # Otherwise exclude Premium Unlocked apps
-            results = [app for app in apps if
-                       (query in app.get('name', '').lower() or
-                        query in app.get('developer', '').lower() or
-                        query in app.get('description', '').lower() or
-                        query in app.get('category', '').lower()) and
-                       app.get('category', '').lower() != 'premium unlocked']
-    else:
-        # Show all regular apps except Premium Unlocked
-        results = [app for app in apps if app.get('category', '').lower() != 'premium unlocked']
+            # Show all regular apps except Premium Unlocked
+            results = [app for app in apps if app.get('category', '').lower() != 'premium unlocked']
     return render_template('search.html',
                          query=query,
                          results=results,
+                         fuzzy=fuzzy,
                          categories=get_categories())
 
 @app.route('/api/download/<app_id>', methods=['POST'])
 def download_app(app_id):
-    apps = load_apps()
-    app_data = next((app for app in apps if app['id'] == app_id), None)
+    app_data = find_app(app_id)
     if not app_data:
         return jsonify({'error': 'App not found'}), 404
 
     # Increment download count
-    app_data['downloads'] = app_data.get('downloads', 0) + 1
-    save_apps(apps)
+    app_data['downloads'] = count_app_event(app_id, 'downloads', app_data.get('downloads', 0))
 
     # Track download in user's history if logged in
     if current_user.is_authenticated:
@@ -303,13 +633,12 @@ def download_app(app_id):
                 }
                 users_db[user_id]['downloads_history'].append(download_record)
 
-                # FIXED: Use absolute path for cross-platform compatibility
-                users_file = os.path.join(project_path, 'users.json')
-                with open(users_file, 'w') as f:
-                    json.dump(users_db, f, indent=2)
+                save_users()
 
                 # Log activity
                 log_activity(user_id, 'download', f"Downloaded {app_data.get('name', 'app')}")
+                publish_feed_event(user_id, 'download', app_id=app_id, app_name=app_data.get('name'),
+                                   app_icon=app_data.get('icon'))
 
     has_file = bool(app_data.get('app_file'))
     return jsonify({
@@ -361,10 +690,6 @@ def download_file(app_id):
 @app.route('/api/review/<app_id>', methods=['POST'])
 @login_required
 def add_review(app_id):
-    apps = load_apps()
-    app_data = next((app for app in apps if app['id'] == app_id), None)
-    if not app_data:
-        return jsonify({'error': 'App not found'}), 404
     data = request.json
     review = {
         'id': str(uuid.uuid4()),  # Add unique ID for each review
@@ -376,13 +701,25 @@ def add_review(app_id):
         'helpful_votes': 0,  # Initialize helpful votes
         'voted_users': []  # Track who voted to prevent duplicate votes
     }
-    if 'reviews' not in app_data:
-        app_data['reviews'] = []
-    app_data['reviews'].append(review)
-    ratings = [r['rating'] for r in app_data['reviews']]
-    app_data['rating'] = sum(ratings) / len(ratings)
-    app_data['review_count'] = len(app_data['reviews'])
-    save_apps(apps)
+
+    def append_review(apps):
+        app_data = next((app for app in apps if app['id'] == app_id), None)
+        if not app_data:
+            raise Unchanged(False)
+        if 'reviews' not in app_data:
+            app_data['reviews'] = []
+        app_data['reviews'].append(review)
+        ratings = [r['rating'] for r in app_data['reviews']]
+        app_data['rating'] = sum(ratings) / len(ratings)
+        app_data['review_count'] = len(app_data['reviews'])
+        return {'name': app_data.get('name'), 'icon': app_data.get('icon')}
+
+    app_data = update_apps(append_review)
+    if not app_data:
+        return jsonify({'error': 'App not found'}), 404
+    page_cache.invalidate(f'app:{app_id}', 'listings')
+    publish_feed_event(current_user.id, 'review', app_id=app_id, app_name=app_data.get('name'),
+                       app_icon=app_data.get('icon'), rating=review['rating'], comment=review['comment'][:280])
     return jsonify({'success': True, 'review': review})
 
 @app.route('/api/reviews/<app_id>')
@@ -411,13 +748,8 @@ def login():
     if request.method == 'POST':
         username = request.form.get('username')
         password = request.form.get('password')
-        user_data = None
-        user_id = None
-        for uid, udata in users_db.items():
-            if udata['username'] == username:
-                user_data = udata
-                user_id = uid
-                break
+        user_id = users_db.find('username', username)
+        user_data = users_db[user_id] if user_id is not None else None
         if user_data and check_password_hash(user_data.get('password', ''), password):
             user = User(user_id, user_data['username'], user_data['email'])
             login_user(user)
@@ -431,10 +763,9 @@ def register():
         username = request.form.get('username')
         email = request.form.get('email')
         password = request.form.get('password')
-        for uid, udata in users_db.items():
-            if udata['username'] == username:
-                flash('Username already exists', 'error')
-                return render_template('register.html')
+        if users_db.find('username', username) is not None:
+            flash('Username already exists', 'error')
+            return render_template('register.html')
         user_id = str(len(users_db) + 1)
         users_db[user_id] = {
             'username': username,
@@ -442,10 +773,7 @@ def register():
             'password': generate_password_hash(password),
             'created_at': datetime.now().isoformat()
         }
-        # FIXED: Use absolute path for cross-platform compatibility
-        users_file = os.path.join(project_path, 'users.json')
-        with open(users_file, 'w') as f:
-            json.dump(users_db, f, indent=2)
+        save_users()
         user = User(user_id, username, email)
         login_user(user)
         return redirect(url_for('index'))
@@ -471,7 +799,7 @@ def firebase_auth():
         username = display_name if display_name else email.split('@')[0]
         base_username = username
         counter = 1
-        while any(u['username'] == username for u in users_db.values()):
+        while users_db.find('username', username) is not None:
             username = f"{base_username}{counter}"
             counter += 1
         users_db[user_id] = {
@@ -490,9 +818,7 @@ def firebase_auth():
         users_db[user_id]['photo_url'] = photo_url
         users_db[user_id]['last_login'] = datetime.now().isoformat()
 
-    users_file = os.path.join(project_path, 'users.json')
-    with open(users_file, 'w') as f:
-        json.dump(users_db, f, indent=2)
+    save_users()
 
     user = User(user_id, users_db[user_id]['username'], email)
     login_user(user, remember=True)
@@ -510,19 +836,16 @@ def firebase_logout():
 @app.route('/api/favorite/<app_id>', methods=['POST'])
 @login_required
 def toggle_favorite(app_id):
-    if not hasattr(current_user, 'favorites'):
-        current_user.favorites = []
-    if app_id in current_user.favorites:
-        current_user.favorites.remove(app_id)
+    favorites = current_user.favorites
+    if app_id in favorites:
+        favorites.remove(app_id)
         favorited = False
     else:
-        current_user.favorites.append(app_id)
+        favorites.append(app_id)
         favorited = True
     if current_user.id in users_db:
-        users_db[current_user.id]['favorites'] = current_user.favorites
-        users_file = os.path.join(project_path, 'users.json')
-        with open(users_file, 'w') as f:
-            json.dump(users_db, f, indent=2)
+        users_db[current_user.id]['favorites'] = favorites
+        save_users()
     return jsonify({'favorited': favorited})
 
 @app.route('/favorites')
@@ -569,11 +892,10 @@ def user_profile(user_id):
             if review.get('user_id') == user_id:
                 user_reviews.append({**review, 'app_name': app['name'], 'app_icon': app.get('icon'), 'app_id': app['id']})
 
-    # Fetch user collections
-    user_collections = [c for c in collections_db.values() if c['user_id'] == user_id]
+    # Fetch user collections (counts and preview strips are stored with them)
+    user_collections = get_collection_store().for_user(user_id)
     for collection in user_collections:
-        collection['apps_count'] = len(collection.get('apps', []))
-        collection['preview_apps'] = [app for app in apps if app['id'] in collection.get('apps', [])]
+        collection['preview_apps'] = [app for app in map(find_app, collection['preview']) if app]
 
     # Fetch user wishlist
     user_wishlist = [app for app in apps if app['id'] in user_data.get('wishlist', [])]
@@ -581,6 +903,8 @@ def user_profile(user_id):
     # Fetch user activities
     user_activities = activities_db.get(user_id, [])
 
+    follow_counts = get_social_graph().counts(user_id)
+
     # Get user settings
     user_settings = user_data.get('settings', {
         'profile_public': True,
@@ -603,8 +927,9 @@ def user_profile(user_id):
         'downloads_count': len(user_data.get('downloads_history', [])),
         'reviews_count': len(user_reviews),
         'favorites_count': len(user_data.get('favorites', [])),
-        'followers_count': len(user_data.get('followers', [])),
-        'following_count': len(user_data.get('following', []))
+        'followers_count': follow_counts['followers'],
+        'following_count': follow_counts['following'],
+        'is_followed': current_user.is_authenticated and get_social_graph().is_following(current_user.id, user_id)
     }
 
     return render_template('profile.html',
@@ -627,9 +952,7 @@ def update_profile():
         users_db[user_id]['bio'] = data.get('bio', '')
         users_db[user_id]['location'] = data.get('location', '')
         users_db[user_id]['website'] = data.get('website', '')
-        users_file = os.path.join(project_path, 'users.json')
-        with open(users_file, 'w') as f:
-            json.dump(users_db, f, indent=2)
+        save_users()
         log_activity(user_id, 'profile_update', 'Updated profile information')
         return jsonify({'success': True})
     return jsonify({'success': False, 'error': 'User not found'}), 404
@@ -646,44 +969,39 @@ def upload_avatar():
         return jsonify({'success': False, 'error': 'No file selected'}), 400
     
     if file and allowed_file(file.filename):
-        # Generate unique filename
-        file_ext = file.filename.rsplit('.', 1)[1].lower()
-        filename = f"{current_user.id}_{uuid.uuid4().hex[:8]}.{file_ext}"
-        filename = secure_filename(filename)
-        
-        # Ensure avatar directory exists
-        avatar_dir = os.path.join(project_path, app.config['AVATAR_FOLDER'])
-        os.makedirs(avatar_dir, exist_ok=True)
-        
-        # Save the file
-        filepath = os.path.join(avatar_dir, filename)
-        file.save(filepath)
-        
-        # Delete old avatar if exists
-        old_avatar = users_db.get(current_user.id, {}).get('avatar')
-        if old_avatar:
-            old_path = os.path.join(project_path, old_avatar)
-            if os.path.exists(old_path) and 'default' not in old_avatar:
-                try:
-                    os.remove(old_path)
-                except:
-                    pass  # Ignore errors when deleting old avatar
-        
-        # Update user data
+        data = file.read()
+        try:
+            validate_image(data)
+        except AvatarError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+
+        user_id = current_user.id
+        old_avatar = users_db.get(user_id, {}).get('avatar')
+
+        def on_avatar_ready(digest, filename):
+            # Runs on the avatar worker once every size variant is on disk
+            new_avatar = f"/{app.config['AVATAR_FOLDER']}/{filename}"
+            if user_id in users_db:
+                users_db[user_id]['avatar'] = new_avatar
+                save_users()
+            if old_avatar and old_avatar != new_avatar:
+                avatar_processor.retire(old_avatar)
+
+        def on_avatar_failed(digest, error):
+            # The upload was already accepted; the user keeps their old avatar
+            app.logger.error("Avatar %s of user %s could not be processed", digest, user_id, exc_info=error)
+
+        # Resizing happens off the request thread; the URL is known up front
+        filename, pending = avatar_processor.submit(data, on_done=on_avatar_ready, on_error=on_avatar_failed)
         avatar_url = f"/{app.config['AVATAR_FOLDER']}/{filename}"
-        users_db[current_user.id]['avatar'] = avatar_url
-        
-        # Save to database
-        users_file = os.path.join(project_path, 'users.json')
-        with open(users_file, 'w') as f:
-            json.dump(users_db, f, indent=2)
-        
+
         # Log activity
-        log_activity(current_user.id, 'avatar_upload', 'Updated profile picture')
-        
+        log_activity(user_id, 'avatar_upload', 'Updated profile picture')
+
         return jsonify({
             'success': True,
             'avatar_url': avatar_url,
+            'pending': pending,
             'message': 'Avatar uploaded successfully!'
         })
     
@@ -696,23 +1014,13 @@ def remove_avatar():
     user_id = current_user.id
     
     if user_id in users_db:
-        # Delete current avatar file if exists
+        # Remove avatar from user data; the file is deleted in the next cleanup batch
         current_avatar = users_db[user_id].get('avatar')
-        if current_avatar and 'default' not in current_avatar:
-            avatar_path = os.path.join(project_path, current_avatar.lstrip('/'))
-            if os.path.exists(avatar_path):
-                try:
-                    os.remove(avatar_path)
-                except:
-                    pass
-        
-        # Remove avatar from user data
         users_db[user_id]['avatar'] = None
+        avatar_processor.retire(current_avatar)
         
         # Save to database
-        users_file = os.path.join(project_path, 'users.json')
-        with open(users_file, 'w') as f:
-            json.dump(users_db, f, indent=2)
+        save_users()
         
         # Log activity
         log_activity(user_id, 'avatar_remove', 'Removed profile picture')
@@ -730,9 +1038,7 @@ def add_to_wishlist(app_id):
             users_db[user_id]['wishlist'] = []
         if app_id not in users_db[user_id]['wishlist']:
             users_db[user_id]['wishlist'].append(app_id)
-            users_file = os.path.join(project_path, 'users.json')
-            with open(users_file, 'w') as f:
-                json.dump(users_db, f, indent=2)
+            save_users()
             log_activity(user_id, 'wishlist_add', f'Added app to wishlist')
             return jsonify({'success': True, 'added': True})
         else:
@@ -746,9 +1052,7 @@ def remove_from_wishlist(app_id):
     if user_id in users_db:
         if 'wishlist' in users_db[user_id] and app_id in users_db[user_id]['wishlist']:
             users_db[user_id]['wishlist'].remove(app_id)
-            users_file = os.path.join(project_path, 'users.json')
-            with open(users_file, 'w') as f:
-                json.dump(users_db, f, indent=2)
+            save_users()
             return jsonify({'success': True})
     return jsonify({'success': False}), 404
 
@@ -756,31 +1060,22 @@ def remove_from_wishlist(app_id):
 @login_required
 def create_collection():
     data = request.json
-    collection_id = str(uuid.uuid4())
-    collection = {
-        'id': collection_id,
-        'user_id': current_user.id,
-        'name': data.get('name', 'Untitled Collection'),
-        'description': data.get('description', ''),
-        'apps': data.get('apps', []),
-        'created_at': datetime.now().isoformat(),
-        'updated_at': datetime.now().isoformat(),
-        'is_public': data.get('is_public', True)
-    }
-    collections_db[collection_id] = collection
-    collections_file = os.path.join(project_path, 'collections.json')
-    with open(collections_file, 'w') as f:
-        json.dump(collections_db, f, indent=2)
+    collection = get_collection_store().create(current_user.id, data.get('name', 'Untitled Collection'),
+                                               description=data.get('description', ''), apps=data.get('apps', []),
+                                               is_public=data.get('is_public', True))
+    collection_id = collection['id']
     log_activity(current_user.id, 'collection_create', f'Created collection: {collection["name"]}')
+    if collection['is_public']:
+        publish_feed_event(current_user.id, 'collection', collection_id=collection_id,
+                           collection_name=collection['name'], apps_count=collection['apps_count'])
     return jsonify({'success': True, 'collection_id': collection_id})
 
 @app.route('/collection/<collection_id>')
 def view_collection(collection_id):
-    if collection_id not in collections_db:
+    collection = get_collection_store().get(collection_id)
+    if collection is None:
         abort(404)
-    collection = collections_db[collection_id]
-    apps = load_apps()
-    collection_apps = [app for app in apps if app['id'] in collection['apps']]
+    collection_apps = [app for app in map(find_app, collection['apps']) if app]
     return render_template('collection.html', collection=collection, apps=collection_apps)
 
 @app.route('/api/user/<user_id>/follow', methods=['POST'])
@@ -790,21 +1085,71 @@ def follow_user(user_id):
         return jsonify({'success': False, 'error': 'Cannot follow yourself'}), 400
     if user_id not in users_db:
         return jsonify({'success': False, 'error': 'User not found'}), 404
-    if 'following' not in users_db[current_user.id]:
-        users_db[current_user.id]['following'] = []
-    if user_id not in users_db[current_user.id]['following']:
-        users_db[current_user.id]['following'].append(user_id)
-    if 'followers' not in users_db[user_id]:
-        users_db[user_id]['followers'] = []
-    if current_user.id not in users_db[user_id]['followers']:
-        users_db[user_id]['followers'].append(current_user.id)
-    users_file = os.path.join(project_path, 'users.json')
-    with open(users_file, 'w') as f:
-        json.dump(users_db, f, indent=2)
-    log_activity(current_user.id, 'follow', f'Started following {users_db[user_id]["username"]}')
-    log_activity(user_id, 'follower', f'{current_user.username} started following you')
+    if get_social_graph().follow(current_user.id, user_id):
+        get_following_feed().on_follow(current_user.id, user_id)
+        log_activity(current_user.id, 'follow', f'Started following {users_db[user_id]["username"]}')
+        log_activity(user_id, 'follower', f'{current_user.username} started following you')
     return jsonify({'success': True})
 
+@app.route('/api/user/<user_id>/unfollow', methods=['POST'])
+@login_required
+def unfollow_user(user_id):
+    if get_social_graph().unfollow(current_user.id, user_id):
+        get_following_feed().on_unfollow(current_user.id, user_id)
+    return jsonify({'success': True})
+
+def _follow_page(user_id, page_of):
+    if user_id not in users_db:
+        return jsonify({'success': False, 'error': 'User not found'}), 404
+    try:
+        page, cursor = page_of(user_id, limit=request.args.get('limit', 50), cursor=request.args.get('cursor'))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid cursor or limit'}), 400
+    for entry in page:
+        user_data = users_db.get(entry['user_id'], {})
+        entry.update(username=user_data.get('username'), avatar=user_data.get('avatar'))
+    return jsonify({'success': True, 'users': page, 'next_cursor': cursor})
+
+def _feed_page(user_id, limit, cursor):
+    events, next_cursor = get_following_feed().page(user_id, limit=limit, cursor=cursor)
+    for event in events:
+        actor = users_db.get(event['actor_id'], {})
+        event.update(username=actor.get('username', 'Unknown'), avatar=actor.get('avatar'))
+    return events, next_cursor
+
+@app.route('/feed')
+@login_required
+def feed():
+    """What the people you follow downloaded, reviewed and collected"""
+    events, next_cursor = _feed_page(current_user.id, 20, None)
+    return render_template('feed.html', events=events, next_cursor=next_cursor)
+
+@app.route('/api/feed')
+@login_required
+def api_feed():
+    try:
+        events, next_cursor = _feed_page(current_user.id, request.args.get('limit', 20), request.args.get('cursor'))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid cursor or limit'}), 400
+    return jsonify({'success': True, 'events': events, 'next_cursor': next_cursor})
+
+@app.route('/api/user/<user_id>/followers')
+def user_followers(user_id):
+    """Followers of a user, newest first; pass next_cursor back as ?cursor= for the next page"""
+    return _follow_page(user_id, get_social_graph().followers)
+
+@app.route('/api/user/<user_id>/following')
+def user_following(user_id):
+    return _follow_page(user_id, get_social_graph().following)
+
+@app.route('/api/following/check', methods=['POST'])
+@login_required
+def check_following():
+    """Which of the posted user_ids the current user follows, in one query"""
+    user_ids = [str(u) for u in (request.get_json(silent=True) or {}).get('user_ids', [])][:1000]
+    followed = get_social_graph().following_among(current_user.id, user_ids)
+    return jsonify({'success': True, 'following': {u: u in followed for u in user_ids}})
+
 @app.route('/admin')
 @admin_required
 def admin_dashboard():
@@ -813,10 +1158,13 @@ def admin_dashboard():
     total_downloads = sum(app.get('downloads', 0) for app in apps)
     total_reviews = sum(len(app.get('reviews', [])) for app in apps)
     all_activities = []
-    for user_id, activities in activities_db.items():
+    for user_id, activities in activities_db.scan():
         for activity in activities[-10:]:
-            all_activities.append({**activity, 'username': users_db.get(user_id, {}).get('username', 'Unknown')})
-    all_activities.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
+            all_activities.append((activity, user_id))
+    all_activities.sort(key=lambda x: x[0].get('timestamp', ''), reverse=True)
+    # Only look up the users that are shown
+    all_activities = [{**activity, 'username': users_db.get(user_id, {}).get('username', 'Unknown')}
+                      for activity, user_id in all_activities[:50]]
     return render_template('admin_dashboard.html',
                          apps=apps,
                          total_users=total_users,
@@ -859,9 +1207,8 @@ def admin_add_app():
             'updated_date': datetime.now().isoformat()
         }
         
-        apps = load_apps()
-        apps.append(new_app)
-        save_apps(apps)
+        update_apps(lambda apps: apps.append(new_app))
+        page_cache.invalidate('catalog')
         
         flash('App added successfully!', 'success')
         return redirect(url_for('admin_apps'))
@@ -896,7 +1243,12 @@ def admin_edit_app(app_id):
         app_data['featured'] = bool(data.get('featured'))
         app_data['updated_date'] = datetime.now().isoformat()
         
-        save_apps(apps)
+        try:
+            save_apps(apps)
+        except StaleWriteError:
+            flash('This app was changed by someone else while you were editing it. Please review and save again.', 'error')
+            return redirect(url_for('admin_edit_app', app_id=app_id))
+        page_cache.invalidate('catalog')
         flash('App updated successfully!', 'success')
         return redirect(url_for('admin_apps'))
     
@@ -907,9 +1259,11 @@ def admin_edit_app(app_id):
 @admin_required
 def admin_delete_app(app_id):
     """Delete an app"""
-    apps = load_apps()
-    apps = [app for app in apps if app['id'] != app_id]
-    save_apps(apps)
+    def remove_app(apps):
+        apps[:] = [app for app in apps if app['id'] != app_id]
+
+    update_apps(remove_app)
+    page_cache.invalidate('catalog')
     
     return jsonify({'success': True, 'message': 'App deleted successfully!'})
 
@@ -918,7 +1272,7 @@ def admin_delete_app(app_id):
 def admin_users():
     """Admin page for managing users"""
     users_list = []
-    for user_id, user_data in users_db.items():
+    for user_id, user_data in users_db.scan():
         users_list.append({
             'id': user_id,
             'username': user_data.get('username'),
@@ -938,12 +1292,50 @@ def admin_toggle_admin(user_id):
     """Toggle admin status for a user"""
     if user_id in users_db:
         users_db[user_id]['is_admin'] = not users_db[user_id].get('is_admin', False)
-        users_file = os.path.join(project_path, 'users.json')
-        with open(users_file, 'w') as f:
-            json.dump(users_db, f, indent=2)
+        save_users()
         return jsonify({'success': True, 'is_admin': users_db[user_id]['is_admin']})
     return jsonify({'success': False, 'error': 'User not found'}), 404
 
+memory_tracker = MemoryTracker()
+
+@app.route('/admin/debug/profile')
+@admin_required
+def admin_profile():
+    """Sample every thread of this worker for ?seconds=N and return collapsed stacks"""
+    seconds = request.args.get('seconds', 10, type=float)
+    interval = request.args.get('interval_ms', 10, type=float) / 1000
+    try:
+        stacks = sample_stacks(seconds, interval)
+    except ProfilerBusy as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    response = make_response(format_collapsed(stacks))
+    response.mimetype = 'text/plain'
+    filename = f"profile-{os.getpid()}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.collapsed"
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/admin/debug/memory/snapshot', methods=['POST'])
+@admin_required
+def admin_memory_snapshot():
+    """Start tracemalloc, or snapshot and diff against the previous snapshot"""
+    result = memory_tracker.snapshot({
+        'users_db': lambda: deep_sizeof(users_db.loaded()),
+        'activities_db': lambda: deep_sizeof(activities_db.loaded()),
+        'analytics_db': lambda: deep_sizeof(analytics_db.loaded()),
+        'fragment_cache': lambda: cache.cache.stats()['bytes'],
+        'page_cache': lambda: page_cache.stats()['bytes'],
+    })
+    result['jinja_templates_cached'] = len(app.jinja_env.cache or {})
+    result['pid'] = os.getpid()
+    return jsonify({'success': True, **result})
+
+@app.route('/admin/debug/memory/stop', methods=['POST'])
+@admin_required
+def admin_memory_stop():
+    memory_tracker.stop()
+    return jsonify({'success': True})
+
 @app.route('/api/theme/toggle', methods=['POST'])
 def toggle_theme():
     theme = request.json.get('theme', 'light')
@@ -954,107 +1346,106 @@ def toggle_theme():
 @app.route('/api/search/suggestions')
 def search_suggestions():
     """Real-time search suggestions endpoint for instant search results"""
-    query = request.args.get('q', '').lower().strip()
+    query = fold(request.args.get('q', ''))
 
     if not query or len(query) < 2:
         return jsonify({'success': True, 'results': []})
 
     apps = load_apps()
 
-    # Score-based search for better relevance
-    scored_results = []
+    with metrics.phase('index'):
+        # Score-based search for better relevance
+        scored_results = []
+
+        for app in apps:
+            score = 0
+            text = search_fields(app)
+            app_name = text['name']
+            app_developer = text['developer']
+            app_description = text['description']
+            app_category = text['category']
+
+            # Exact match in name (highest priority)
+            if query == app_name:
+                score += 100
+            # Name starts with query
+            elif app_name.startswith(query):
+                score += 80
+            # Query in name
+            elif query in app_name:
+                score += 60
+
+            # Developer matches
+            if query in app_developer:
+                score += 30
+
+            # Category matches
+            if query in app_category:
+                score += 20
+
+            # Description matches (lowest priority)
+            if query in app_description:
+                score += 10
+
+            # Boost popular apps slightly
+            if app.get('featured', False):
+                score += 5
+
+            # Add download popularity factor
+            downloads = app.get('downloads', 0)
+            if downloads > 10000:
+                score += 3
+            elif downloads > 1000:
+                score += 2
+            elif downloads > 100:
+                score += 1
+
+            if score > 0:
+                scored_results.append({
+                    'id': app.get('id'),
+                    'name': app.get('name'),
+                    'icon': app.get('icon'),
+                    'developer': app.get('developer'),
+                    'category': app.get('category'),
+                    'rating': app.get('rating', 0),
+                    'price': app.get('price', 0),
+                    'score': score
+                })
 
-    for app in apps:
-        score = 0
-        app_name = app.get('name', '').lower()
-        app_developer = app.get('developer', '').lower()
-        app_description = app.get('description', '').lower()
-        app_category = app.get('category', '').lower()
-
-        # Exact match in name (highest priority)
-        if query == app_name:
-            score += 100
-        # Name starts with query
-        elif app_name.startswith(query):
-            score += 80
-        # Query in name
-        elif query in app_name:
-            score += 60
-
-        # Developer matches
-        if query in app_developer:
-            score += 30
-
-        # Category matches
-        if query in app_category:
-            score += 20
-
-        # Description matches (lowest priority)
-        if query in app_description:
-            score += 10
-
-        # Boost popular apps slightly
-        if app.get('featured', False):
-            score += 5
-
-        # Add download popularity factor
-        downloads = app.get('downloads', 0)
-        if downloads > 10000:
-            score += 3
-        elif downloads > 1000:
-            score += 2
-        elif downloads > 100:
-            score += 1
-
-        if score > 0:
-            scored_results.append({
-                'id': app.get('id'),
-                'name': app.get('name'),
-                'icon': app.get('icon'),
-                'developer': app.get('developer'),
-                'category': app.get('category'),
-                'rating': app.get('rating', 0),
-                'price': app.get('price', 0),
-                'score': score
-            })
-
-    # Sort by score and return top 8 results
-    scored_results.sort(key=lambda x: x['score'], reverse=True)
-    top_results = scored_results[:8]
-
-    # Remove score from final results
-    for result in top_results:
-        result.pop('score', None)
+        # Sort by score and return top 8 results
+        scored_results.sort(key=lambda x: x['score'], reverse=True)
+        top_results = scored_results[:8]
+
+        # Remove score from final results
+        for result in top_results:
+            result.pop('score', None)
 
     return jsonify({'success': True, 'results': top_results})
 
+# sort_by -> (column, descending); anything else keeps catalog order
+ADVANCED_SEARCH_SORTS = {
+    'rating': ('rating', True),
+    'downloads': ('downloads', True),
+    'date': ('added', True),
+    'name': ('name_rank', False),
+}
+
 @app.route('/api/search/advanced', methods=['POST'])
 def advanced_search():
     data = request.json
-    apps = load_apps()
-    results = apps
-    if data.get('query'):
-        query = data['query'].lower()
-        results = [app for app in results if
-                   query in app.get('name', '').lower() or
-                   query in app.get('description', '').lower() or
-                   query in app.get('developer', '').lower()]
-    if data.get('category'):
-        results = [app for app in results if app.get('category') == data['category']]
-    if data.get('min_rating'):
-        results = [app for app in results if app.get('rating', 0) >= float(data['min_rating'])]
-    if data.get('max_price') is not None:
-        results = [app for app in results if app.get('price', 0) <= float(data['max_price'])]
-    sort_by = data.get('sort_by', 'relevance')
-    if sort_by == 'rating':
-        results.sort(key=lambda x: x.get('rating', 0), reverse=True)
-    elif sort_by == 'downloads':
-        results.sort(key=lambda x: x.get('downloads', 0), reverse=True)
-    elif sort_by == 'date':
-        results.sort(key=lambda x: x.get('added_date', ''), reverse=True)
-    elif sort_by == 'name':
-        results.sort(key=lambda x: x.get('name', ''))
-    return jsonify({'success': True, 'results': results[:50]})
+    columns = get_columns()
+    order, descending = ADVANCED_SEARCH_SORTS.get(data.get('sort_by', 'relevance'), (None, False))
+    with metrics.phase('index'):
+        plan = FilterPlan(columns, category=data.get('category') or None,
+                          min_rating=data['min_rating'] if data.get('min_rating') else None,
+                          max_price=data.get('max_price'), query=data.get('query') or None)
+        try:
+            top, next_cursor = plan.page(order, descending, limit=data.get('limit', 50), cursor=data.get('cursor'))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Invalid cursor or limit'}), 400
+    results = [find_app(columns.ids[i]) for i in top]
+    return jsonify({'success': True, 'results': [public_app(app) for app in results if app is not None],
+                    'next_cursor': next_cursor})
 
 @app.route('/compare')
 def compare_apps():
@@ -1071,9 +1462,7 @@ def track_analytics():
     if event_type and app_id:
         today = datetime.now().strftime('%Y-%m-%d')
         analytics_db[app_id][f'{event_type}_{today}'] += 1
-        analytics_file = os.path.join(project_path, 'analytics.json')
-        with open(analytics_file, 'w') as f:
-            json.dump(dict(analytics_db), f, indent=2)
+        unit_of_work.mark_dirty('analytics')
         return jsonify({'success': True})
     return jsonify({'success': False}), 400
 
@@ -1113,9 +1502,7 @@ def mark_notifications_read():
             if notif['id'] in notification_ids:
                 notif['read'] = True
         users_db[current_user.id]['notifications'] = notifications
-        users_file = os.path.join(project_path, 'users.json')
-        with open(users_file, 'w') as f:
-            json.dump(users_db, f, indent=2)
+        save_users()
         return jsonify({'success': True})
     return jsonify({'success': False}), 404
 
@@ -1123,47 +1510,48 @@ def mark_notifications_read():
 @login_required
 def vote_review_helpful(review_id):
     """Vote a review as helpful"""
-    apps = load_apps()
+    def add_vote(apps):
+        # Find the review across all apps
+        for app in apps:
+            for review in app.get('reviews', []):
+                if review.get('id') == review_id:
+                    # Initialize helpful votes structure if not exists
+                    if 'helpful_votes' not in review:
+                        review['helpful_votes'] = 0
+                    if 'voted_users' not in review:
+                        review['voted_users'] = []
+                    
+                    # Check if user already voted
+                    if current_user.id in review['voted_users']:
+                        raise Unchanged((app['id'], review['helpful_votes'], False))
+                    
+                    # Add vote
+                    review['helpful_votes'] += 1
+                    review['voted_users'].append(current_user.id)
+                    return app['id'], review['helpful_votes'], True
+        raise Unchanged(None)
+
+    result = update_apps(add_vote)
+    if result is None:
+        return jsonify({'success': False, 'error': 'Review not found'}), 404
+
+    app_id, helpful_votes, voted = result
+    if not voted:
+        return jsonify({
+            'success': False, 
+            'message': 'You have already voted this review as helpful',
+            'helpful_votes': helpful_votes
+        })
+    page_cache.invalidate(f"app:{app_id}")
     
-    # Find the review across all apps
-    review_found = False
-    for app in apps:
-        for review in app.get('reviews', []):
-            if review.get('id') == review_id:
-                review_found = True
-                
-                # Initialize helpful votes structure if not exists
-                if 'helpful_votes' not in review:
-                    review['helpful_votes'] = 0
-                if 'voted_users' not in review:
-                    review['voted_users'] = []
-                
-                # Check if user already voted
-                if current_user.id in review['voted_users']:
-                    return jsonify({
-                        'success': False, 
-                        'message': 'You have already voted this review as helpful',
-                        'helpful_votes': review['helpful_votes']
-                    })
-                
-                # Add vote
-                review['helpful_votes'] += 1
-                review['voted_users'].append(current_user.id)
-                
-                # Save changes
-                save_apps(apps)
-                
-                # Log activity
-                log_activity(current_user.id, 'review_helpful', f'Voted review as helpful')
-                
-                return jsonify({
-                    'success': True, 
-                    'helpful_votes': review['helpful_votes'],
-                    'message': 'Review voted as helpful!'
-                })
+    # Log activity
+    log_activity(current_user.id, 'review_helpful', f'Voted review as helpful')
     
-    if not review_found:
-        return jsonify({'success': False, 'error': 'Review not found'}), 404
+    return jsonify({
+        'success': True, 
+        'helpful_votes': helpful_votes,
+        'message': 'Review voted as helpful!'
+    })
 
 @app.route('/api/settings/update', methods=['POST'])
 @login_required
@@ -1173,9 +1561,7 @@ def update_settings():
         if 'settings' not in users_db[current_user.id]:
             users_db[current_user.id]['settings'] = {}
         users_db[current_user.id]['settings'].update(settings)
-        users_file = os.path.join(project_path, 'users.json')
-        with open(users_file, 'w') as f:
-            json.dump(users_db, f, indent=2)
+        save_users()
         return jsonify({'success': True})
     return jsonify({'success': False}), 404
 
@@ -1184,7 +1570,11 @@ def update_settings():
 def serve_apps_data():
     """Serve the apps data JSON file"""
     apps = load_apps()
-    return jsonify(apps)
+    return jsonify([public_app(app) for app in apps])
+
+# Static HTML/JSON export of the public catalog (python static_export.py)
+static_exporter = StaticExporter(app, os.path.join(data_path, SITE_DIR), load_apps,
+                                 index_view=index, category_view=category, detail_view=render_app_detail)
 
 # --- 6. تشغيل التطبيق ---
 if __name__ == '__main__':
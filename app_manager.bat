@@ -99,16 +99,32 @@ if exist "apps_data.json" (
     echo [WARNING] apps_data.json not found
 )
 
-if exist "users.json" (
-    copy "users.json" "backups\%backup_name%_users.json" >nul
-    echo [OK] Backed up users.json
+rem Follows, feeds and collections live in data\social.db; copied with
+rem SQLite's backup API, since recent changes may still be in its WAL file
+if exist "data\social.db" (
+    python -c "from social_graph import backup_database; backup_database(r'data\social.db', r'backups\%backup_name%_social.db')"
+    if errorlevel 1 (
+        echo [WARNING] Could not back up data\social.db
+    ) else (
+        echo [OK] Backed up data\social.db
+    )
 ) else (
-    echo [WARNING] users.json not found
+    echo [WARNING] data\social.db not found
+)
+
+rem Users, activities and analytics live in the snapshots, not the JSON files
+for %%s in (users activities analytics) do (
+    if exist "data\%%s.snap" (
+        copy "data\%%s.snap" "backups\%backup_name%_%%s.snap" >nul
+        echo [OK] Backed up data\%%s.snap
+    ) else (
+        echo [WARNING] data\%%s.snap not found
+    )
 )
 
 echo.
 echo Backup completed successfully!
-echo Location: backups\%backup_name%_*.json
+echo Location: backups\%backup_name%_*
 echo.
 pause
 goto MENU
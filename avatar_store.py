@@ -0,0 +1,205 @@
+"""
+Avatar Store - background avatar processing with content-addressed storage
+Uploaded avatars are normalized (EXIF rotation, RGB), center-cropped to a square
+and resized into a few fixed sizes on a worker thread. Files are named after the
+hash of the uploaded bytes, so identical uploads share the same files and the
+URLs never change content (safe to cache forever).
+"""
+
+import hashlib
+import logging
+import os
+import queue
+import re
+import threading
+import time
+
+# Fixed output sizes (square, in pixels). 'md' is what gets stored on the user.
+AVATAR_SIZES = {'sm': 48, 'md': 128, 'lg': 256}
+DEFAULT_SIZE = 'md'
+AVATAR_FORMAT = 'webp'
+AVATAR_QUALITY = 85
+
+# Upload limits for avatars (much lower than the app-wide MAX_CONTENT_LENGTH)
+MAX_AVATAR_BYTES = 5 * 1024 * 1024
+MAX_AVATAR_PIXELS = 40_000_000
+
+# Replaced avatars are deleted in batches by the worker
+CLEANUP_BATCH_SIZE = 20
+CLEANUP_INTERVAL = 60  # seconds
+
+DIGEST_LENGTH = 24
+_AVATAR_NAME_RE = re.compile(r'^(?P<digest>[0-9a-f]{%d})_(?P<px>\d+)\.%s$' % (DIGEST_LENGTH, AVATAR_FORMAT))
+
+
+class AvatarError(ValueError):
+    """Raised when an uploaded file cannot be used as an avatar"""
+
+
+def content_digest(data: bytes) -> str:
+    """Content hash used as the avatar's file name"""
+    return hashlib.sha256(data).hexdigest()[:DIGEST_LENGTH]
+
+
+def avatar_filename(digest: str, size: str = DEFAULT_SIZE) -> str:
+    return f"{digest}_{AVATAR_SIZES[size]}.{AVATAR_FORMAT}"
+
+
+def parse_avatar_url(url: str):
+    """Return the content digest of a processed avatar URL, or None for legacy avatars"""
+    if not url:
+        return None
+    match = _AVATAR_NAME_RE.match(url.rsplit('/', 1)[-1])
+    return match.group('digest') if match else None
+
+
+def avatar_variant(url: str, size: str = DEFAULT_SIZE) -> str:
+    """Swap a processed avatar URL to another size; legacy URLs are returned unchanged"""
+    digest = parse_avatar_url(url)
+    if not digest or size not in AVATAR_SIZES:
+        return url
+    return f"{url.rsplit('/', 1)[0]}/{avatar_filename(digest, size)}"
+
+
+def validate_image(data: bytes):
+    """Cheap in-request check that the upload is an image we can process"""
+    from PIL import Image, UnidentifiedImageError
+    from io import BytesIO
+
+    if len(data) > MAX_AVATAR_BYTES:
+        raise AvatarError(f'Avatar must be smaller than {MAX_AVATAR_BYTES // (1024 * 1024)}MB')
+    try:
+        # Only parses the header; pixel data is decoded later on the worker
+        with Image.open(BytesIO(data)) as img:
+            width, height = img.size
+    except (UnidentifiedImageError, OSError):
+        raise AvatarError('Invalid file type. Please upload an image.')
+    if width * height > MAX_AVATAR_PIXELS:
+        raise AvatarError('Image dimensions are too large')
+
+
+def render_variants(data: bytes, digest: str, avatar_dir: str):
+    """Decode, normalize, crop and write every size variant for one upload"""
+    from PIL import Image, ImageOps
+    from io import BytesIO
+
+    with Image.open(BytesIO(data)) as img:
+        img = ImageOps.exif_transpose(img)
+        img = img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+        # Largest size first, then downscale from it (cheaper than from the original)
+        for size, px in sorted(AVATAR_SIZES.items(), key=lambda item: -item[1]):
+            img = ImageOps.fit(img, (px, px), Image.LANCZOS)
+            target = os.path.join(avatar_dir, avatar_filename(digest, size))
+            tmp_path = f"{target}.{os.getpid()}.tmp"
+            img.save(tmp_path, AVATAR_FORMAT.upper(), quality=AVATAR_QUALITY, method=4)
+            os.replace(tmp_path, target)
+
+
+class AvatarProcessor:
+    """Single worker thread that renders uploads and batches cleanup of old avatars"""
+
+    def __init__(self, avatar_dir: str, referenced_digests=None, logger=None):
+        self.avatar_dir = avatar_dir
+        # Failures without an on_error callback (and errors raised by it) are logged here
+        self.logger = logger or logging.getLogger(__name__)
+        # Callback() -> set of digests still in use, so shared (deduplicated) files survive
+        self.referenced_digests = referenced_digests or set
+        self.jobs = queue.Queue()
+        self.retired = set()
+        self.lock = threading.Lock()
+        self.in_flight = set()
+        self.last_sweep = time.time()
+        self.worker = None
+
+    def start(self):
+        with self.lock:
+            if self.worker is None or not self.worker.is_alive():
+                os.makedirs(self.avatar_dir, exist_ok=True)
+                self.worker = threading.Thread(target=self._run, name='avatar-processor', daemon=True)
+                self.worker.start()
+
+    def exists(self, digest: str) -> bool:
+        """True when every size variant for this digest is already on disk"""
+        return all(os.path.exists(os.path.join(self.avatar_dir, avatar_filename(digest, size)))
+                   for size in AVATAR_SIZES)
+
+    def submit(self, data: bytes, on_done=None, on_error=None) -> tuple:
+        """
+        Queue an upload for processing. Returns (filename, pending) where filename
+        is the default-size variant. Identical uploads already stored complete immediately.
+        """
+        digest = content_digest(data)
+        filename = avatar_filename(digest)
+        if self.exists(digest):
+            with self.lock:
+                self.retired.discard(digest)
+            if on_done:
+                on_done(digest, filename)
+            return filename, False
+        self.start()
+        self.jobs.put((data, digest, on_done, on_error))
+        return filename, True
+
+    def retire(self, url: str):
+        """Schedule a replaced avatar for deletion in the next cleanup batch"""
+        if not url or 'default' in url:
+            return
+        # Processed avatars are tracked by digest, legacy uploads by file name
+        name = parse_avatar_url(url) or os.path.basename(url)
+        with self.lock:
+            self.retired.add(name)
+        self.start()
+
+    def _run(self):
+        while True:
+            try:
+                job = self.jobs.get(timeout=CLEANUP_INTERVAL)
+            except queue.Empty:
+                job = None
+            if job:
+                self._process(*job)
+            if len(self.retired) >= CLEANUP_BATCH_SIZE or time.time() - self.last_sweep >= CLEANUP_INTERVAL:
+                self.sweep()
+
+    def _process(self, data, digest, on_done, on_error):
+        with self.lock:
+            if digest in self.in_flight:
+                return
+            self.in_flight.add(digest)
+        try:
+            if not self.exists(digest):
+                render_variants(data, digest, self.avatar_dir)
+            if on_done:
+                on_done(digest, avatar_filename(digest))
+        except Exception as e:
+            if on_error is None:
+                self.logger.error("Avatar %s could not be processed", digest, exc_info=e)
+            else:
+                try:
+                    on_error(digest, e)
+                except Exception:
+                    self.logger.exception("on_error callback failed for avatar %s", digest)
+        finally:
+            with self.lock:
+                self.in_flight.discard(digest)
+
+    def sweep(self):
+        """Delete every retired avatar that no user references any more"""
+        self.last_sweep = time.time()
+        with self.lock:
+            batch, self.retired = self.retired, set()
+        if not batch:
+            return
+        referenced = self.referenced_digests()
+        for name in batch:
+            if name in self.in_flight or name in referenced:
+                continue
+            if len(name) == DIGEST_LENGTH and '.' not in name:
+                paths = [avatar_filename(name, size) for size in AVATAR_SIZES]
+            else:
+                paths = [name]
+            for path in paths:
+                try:
+                    os.remove(os.path.join(self.avatar_dir, path))
+                except OSError:
+                    pass
@@ -0,0 +1,223 @@
+"""
+Benchmark fixtures
+Each benchmark runs against a synthetic catalog (generate_data.py) at several
+sizes, records min/median/p95 timings to benchmarks/results/history.json and
+fails when the median regresses past the stored baseline.
+
+    pytest                                              # same as pytest benchmarks (pytest.ini)
+    pytest benchmarks                                   # default sizes 100 and 1000
+    pytest benchmarks --bench-sizes 100,1000,10000      # larger catalogs
+    pytest benchmarks --bench-update-baseline           # accept current numbers as the baseline
+
+BENCH_TOLERANCE (default 0.25) is the allowed median slowdown against the baseline.
+
+app.py and the store manager are (re)imported against each generated store,
+so nothing is read from or written to the project's own data; a run that
+changes the project's git tree fails.
+"""
+
+import importlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+BENCH_DIR = Path(__file__).parent.absolute()
+PROJECT_DIR = BENCH_DIR.parent
+BASELINE_FILE = BENCH_DIR / 'baseline.json'
+HISTORY_FILE = BENCH_DIR / 'results' / 'history.json'
+DEFAULT_SIZES = '100,1000'
+MIN_ROUNDS = 3
+MAX_ROUNDS = 50
+TARGET_SECONDS = 0.5  # keep repeating a benchmark until it has run this long
+
+if str(PROJECT_DIR) not in sys.path:
+    sys.path.insert(0, str(PROJECT_DIR))
+
+_results = {}
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('benchmarks')
+    group.addoption('--bench-sizes', default=os.environ.get('BENCH_SIZES', DEFAULT_SIZES),
+                    help='comma separated catalog sizes (number of apps)')
+    group.addoption('--bench-update-baseline', action='store_true',
+                    help='write this run\'s medians to benchmarks/baseline.json')
+
+
+def pytest_generate_tests(metafunc):
+    if 'catalog_size' in metafunc.fixturenames:
+        sizes = [int(s) for s in metafunc.config.getoption('--bench-sizes').split(',') if s.strip()]
+        metafunc.parametrize('catalog_size', sizes, ids=[f"{s}apps" for s in sizes], scope='session')
+
+
+@pytest.fixture(scope='session')
+def dataset_dir(tmp_path_factory, catalog_size):
+    """A generated store (JSON files) with ~10 reviews per app and 2 users per app"""
+    from generate_data import SyntheticStore
+
+    target = tmp_path_factory.mktemp(f"store_{catalog_size}")
+    store = SyntheticStore(catalog_size, catalog_size * 2, catalog_size * 10, seed=1234).generate()
+    store.write_json(target)
+    (target / 'cache').mkdir()
+    return target
+
+
+def _git_status() -> str:
+    try:
+        return subprocess.run(['git', 'status', '--porcelain', '--untracked-files=all'], cwd=PROJECT_DIR,
+                              capture_output=True, text=True, timeout=60).stdout
+    except (OSError, subprocess.SubprocessError):
+        return ''
+
+
+@pytest.fixture(scope='session', autouse=True)
+def project_untouched(request):
+    """Fail the run if a benchmark wrote into the project instead of its generated store"""
+    before = _git_status()
+    yield
+    after = _git_status()
+    if request.config.getoption('--bench-update-baseline'):
+        before, after = ([line for line in status.splitlines() if not line.endswith(BASELINE_FILE.name)]
+                         for status in (before, after))
+    assert after == before, f"benchmarks changed the project tree:\n{after}"
+
+
+def _load_module(name: str):
+    """Import ``name``, or import it again so its module-level setup runs against the current store"""
+    module = sys.modules.get(name)
+    return importlib.reload(module) if module is not None else importlib.import_module(name)
+
+
+@pytest.fixture(scope='session')
+def appmod(dataset_dir):
+    """app.py set up against the generated store (STORE_DATA_DIR is read when it is imported)"""
+    pytest.importorskip('flask')
+    previous = os.environ.get('STORE_DATA_DIR')
+    os.environ['STORE_DATA_DIR'] = str(dataset_dir)
+    try:
+        appmod = _load_module('app')
+    finally:
+        if previous is None:
+            del os.environ['STORE_DATA_DIR']
+        else:
+            os.environ['STORE_DATA_DIR'] = previous
+    assert appmod.data_path == str(dataset_dir)
+    yield appmod
+    counters = appmod.get_shared_counters()
+    if counters is not None:
+        # The shared memory segment would outlive the temporary dataset
+        counters.flush()
+        counters.shm.unlink()
+
+
+@pytest.fixture
+def engines(dataset_dir, monkeypatch):
+    """manage_apps_enhanced.py set up against the generated store"""
+    # The CLI works on paths relative to the current directory, some of them resolved on import
+    monkeypatch.chdir(dataset_dir)
+    module = sys.modules.get('manage_apps_enhanced')
+    if module is None or module.apps_store.path != str(dataset_dir / 'apps_data.json'):
+        module = _load_module('manage_apps_enhanced')
+    return module
+
+
+def _load_baseline() -> dict:
+    if BASELINE_FILE.exists():
+        with open(BASELINE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f).get('results', {})
+    return {}
+
+
+class Benchmark:
+    """Times a callable and checks the median against the baseline"""
+
+    def __init__(self, name: str, baseline: dict, tolerance: float):
+        self.name = name
+        self.baseline = baseline
+        self.tolerance = tolerance
+
+    def __call__(self, func, *args, **kwargs):
+        func(*args, **kwargs)  # warm-up (imports, caches, page faults)
+        timings = []
+        started = time.perf_counter()
+        while len(timings) < MIN_ROUNDS or (len(timings) < MAX_ROUNDS
+                                            and time.perf_counter() - started < TARGET_SECONDS):
+            t0 = time.perf_counter()
+            result = func(*args, **kwargs)
+            timings.append(time.perf_counter() - t0)
+
+        timings.sort()
+        stats = {
+            'rounds': len(timings),
+            'min': timings[0],
+            'median': statistics.median(timings),
+            'p95': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        }
+        _results[self.name] = stats
+
+        expected = self.baseline.get(self.name, {}).get('median')
+        if expected and stats['median'] > expected * (1 + self.tolerance):
+            pytest.fail(f"{self.name}: median {stats['median'] * 1000:.2f}ms exceeds baseline "
+                        f"{expected * 1000:.2f}ms by more than {self.tolerance:.0%}")
+        return result
+
+
+@pytest.fixture
+def bench(request):
+    """``bench(func, *args)`` times func; the test id (including catalog size) names the result"""
+    tolerance = float(os.environ.get('BENCH_TOLERANCE', 0.25))
+    baseline = {} if request.config.getoption('--bench-update-baseline') else _load_baseline()
+    return Benchmark(request.node.name, baseline, tolerance)
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ''
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if not _results:
+        return
+    run = {
+        'timestamp': datetime.now().isoformat(),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': _results,
+    }
+    HISTORY_FILE.parent.mkdir(parents=True, exist_ok=True)
+    history = []
+    if HISTORY_FILE.exists():
+        with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
+            history = json.load(f)
+    history.append(run)
+    with open(HISTORY_FILE, 'w', encoding='utf-8') as f:
+        json.dump(history, f, indent=2)
+
+    if session.config.getoption('--bench-update-baseline'):
+        baseline = {'updated_at': run['timestamp'], 'commit': run['commit'],
+                    'results': {**_load_baseline(), **_results}}
+        with open(BASELINE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not _results:
+        return
+    terminalreporter.section('benchmarks')
+    width = max(len(name) for name in _results)
+    for name, stats in sorted(_results.items()):
+        terminalreporter.write_line(
+            f"{name:<{width}}  median {stats['median'] * 1000:9.2f}ms  "
+            f"p95 {stats['p95'] * 1000:9.2f}ms  min {stats['min'] * 1000:9.2f}ms  ({stats['rounds']} rounds)")
@@ -0,0 +1,338 @@
+"""
+Load-Test Harness
+Replays a weighted mix of realistic traffic against a running server or the
+WSGI app in-process, from a pool of virtual users (threads), and reports
+throughput, p50/p95/p99 latency and error rates per route.
+
+    python generate_data.py --scale small
+    python benchmarks/loadtest.py --in-process --data-dir synthetic_data/small --users 16 --duration 30
+    python benchmarks/loadtest.py --url http://127.0.0.1:5000 --users 32 --duration 60 \\
+        --login ahmed2:synthetic-password --admin-login sara1:synthetic-password \\
+        --mix browse=50,search=25,download=10,review=3,wishlist=7,admin=5 --json results.json
+
+Page views, reviews, downloads and wishlist toggles write data, so point it
+at a test instance (e.g. one running on generate_data.py output), never at
+production. In-process mode runs app.py on the store in --data-dir (required;
+it never touches the project's own data) and logs virtual users in through
+the session, so it needs no passwords; over HTTP, scenarios that need an
+account are skipped unless --login / --admin-login are given.
+"""
+
+import argparse
+import http.cookiejar
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).parent.parent.absolute()
+
+DEFAULT_MIX = 'browse=50,search=25,download=10,review=3,wishlist=7,admin=5'
+# Which session each scenario runs in; the rest browse anonymously
+SCENARIO_ROLES = {'review': 'user', 'wishlist': 'user', 'admin': 'admin'}
+THINK_TIME = 0.0  # seconds between requests of one virtual user
+
+
+# ============== TRANSPORTS ==============
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpTransport:
+    """One virtual user's cookie session against a running server"""
+
+    def __init__(self, base_url: str, timeout: float = 30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+
+    def request(self, method: str, path: str, json_body=None, form=None) -> int:
+        headers = {}
+        data = None
+        if json_body is not None:
+            data = json.dumps(json_body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        elif form is not None:
+            data = urllib.parse.urlencode(form).encode('utf-8')
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with self.opener.open(req, timeout=self.timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+    def login(self, credentials: str) -> bool:
+        username, _, password = credentials.partition(':')
+        return self.request('POST', '/login', form={'username': username, 'password': password}) == 302
+
+    def catalog(self) -> list:
+        with self.opener.open(self.base_url + '/apps_data.json', timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+
+class WsgiTransport:
+    """One virtual user's test client against the app imported in this process"""
+
+    def __init__(self, flask_app):
+        self.client = flask_app.test_client()
+
+    def request(self, method: str, path: str, json_body=None, form=None) -> int:
+        return self.client.open(path, method=method, json=json_body, data=form).status_code
+
+    def login_as(self, user_id: str):
+        with self.client.session_transaction() as session:
+            session['_user_id'] = user_id
+            session['_fresh'] = True
+
+
+# ============== SCENARIOS ==============
+
+class Scenarios:
+    """Each scenario is a short sequence of requests one visitor would make"""
+
+    def __init__(self, apps: list, rng: random.Random):
+        self.rng = rng
+        self.apps = apps
+        self.categories = sorted({a.get('category', '') for a in apps if a.get('category')})
+        # Popular apps get most of the traffic
+        self.cum_weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(apps))))
+
+    def _app(self) -> dict:
+        return self.rng.choices(self.apps, cum_weights=self.cum_weights)[0]
+
+    def browse(self, send):
+        send('GET', '/', 'GET /')
+        if self.categories and self.rng.random() < 0.5:
+            send('GET', f"/category/{urllib.parse.quote(self.rng.choice(self.categories))}",
+                 'GET /category/<name>')
+        send('GET', f"/app/{self._app()['id']}", 'GET /app/<id>')
+
+    def search(self, send):
+        # Search-as-you-type: one suggestions call per keystroke, then the results page
+        words = self._app().get('name', 'app').split()
+        term = self.rng.choice(words).lower() if words else 'app'
+        for length in range(2, min(len(term), 6) + 1):
+            send('GET', f"/api/search/suggestions?q={urllib.parse.quote(term[:length])}",
+                 'GET /api/search/suggestions')
+        send('GET', f"/search?q={urllib.parse.quote(term)}", 'GET /search')
+
+    def download(self, send):
+        app_id = self._app()['id']
+        send('GET', f"/app/{app_id}", 'GET /app/<id>')
+        send('POST', f"/api/download/{app_id}", 'POST /api/download/<id>')
+
+    def review(self, send):
+        app_id = self._app()['id']
+        send('POST', f"/api/review/{app_id}", 'POST /api/review/<id>',
+             json_body={'rating': self.rng.randint(1, 5), 'comment': 'Load test review'})
+
+    def wishlist(self, send):
+        app_id = self._app()['id']
+        send('POST', f"/api/wishlist/add/{app_id}", 'POST /api/wishlist/add/<id>')
+        send('POST', f"/api/wishlist/remove/{app_id}", 'POST /api/wishlist/remove/<id>')
+
+    def admin(self, send):
+        path = self.rng.choice(['/admin', '/admin/apps', '/admin/users'])
+        send('GET', path, f"GET {path}")
+
+
+# ============== RESULTS ==============
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, route: str, seconds: float, status):
+        with self._lock:
+            self.latencies[route].append(seconds)
+            self.statuses[route][str(status)] += 1
+            if not isinstance(status, int) or status >= 400:
+                self.errors[route] += 1
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank percentile
+    index = min(len(sorted_values) - 1, max(0, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(recorder: Recorder, elapsed: float) -> dict:
+    routes = {}
+    for route, values in recorder.latencies.items():
+        values = sorted(values)
+        routes[route] = {
+            'requests': len(values),
+            'throughput_rps': len(values) / elapsed,
+            'p50_ms': percentile(values, 50) * 1000,
+            'p95_ms': percentile(values, 95) * 1000,
+            'p99_ms': percentile(values, 99) * 1000,
+            'max_ms': values[-1] * 1000,
+            'error_rate': recorder.errors[route] / len(values),
+            'statuses': dict(recorder.statuses[route]),
+        }
+    total = sum(r['requests'] for r in routes.values())
+    return {
+        'elapsed_s': elapsed,
+        'requests': total,
+        'throughput_rps': total / elapsed if elapsed else 0.0,
+        'error_rate': sum(recorder.errors.values()) / total if total else 0.0,
+        'routes': routes,
+    }
+
+
+def print_report(summary: dict):
+    width = max([len(r) for r in summary['routes']] + [5])
+    print(f"\n{'route':<{width}} {'reqs':>7} {'rps':>8} {'p50ms':>8} {'p95ms':>8} {'p99ms':>8} {'errors':>7}")
+    print('-' * (width + 52))
+    for route, r in sorted(summary['routes'].items(), key=lambda item: -item[1]['requests']):
+        print(f"{route:<{width}} {r['requests']:>7} {r['throughput_rps']:>8.1f} {r['p50_ms']:>8.1f} "
+              f"{r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['error_rate']:>6.1%}")
+    print('-' * (width + 52))
+    print(f"{'total':<{width}} {summary['requests']:>7} {summary['throughput_rps']:>8.1f} "
+          f"{'':>8} {'':>8} {'':>8} {summary['error_rate']:>6.1%}")
+
+
+# ============== RUNNER ==============
+
+def parse_mix(spec: str) -> dict:
+    mix = {}
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if not hasattr(Scenarios, name):
+            raise SystemExit(f"Unknown scenario '{name}'")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def run(make_transport, apps: list, mix: dict, users: int, duration: float, seed: int) -> dict:
+    recorder = Recorder()
+    deadline = time.monotonic() + duration
+    names = list(mix)
+    weights = [mix[n] for n in names]
+
+    def virtual_user(index: int):
+        rng = random.Random(seed + index)
+        scenarios = Scenarios(apps, rng)
+        transports = {}  # role -> transport, created (and logged in) on first use
+
+        def sender(transport):
+            def send(method, path, route, json_body=None):
+                started = time.perf_counter()
+                try:
+                    status = transport.request(method, path, json_body=json_body)
+                except Exception as e:
+                    status = type(e).__name__
+                recorder.record(route, time.perf_counter() - started, status)
+            return send
+
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights=weights)[0]
+            role = SCENARIO_ROLES.get(name, 'anonymous')
+            if role not in transports:
+                transports[role] = sender(make_transport(index, role))
+            getattr(scenarios, name)(transports[role])
+            if THINK_TIME:
+                time.sleep(THINK_TIME)
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=users, thread_name_prefix='vu') as pool:
+        for future in [pool.submit(virtual_user, i) for i in range(users)]:
+            future.result()
+    return summarize(recorder, time.monotonic() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a traffic mix and report latency percentiles')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help='base URL of a running server')
+    target.add_argument('--in-process', action='store_true', help='drive app.py through its WSGI test client')
+    parser.add_argument('--users', type=int, default=8, help='concurrent virtual users (threads)')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'scenario weights (default: {DEFAULT_MIX})')
+    parser.add_argument('--data-dir', help='store written by generate_data.py to run app.py on (in-process mode)')
+    parser.add_argument('--login', help='username:password for review/wishlist scenarios (HTTP mode)')
+    parser.add_argument('--admin-login', help='username:password for admin scenarios (HTTP mode)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='also write the summary to this file')
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+
+    if args.in_process:
+        if not args.data_dir:
+            parser.error('--in-process needs --data-dir (generate_data.py output); '
+                         'the scenarios write views, downloads, reviews and wishlists')
+        data_dir = Path(args.data_dir).absolute()
+        if not (data_dir / 'apps_data.json').exists():
+            parser.error(f'{data_dir} has no apps_data.json; create it with generate_data.py')
+        # Read by app.py when it is imported
+        os.environ['STORE_DATA_DIR'] = str(data_dir)
+        sys.path.insert(0, str(PROJECT_DIR))
+        import app as appmod
+
+        apps = appmod.load_apps()
+        accounts = {
+            'user': [uid for uid, u in appmod.users_db.items() if not u.get('is_admin')],
+            'admin': [uid for uid, u in appmod.users_db.items() if u.get('is_admin')],
+        }
+
+        def make_transport(index, role):
+            transport = WsgiTransport(appmod.app)
+            if role != 'anonymous':
+                transport.login_as(accounts[role][index % len(accounts[role])])
+            return transport
+    else:
+        probe = HttpTransport(args.url)
+        apps = probe.catalog()
+        credentials = {'user': args.login, 'admin': args.admin_login}
+        accounts = {role: [c] if c and HttpTransport(args.url).login(c) else []
+                    for role, c in credentials.items()}
+
+        def make_transport(index, role):
+            transport = HttpTransport(args.url)
+            if role != 'anonymous':
+                transport.login(credentials[role])
+            return transport
+
+    for name in list(mix):
+        role = SCENARIO_ROLES.get(name)
+        if role and not accounts[role]:
+            print(f"⚠️ Skipping '{name}': no {role} account to log in with")
+            mix.pop(name)
+    if not apps or not mix:
+        raise SystemExit("❌ Nothing to run: empty catalog or empty traffic mix")
+
+    print(f"🚀 {args.users} virtual users for {args.duration:.0f}s against "
+          f"{args.url or 'the in-process WSGI app'} ({len(apps)} apps), mix: {mix}")
+    summary = run(make_transport, apps, mix, args.users, args.duration, args.seed)
+    print_report(summary)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'users': args.users, 'mix': mix, **summary}, f, indent=2)
+        print(f"\n📄 Summary written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
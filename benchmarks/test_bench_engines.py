@@ -0,0 +1,29 @@
+"""Benchmarks for the recommendation, search and backup engines in manage_apps_enhanced.py"""
+
+import pytest
+
+
+@pytest.fixture
+def apps(engines):
+    return engines.load_apps()
+
+
+def test_recommendations(bench, engines, apps):
+    recommender = engines.RecommendationEngine()
+    results = bench(recommender.get_recommendations, apps[0]['id'], 10)
+    assert results
+
+
+def test_fuzzy_search(bench, engines):
+    search = engines.SearchEngine()
+    bench(search.fuzzy_search, 'pixl quz')
+
+
+def test_smart_search(bench, engines):
+    search = engines.AdvancedSearchEngine()
+    bench(search.smart_search, 'smart notes', {'min_rating': 3})
+
+
+def test_create_backup(bench, engines, capsys):
+    backups = engines.BackupManager()
+    bench(backups.create_backup)
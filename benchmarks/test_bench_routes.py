@@ -0,0 +1,53 @@
+"""Benchmarks for the catalog and search routes through the Flask test client"""
+
+import pytest
+
+pytest.importorskip('flask')
+
+
+@pytest.fixture
+def client(appmod, monkeypatch):
+    # Measure rendering, not full-page cache hits
+    monkeypatch.setattr(appmod.page_cache, 'enabled', False)
+    appmod.app.config['TESTING'] = True
+    client = appmod.app.test_client()
+    client.apps = appmod.load_apps()
+    return client
+
+
+def _get(client, url):
+    response = client.get(url)
+    assert response.status_code == 200, url
+    return response
+
+
+def test_index(bench, client):
+    bench(_get, client, '/')
+
+
+def test_app_detail(bench, client):
+    # The most reviewed app is the worst case for the detail page
+    app_id = max(client.apps, key=lambda a: len(a['reviews']))['id']
+    bench(_get, client, f'/app/{app_id}')
+
+
+def test_category(bench, client):
+    bench(_get, client, '/category/Games')
+
+
+def test_search(bench, client):
+    bench(_get, client, '/search?q=quiz')
+
+
+def test_search_suggestions(bench, client):
+    bench(_get, client, '/api/search/suggestions?q=pi')
+
+
+def test_advanced_search(bench, client):
+    payload = {'query': 'notes', 'category': 'Tools', 'min_rating': 3, 'sort_by': 'downloads'}
+
+    def post():
+        response = client.post('/api/search/advanced', json=payload)
+        assert response.status_code == 200
+
+    bench(post)
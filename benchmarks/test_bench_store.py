@@ -0,0 +1,20 @@
+"""Benchmarks for the JSON catalog store in app.py"""
+
+import pytest
+
+pytest.importorskip('flask')
+
+
+def test_load_apps(bench, appmod):
+    apps = bench(appmod.load_apps)
+    assert apps
+
+
+def test_save_apps(bench, appmod):
+    apps = appmod.load_apps()
+    bench(appmod.save_apps, apps)
+
+
+def test_save_apps_counters_only(bench, appmod):
+    apps = appmod.load_apps()
+    bench(appmod.save_apps, apps, counters_only=True)
@@ -0,0 +1,158 @@
+"""
+BM25 Ranking Index
+Relevance ranking for the store manager's AdvancedSearchEngine.smart_search,
+built once per catalog version from the folded words (search_text.py) of
+each app instead of substring-testing every field of every app per query:
+
+- Term statistics are precomputed: per word, the apps it occurs in with its
+  field-weighted frequency there (a name occurrence counts more than a
+  description one, BM25F style); per app, its length normalization
+  k1 * (1 - b + b * length / average length); per word, its IDF and the
+  highest score any of its apps can get from it.
+- Popularity (downloads, rating) is a prior kept in its own array and only
+  added to apps matching at least one query word, so it orders matches but
+  never makes an app match.
+- Query words match whole words, and as prefixes: a word of at least
+  ``MIN_PREFIX`` letters also stands for up to ``PREFIX_EXPANSIONS`` longer
+  words of the vocabulary it begins (shortest first, found by bisecting the
+  sorted vocabulary), scored at ``PREFIX_WEIGHT``. So "pix" still finds
+  "Pixelmator"; text in the middle of a word ("mator") no longer matches.
+- Queries run term-at-a-time, rarest word first, accumulating scores per
+  app. Once ``limit`` apps score more than any other app could still reach
+  with the remaining words (their maximum scores plus the highest prior),
+  new apps are no longer admitted, accumulators that cannot make the top
+  any more are dropped, and the remaining (common, long) postings are only
+  probed for the apps still in the running.
+"""
+
+import heapq
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+
+from search_text import search_fields, words
+
+K1 = 1.2
+B = 0.75
+# Field -> weight of one occurrence there
+FIELD_WEIGHTS = {'name': 2.5, 'category': 2.0, 'developer': 1.5, 'tags': 1.5, 'description': 1.0}
+PRIOR_WEIGHT = 1.0  # the most popular, best rated app gets this on top of its text score
+MIN_PREFIX = 3
+PREFIX_EXPANSIONS = 16
+PREFIX_WEIGHT = 0.6  # a word the query word only begins counts this much of a whole-word match
+
+
+def _number(value) -> float:
+    try:
+        return max(float(value or 0), 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class BM25Index:
+    """Postings, document statistics and priors of one catalog version; documents are catalog positions"""
+
+    def __init__(self, postings: dict, lengths, priors):
+        self.postings = postings  # word -> (positions array, field-weighted term frequencies array)
+        self.lengths = lengths    # position -> field-weighted word count
+        self.priors = priors      # position -> popularity prior, 0..PRIOR_WEIGHT
+        self.max_prior = max(priors, default=0.0)
+        average = sum(lengths) / len(lengths) if lengths else 0.0
+        self.norms = array('d', (K1 * (1 - B + B * length / average) if average else K1 for length in lengths))
+        count = len(lengths)
+        self.idf = {word: math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+                    for word, (docs, _) in postings.items()}
+        self.max_scores = {word: max(self.idf[word] * tf * (K1 + 1) / (tf + self.norms[doc])
+                                     for doc, tf in zip(docs, tfs))
+                           for word, (docs, tfs) in postings.items()}
+        self.vocabulary = sorted(postings)
+
+    @classmethod
+    def from_apps(cls, apps) -> 'BM25Index':
+        apps = list(apps)
+        found = {}  # word -> ([positions], [frequencies])
+        lengths = array('d')
+        for position, app in enumerate(apps):
+            text = search_fields(app)
+            frequencies, length = {}, 0.0
+            for field, weight in FIELD_WEIGHTS.items():
+                field_words = words(' '.join(text['tags'])) if field == 'tags' else words(text[field])
+                length += weight * len(field_words)
+                for word in field_words:
+                    frequencies[word] = frequencies.get(word, 0.0) + weight
+            for word, frequency in frequencies.items():
+                docs, tfs = found.setdefault(word, ([], []))
+                docs.append(position)
+                tfs.append(frequency)
+            lengths.append(length)
+        postings = {word: (array('I', docs), array('d', tfs)) for word, (docs, tfs) in found.items()}
+        return cls(postings, lengths, _priors(apps))
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def expand(self, query_words) -> dict:
+        """Indexed word -> weight for ``query_words``: each word itself, and the longer words it begins"""
+        factors = {}
+        for word in query_words:
+            if word in self.postings:
+                factors[word] = 1.0
+            if len(word) < MIN_PREFIX:
+                continue
+            vocabulary = self.vocabulary
+            start = bisect_right(vocabulary, word)
+            end = bisect_left(vocabulary, word + '\U0010ffff', start)
+            for longer in heapq.nsmallest(PREFIX_EXPANSIONS, vocabulary[start:end], key=len):
+                factors[longer] = max(factors.get(longer, 0.0), PREFIX_WEIGHT)
+        return factors
+
+    def search(self, query_words, limit: int = None, allowed=None) -> list:
+        """
+        (position, score) of the apps matching any of ``query_words``
+        (folded; whole words or prefixes, see expand()), best first.
+        ``allowed`` is a mask over positions (the search filters);
+        ``limit=None`` ranks every match.
+        """
+        factors = self.expand(query_words)
+        terms = sorted(factors, key=lambda word: factors[word] * self.idf[word], reverse=True)
+        # remaining[n]: the most the words from n on can still add to one app
+        remaining = [0.0] * (len(terms) + 1)
+        for n in range(len(terms) - 1, -1, -1):
+            remaining[n] = remaining[n + 1] + factors[terms[n]] * self.max_scores[terms[n]]
+        scores, priors, norms = {}, self.priors, self.norms
+        closed = False
+        for n, term in enumerate(terms):
+            docs, tfs = self.postings[term]
+            weight = factors[term] * self.idf[term] * (K1 + 1)
+            if limit is not None and len(scores) >= limit:
+                kth = heapq.nlargest(limit, (score + priors[doc] for doc, score in scores.items()))[-1]
+                # An app not seen yet scores at most remaining[n] + its prior
+                closed = closed or kth >= remaining[n] + self.max_prior
+                if closed:
+                    scores = {doc: score for doc, score in scores.items()
+                              if score + priors[doc] + remaining[n] >= kth}
+            if not closed:
+                for doc, tf in zip(docs, tfs):
+                    if allowed is None or allowed[doc]:
+                        scores[doc] = scores.get(doc, 0.0) + weight * tf / (tf + norms[doc])
+            elif len(scores) * math.log2(len(docs) + 1) < len(docs):
+                for doc in scores:  # probe the posting for the few apps still in the running
+                    at = bisect_left(docs, doc)
+                    if at < len(docs) and docs[at] == doc:
+                        tf = tfs[at]
+                        scores[doc] += weight * tf / (tf + norms[doc])
+            else:
+                for doc, tf in zip(docs, tfs):
+                    if doc in scores:
+                        scores[doc] += weight * tf / (tf + norms[doc])
+        ranked = ((score + priors[doc], -doc) for doc, score in scores.items())
+        ranked = heapq.nlargest(limit, ranked) if limit is not None else sorted(ranked, reverse=True)
+        return [(-doc, score) for score, doc in ranked]
+
+
+def _priors(apps) -> array:
+    """Half log-scaled downloads, half rating, relative to the catalog's best"""
+    downloads = [math.log1p(_number(app.get('downloads'))) for app in apps]
+    most = max(downloads, default=0.0) or 1.0
+    return array('d', (PRIOR_WEIGHT * (0.5 * d / most + 0.5 * min(_number(app.get('rating')), 5.0) / 5)
+                       for d, app in zip(downloads, apps)))
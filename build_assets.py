@@ -0,0 +1,211 @@
+"""
+Static Asset Build Pipeline
+Bundles the CSS/JS files each template uses, minifies them, precompresses them
+(gzip, and brotli when the module is installed) and writes static/dist/manifest.json
+mapping logical bundle names to content-hashed file names.
+
+Run after changing anything in static/css or static/js:
+    python build_assets.py
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).parent.absolute()
+STATIC_DIR = PROJECT_DIR / "static"
+DIST_DIR = STATIC_DIR / "dist"
+MANIFEST_FILE = DIST_DIR / "manifest.json"
+
+# Logical bundle name -> source files (relative to static/), in load order.
+# Templates reference bundles through asset_urls('<name>') in app.py.
+BUNDLES = {
+    'base.css': [
+        'css/style.css',
+        'css/style-enhanced.css',
+        'css/search-enhanced.css',
+        'css/nav-enhanced.css',
+        'css/app-display-playstore.css',
+        'css/app-sections-enhanced.css',
+        'css/app-visibility-fix.css',
+        'css/welcome-onboarding.css',
+    ],
+    'base.js': [
+        'js/main-enhanced.js',
+        'js/search-enhanced.js',
+        'js/wishlist.js',
+        'js/helpful-reviews.js',
+        'js/welcome-onboarding.js',
+    ],
+    # ES module, must stay a separate <script type="module">
+    'auth-header-sync.js': [
+        'js/auth-header-sync.js',
+    ],
+    'app_detail.css': [
+        'css/download-enhanced.css',
+        'css/helpful-reviews.css',
+    ],
+    'app_detail.js': [
+        'js/review-system.js',
+        'js/download-enhanced.js',
+    ],
+    'wishlist.css': [
+        'css/helpful-reviews.css',
+    ],
+}
+
+HASH_LENGTH = 10
+
+_CSS_COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+_CSS_IMPORT_RE = re.compile(r'@import\s+(?:url\(\s*)?([\'"])(?:(?!\1).)*\1\s*\)?[^;]*;')
+_CSS_SPACE_RE = re.compile(r'\s+')
+_CSS_PUNCT_RE = re.compile(r'\s*([{};,])\s*')
+
+
+def minify_css(source: str) -> str:
+    """Conservative CSS minifier: comments, whitespace and redundant semicolons"""
+    try:
+        import rcssmin
+        return rcssmin.cssmin(source)
+    except ImportError:
+        pass
+    css = _CSS_COMMENT_RE.sub('', source)
+    css = _CSS_SPACE_RE.sub(' ', css)
+    css = _CSS_PUNCT_RE.sub(r'\1', css)
+    return css.replace(';}', '}').strip()
+
+
+def minify_js(source: str) -> str:
+    """
+    Conservative JS minifier: drops blank lines, indentation and whole-line
+    // comments. Uses rjsmin for full minification when it is installed.
+    """
+    try:
+        import rjsmin
+        return rjsmin.jsmin(source)
+    except ImportError:
+        pass
+    lines = []
+    in_template = False
+    for line in source.splitlines():
+        opens_or_closes = line.count('`') % 2 == 1
+        if in_template:
+            # Never touch the inside of multi-line template literals
+            lines.append(line)
+        else:
+            stripped = line.lstrip() if opens_or_closes else line.strip()
+            if stripped and not stripped.startswith('//'):
+                lines.append(stripped)
+        if opens_or_closes:
+            in_template = not in_template
+    return '\n'.join(lines)
+
+
+def build_bundle(name: str, sources: list) -> bytes:
+    """Concatenate and minify one bundle"""
+    contents = []
+    for source in sources:
+        with open(STATIC_DIR / source, 'r', encoding='utf-8') as f:
+            contents.append(f.read())
+
+    if name.endswith('.css'):
+        # @import is only valid at the top of a stylesheet, so hoist them
+        imports = []
+        bodies = []
+        for css in contents:
+            css = _CSS_COMMENT_RE.sub('', css)
+            for match in _CSS_IMPORT_RE.finditer(css):
+                if match.group(0) not in imports:
+                    imports.append(match.group(0))
+            bodies.append(_CSS_IMPORT_RE.sub('', css))
+        output = ''.join(imports) + minify_css('\n'.join(bodies))
+    else:
+        # Guard against files that don't end with a semicolon
+        output = '\n;'.join(minify_js(js) for js in contents)
+    return output.encode('utf-8')
+
+
+def write_compressed(path: Path, data: bytes):
+    """Write .gz (and .br when available) next to the asset for static servers"""
+    with open(f"{path}.gz", 'wb') as f:
+        # mtime=0 keeps the output byte-for-byte reproducible
+        with gzip.GzipFile(fileobj=f, mode='wb', compresslevel=9, mtime=0) as gz:
+            gz.write(data)
+    try:
+        import brotli
+    except ImportError:
+        return False
+    with open(f"{path}.br", 'wb') as f:
+        f.write(brotli.compress(data, quality=11))
+    return True
+
+
+def hashed_name(name: str, data: bytes) -> str:
+    stem, ext = os.path.splitext(name)
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    return f"{stem}.{digest}{ext}"
+
+
+def load_manifest() -> dict:
+    if MANIFEST_FILE.exists():
+        with open(MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+
+def prune(keep: set):
+    """Remove outputs not referenced by the current or previous manifest"""
+    for path in DIST_DIR.iterdir():
+        base = path.name
+        for suffix in ('.gz', '.br'):
+            if base.endswith(suffix):
+                base = base[:-len(suffix)]
+        if path != MANIFEST_FILE and base not in keep:
+            path.unlink()
+            print(f"🗑️ Removed stale asset: {path.name}")
+
+
+def build_assets() -> dict:
+    """Build every bundle and write the manifest; returns the new manifest"""
+    DIST_DIR.mkdir(parents=True, exist_ok=True)
+    previous = load_manifest()
+    manifest = {}
+    has_brotli = False
+
+    for name, sources in BUNDLES.items():
+        data = build_bundle(name, sources)
+        filename = hashed_name(name, data)
+        target = DIST_DIR / filename
+        if not target.exists():
+            tmp_path = DIST_DIR / f".{filename}.tmp"
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, target)
+        has_brotli = write_compressed(target, data) or has_brotli
+        manifest[name] = filename
+        original = sum((STATIC_DIR / s).stat().st_size for s in sources)
+        print(f"✅ {name} -> dist/{filename} ({original:,} -> {len(data):,} bytes)")
+
+    # Keep the previous build around so pages rendered before a deploy still load
+    prune(set(manifest.values()) | set(previous.values()))
+
+    tmp_manifest = DIST_DIR / ".manifest.json.tmp"
+    with open(tmp_manifest, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_manifest, MANIFEST_FILE)
+
+    if not has_brotli:
+        print("ℹ️ brotli module not installed - only .gz files were written")
+    print(f"📦 Manifest written: {MANIFEST_FILE}")
+    return manifest
+
+
+if __name__ == '__main__':
+    try:
+        build_assets()
+    except FileNotFoundError as e:
+        print(f"❌ Missing source file: {e.filename}")
+        sys.exit(1)
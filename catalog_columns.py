@@ -0,0 +1,271 @@
+"""
+Columnar Catalog View
+The numeric and boolean app fields the listings filter and sort on (price,
+rating, downloads, views, added date, featured, contains_ads, category),
+extracted once per catalog version into typed arrays in catalog order.
+Filters become masks over whole columns and sorts become argsorts, instead
+of calling float(app.get('price', 0)) and friends for every app in every
+list pass; only the apps that end up on the page are decoded.
+
+The columns also carry the folded search text of each app and lazily
+built category and rating indexes, which filter_plan.py uses to pick its
+candidates.
+
+Uses numpy when it is installed; otherwise the same interface runs on the
+standard library's array module (slower, but without the per-field dict
+lookups and conversions).
+"""
+
+import heapq
+import operator
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+
+from search_text import search_fields
+
+try:
+    import numpy as np
+except ImportError:  # array/bytearray columns and plain loops instead
+    np = None
+
+# column -> (array typecode, numpy dtype)
+NUMERIC_COLUMNS = {
+    'price': ('d', 'float64'),
+    'rating': ('d', 'float64'),
+    'downloads': ('q', 'int64'),
+    'views': ('q', 'int64'),
+    'added': ('d', 'float64'),       # added_date as a POSIX timestamp, 0 if unknown
+    'category': ('i', 'int32'),      # index into CatalogColumns.categories
+    'name_rank': ('i', 'int32'),     # position of the app in name order
+}
+FLAG_COLUMNS = ('featured', 'contains_ads')
+TEXT_FIELDS = ('name', 'description', 'developer')  # what an advanced search query is matched against
+_COMPARISONS = {'>=': operator.ge, '<=': operator.le, '==': operator.eq, '>': operator.gt, '<': operator.lt}
+
+
+def parse_price(value) -> float:
+    """Prices are stored as strings ("0", "1.99"); anything unparsable counts as free"""
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def parse_date(value) -> float:
+    if not value:
+        return 0.0
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except (ValueError, OverflowError, OSError):
+        return 0.0
+
+
+def _number(value, default=0):
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else default
+
+
+class CatalogColumns:
+    """Typed columns of one catalog version; positions are indexes into the catalog's app list"""
+
+    def __init__(self, ids: list, columns: dict, categories: list, texts: list = None):
+        self.ids = ids
+        self.columns = columns
+        self.categories = categories
+        self.texts = texts if texts is not None else [''] * len(ids)
+        self._category_codes = {name: code for code, name in enumerate(categories)}
+        self._positions = None
+        self._values = {}
+        self._indexes = {}  # shared with with_counts() copies; never over views/downloads
+
+    @classmethod
+    def from_apps(cls, apps) -> 'CatalogColumns':
+        apps = list(apps)
+        categories = sorted({str(app.get('category', '')) for app in apps})
+        codes = {name: code for code, name in enumerate(categories)}
+        values = {
+            'price': [parse_price(app.get('price', 0)) for app in apps],
+            'rating': [float(_number(app.get('rating', 0))) for app in apps],
+            'downloads': [int(_number(app.get('downloads', 0))) for app in apps],
+            'views': [int(_number(app.get('views', 0))) for app in apps],
+            'added': [parse_date(app.get('added_date')) for app in apps],
+            'category': [codes[str(app.get('category', ''))] for app in apps],
+        }
+        name_rank = [0] * len(apps)
+        for rank, i in enumerate(sorted(range(len(apps)), key=lambda i: str(apps[i].get('name', '')))):
+            name_rank[i] = rank
+        values['name_rank'] = name_rank
+        columns = {name: _column(values[name], *NUMERIC_COLUMNS[name]) for name in NUMERIC_COLUMNS}
+        for name in FLAG_COLUMNS:
+            columns[name] = _flags(bool(app.get(name, False)) for app in apps)
+        # The folded search fields (search_text.py), joined by a newline, which folding removes from queries
+        texts = []
+        for app in apps:
+            fields = search_fields(app)
+            texts.append('\n'.join(fields[field] for field in TEXT_FIELDS))
+        return cls([str(app.get('id', '')) for app in apps], columns, categories, texts)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def position(self, app_id: str):
+        if self._positions is None:
+            self._positions = {app_id: i for i, app_id in enumerate(self.ids)}
+        return self._positions.get(app_id)
+
+    def with_counts(self, pending: dict) -> 'CatalogColumns':
+        """A copy whose views/downloads include pending shared-counter increments"""
+        if not pending:
+            return self
+        columns = dict(self.columns)
+        for field in ('views', 'downloads'):
+            column = columns[field] = columns[field].copy() if np is not None else array('q', columns[field])
+            for app_id, deltas in pending.items():
+                i = self.position(app_id)
+                if i is not None and deltas.get(field):
+                    column[i] += deltas[field]
+        copy = CatalogColumns(self.ids, columns, self.categories, self.texts)
+        copy._positions, copy._indexes = self._positions, self._indexes
+        return copy
+
+    def with_totals(self, totals: dict) -> 'CatalogColumns':
+        """A copy whose views/downloads are ``totals`` (field -> count per position), for a recounted catalog"""
+        columns = dict(self.columns)
+        for field, values in totals.items():
+            columns[field] = _column(values, *NUMERIC_COLUMNS[field])
+        copy = CatalogColumns(self.ids, columns, self.categories, self.texts)
+        copy._positions, copy._indexes = self._positions, self._indexes
+        return copy
+
+    def values(self, name: str):
+        """A column as a plain sequence for per-app access (numpy columns are converted once)"""
+        if np is None:
+            return self.columns[name]
+        values = self._values.get(name)
+        if values is None:
+            values = self._values[name] = self.columns[name].tolist()
+        return values
+
+    # ----- indexes -----
+
+    def category_index(self) -> dict:
+        """Category code -> positions of its apps, in catalog order"""
+        index = self._indexes.get('category')
+        if index is None:
+            index = {}
+            for i, code in enumerate(self.values('category')):
+                index.setdefault(code, []).append(i)
+            self._indexes['category'] = index
+        return index
+
+    def rated_at_least(self, min_rating: float) -> list:
+        """Positions of the apps rated ``min_rating`` or more, from a rating-sorted index"""
+        index = self._indexes.get('rating')
+        if index is None:
+            ratings = self.values('rating')
+            by_rating = sorted(range(len(self)), key=ratings.__getitem__)
+            index = self._indexes['rating'] = ([ratings[i] for i in by_rating], by_rating)
+        ratings, by_rating = index
+        return by_rating[bisect_left(ratings, min_rating):]
+
+    # ----- masks -----
+
+    def category_codes(self, name: str, ignore_case: bool = False) -> list:
+        if not ignore_case:
+            code = self._category_codes.get(name)
+            return [] if code is None else [code]
+        folded = name.casefold()
+        return [code for code, category in enumerate(self.categories) if category.casefold() == folded]
+
+    def all(self):
+        return np.ones(len(self), dtype=bool) if np is not None else bytearray(b'\x01') * len(self)
+
+    def mask(self, category=None, exclude_category=None, ignore_case=False, min_rating=None,
+             min_price=None, max_price=None, free_only=False, no_ads=False, featured=None):
+        """Mask of the apps matching every given criterion"""
+        mask = self.all()
+        if category is not None:
+            mask = _and(mask, self.isin('category', self.category_codes(category, ignore_case)))
+        if exclude_category is not None:
+            mask = _and(mask, _not(self.isin('category', self.category_codes(exclude_category, ignore_case))))
+        if min_rating is not None:
+            mask = _and(mask, self.compare('rating', '>=', float(min_rating)))
+        if min_price is not None:
+            mask = _and(mask, self.compare('price', '>=', float(min_price)))
+        if max_price is not None:
+            mask = _and(mask, self.compare('price', '<=', float(max_price)))
+        if free_only:
+            mask = _and(mask, self.compare('price', '==', 0.0))
+        if no_ads:
+            mask = _and(mask, _not(self.columns['contains_ads']))
+        if featured is not None:
+            flags = self.columns['featured']
+            mask = _and(mask, flags if featured else _not(flags))
+        return mask
+
+    def compare(self, name: str, op: str, value):
+        """Mask of ``column <op> value``"""
+        compare, column = _COMPARISONS[op], self.columns[name]
+        if np is not None:
+            return compare(column, value)
+        return bytearray(compare(v, value) for v in column)
+
+    def isin(self, name: str, values):
+        column = self.columns[name]
+        if np is not None:
+            return np.isin(column, list(values))
+        values = set(values)
+        return bytearray(v in values for v in column)
+
+    # ----- selection -----
+
+    def positions(self, mask) -> list:
+        """Positions set in ``mask``, in catalog order"""
+        if np is not None:
+            return np.flatnonzero(mask).tolist()
+        return [i for i, flag in enumerate(mask) if flag]
+
+    def order(self, name: str, mask=None, descending: bool = False, limit: int = None) -> list:
+        """
+        Positions (of ``mask``, or all apps) sorted by a column; ties keep
+        catalog order, like a stable sort. ``limit`` selects only the top
+        entries without sorting the rest.
+        """
+        column = self.columns[name]
+        if np is not None:
+            idx = np.flatnonzero(mask) if mask is not None else np.arange(len(self))
+            keys = -column[idx] if descending else column[idx]
+            if limit is not None and limit < len(idx):
+                # Keep everything tied with the k-th key so the stable sort picks the right ones
+                kth = np.partition(keys, limit - 1)[limit - 1]
+                keep = keys <= kth
+                idx, keys = idx[keep], keys[keep]
+            return idx[np.argsort(keys, kind='stable')][:limit].tolist()
+        idx = self.positions(mask) if mask is not None else range(len(self))
+        sign = -1 if descending else 1
+        if limit is not None:
+            return heapq.nsmallest(limit, idx, key=lambda i: (sign * column[i], i))
+        return sorted(idx, key=lambda i: sign * column[i])
+
+    def any(self, mask) -> bool:
+        return bool(mask.any()) if np is not None else any(mask)
+
+
+def _column(values, typecode, dtype):
+    return np.array(values, dtype=dtype) if np is not None else array(typecode, values)
+
+
+def _flags(values):
+    return np.fromiter(values, dtype=bool) if np is not None else bytearray(values)
+
+
+def _and(a, b):
+    if np is not None:
+        return a & b
+    return bytearray(x and y for x, y in zip(a, b))
+
+
+def _not(mask):
+    if np is not None:
+        return ~mask
+    return bytearray(not x for x in mask)
@@ -0,0 +1,209 @@
+"""
+Collection Store
+User collections of apps, in the user_collections / collection_apps tables
+of data/social.db that the store manager already uses, instead of one
+collections.json document rewritten on every change:
+
+- A user's collections are an indexed lookup, not a scan of every collection.
+- Membership is a set (one row per app, unique per collection) that keeps
+  the order apps were added in; checking or adding an app touches one row.
+- Every change writes only the rows it affects.
+- Each collection keeps its app count and the ids of its first few apps
+  (the preview strip on profiles), updated when its membership changes.
+"""
+
+import json
+import uuid
+from datetime import datetime
+
+PREVIEW_SIZE = 4
+
+
+class CollectionStore:
+    """Collections on top of the SocialGraph's database (connections and transactions)"""
+
+    def __init__(self, db):
+        self.db = db
+        db.transaction(self._migrate)
+
+    @staticmethod
+    def _migrate(conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS user_collections (
+                collection_id TEXT PRIMARY KEY,
+                user_id TEXT,
+                name TEXT,
+                description TEXT,
+                public BOOLEAN DEFAULT 1,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS collection_apps (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                collection_id TEXT,
+                app_id TEXT,
+                added_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                notes TEXT,
+                FOREIGN KEY (collection_id) REFERENCES user_collections(collection_id)
+            )
+        ''')
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(user_collections)')}
+        if 'apps_count' in columns:
+            return
+        conn.execute('ALTER TABLE user_collections ADD COLUMN updated_at TEXT')
+        conn.execute('ALTER TABLE user_collections ADD COLUMN apps_count INTEGER NOT NULL DEFAULT 0')
+        conn.execute("ALTER TABLE user_collections ADD COLUMN preview TEXT NOT NULL DEFAULT '[]'")
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_user_collections_user ON user_collections (user_id, created_at)')
+        # Membership becomes a set: drop repeated adds before making it unique
+        conn.execute('''
+            DELETE FROM collection_apps WHERE id NOT IN
+            (SELECT MIN(id) FROM collection_apps GROUP BY collection_id, app_id)
+        ''')
+        conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_collection_apps_member '
+                     'ON collection_apps (collection_id, app_id)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_collection_apps_order ON collection_apps (collection_id, id)')
+        for (collection_id,) in conn.execute('SELECT collection_id FROM user_collections').fetchall():
+            CollectionStore._refresh(conn, collection_id)
+
+    @staticmethod
+    def _refresh(conn, collection_id: str, updated_at: str = None):
+        """Recompute the stored count and preview strip of a collection"""
+        preview = [row[0] for row in conn.execute(
+            'SELECT app_id FROM collection_apps WHERE collection_id = ? ORDER BY id LIMIT ?',
+            (collection_id, PREVIEW_SIZE))]
+        conn.execute('''
+            UPDATE user_collections SET preview = ?, updated_at = ?,
+                apps_count = (SELECT COUNT(*) FROM collection_apps WHERE collection_id = ?)
+            WHERE collection_id = ?
+        ''', (json.dumps(preview), updated_at or datetime.now().isoformat(), collection_id, collection_id))
+
+    _COLUMNS = ('collection_id, user_id, name, description, public, created_at, '
+                'updated_at, apps_count, preview')
+
+    @staticmethod
+    def _as_dict(row) -> dict:
+        collection_id, user_id, name, description, public, created_at, updated_at, apps_count, preview = row
+        return {
+            'id': collection_id,
+            'user_id': user_id,
+            'name': name,
+            'description': description or '',
+            'is_public': bool(public),
+            'created_at': created_at,
+            'updated_at': updated_at or created_at,
+            'apps_count': apps_count,
+            'preview': json.loads(preview),
+        }
+
+    # ----- reading -----
+
+    def get(self, collection_id: str, with_apps: bool = True):
+        """A collection (with its app ids in the order they were added), None if there is none"""
+        conn = self.db.connection()
+        row = conn.execute(f'SELECT {self._COLUMNS} FROM user_collections WHERE collection_id = ?',
+                           (collection_id,)).fetchone()
+        if row is None:
+            return None
+        collection = self._as_dict(row)
+        if with_apps:
+            collection['apps'] = [r[0] for r in conn.execute(
+                'SELECT app_id FROM collection_apps WHERE collection_id = ? ORDER BY id', (collection_id,))]
+        return collection
+
+    def for_user(self, user_id: str, public_only: bool = False) -> list:
+        """A user's collections, oldest first, with counts and previews but not the full app lists"""
+        rows = self.db.connection().execute(
+            f'SELECT {self._COLUMNS} FROM user_collections WHERE user_id = ? '
+            f'{"AND public " if public_only else ""}ORDER BY created_at', (user_id,)).fetchall()
+        return [self._as_dict(row) for row in rows]
+
+    def scan(self):
+        """Every collection, oldest first, with its app ids in the order they were added"""
+        conn = self.db.connection()
+        apps = {}
+        for collection_id, app_id in conn.execute('SELECT collection_id, app_id FROM collection_apps ORDER BY id'):
+            apps.setdefault(collection_id, []).append(app_id)
+        for row in conn.execute(f'SELECT {self._COLUMNS} FROM user_collections ORDER BY created_at').fetchall():
+            collection = self._as_dict(row)
+            collection['apps'] = apps.get(collection['id'], [])
+            yield collection
+
+    def contains(self, collection_id: str, app_id: str) -> bool:
+        return self.db.connection().execute(
+            'SELECT 1 FROM collection_apps WHERE collection_id = ? AND app_id = ?',
+            (collection_id, app_id)).fetchone() is not None
+
+    # ----- changes -----
+
+    def create(self, user_id: str, name: str, description: str = '', apps=(), is_public: bool = True) -> dict:
+        collection_id = str(uuid.uuid4())
+        created_at = datetime.now().isoformat()
+
+        def work(conn):
+            conn.execute('''
+                INSERT INTO user_collections (collection_id, user_id, name, description, public, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (collection_id, user_id, name, description, bool(is_public), created_at))
+            conn.executemany('INSERT OR IGNORE INTO collection_apps (collection_id, app_id) VALUES (?, ?)',
+                             ((collection_id, app_id) for app_id in apps))
+            self._refresh(conn, collection_id)
+
+        self.db.transaction(work)
+        return self.get(collection_id)
+
+    def add_app(self, collection_id: str, app_id: str, notes: str = '') -> bool:
+        """Add an app at the end; False if it was already in the collection"""
+        def work(conn):
+            added = conn.execute('INSERT OR IGNORE INTO collection_apps (collection_id, app_id, notes) '
+                                 'VALUES (?, ?, ?)', (collection_id, app_id, notes)).rowcount == 1
+            if added:
+                self._refresh(conn, collection_id)
+            return added
+
+        return self.db.transaction(work)
+
+    def remove_app(self, collection_id: str, app_id: str) -> bool:
+        def work(conn):
+            removed = conn.execute('DELETE FROM collection_apps WHERE collection_id = ? AND app_id = ?',
+                                   (collection_id, app_id)).rowcount == 1
+            if removed:
+                self._refresh(conn, collection_id)
+            return removed
+
+        return self.db.transaction(work)
+
+    def delete(self, collection_id: str) -> bool:
+        def work(conn):
+            conn.execute('DELETE FROM collection_apps WHERE collection_id = ?', (collection_id,))
+            return conn.execute('DELETE FROM user_collections WHERE collection_id = ?',
+                                (collection_id,)).rowcount == 1
+
+        return self.db.transaction(work)
+
+    def import_once(self, name: str, load_collections) -> int:
+        """
+        Add the collections returned by ``load_collections()`` (dicts in the
+        old collections.json shape) unless an import called ``name`` already
+        ran; returns how many were added.
+        """
+        def work(conn):
+            if conn.execute('SELECT 1 FROM graph_imports WHERE name = ?', (name,)).fetchone():
+                return 0
+            added = 0
+            for c in load_collections():
+                if conn.execute('SELECT 1 FROM user_collections WHERE collection_id = ?', (c['id'],)).fetchone():
+                    continue
+                conn.execute('''
+                    INSERT INTO user_collections (collection_id, user_id, name, description, public, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (c['id'], c.get('user_id'), c.get('name', 'Untitled Collection'), c.get('description', ''),
+                      bool(c.get('is_public', True)), c.get('created_at') or datetime.now().isoformat()))
+                conn.executemany('INSERT OR IGNORE INTO collection_apps (collection_id, app_id) VALUES (?, ?)',
+                                 ((c['id'], app_id) for app_id in c.get('apps', [])))
+                self._refresh(conn, c['id'], c.get('updated_at'))
+                added += 1
+            conn.execute('INSERT INTO graph_imports (name) VALUES (?)', (name,))
+            return added
+
+        return self.db.transaction(work)
@@ -10,12 +10,16 @@ from datetime import datetime
 from pathlib import Path
 import shutil
 
+from collection_store import CollectionStore
+from social_graph import SocialGraph, backup_database
+from snapshot_store import export_snapshots, open_store, snapshot_path
+
 # Get the project directory
 PROJECT_DIR = Path(__file__).parent.absolute()
 
-def create_database():
+def create_database(db_path='app_store.db'):
     """Create SQLite database with proper schema"""
-    conn = sqlite3.connect('app_store.db')
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     
     # Create Users table
@@ -215,9 +219,14 @@ def create_database():
     conn.close()
     print("✅ Database schema created successfully!")
 
-def migrate_users():
-    """Migrate users from users.json to database"""
-    users_file = PROJECT_DIR / 'users.json'
+def _social_db(source_dir):
+    """The app's data/social.db under ``source_dir``, None for a directory without one (generated data)"""
+    path = Path(source_dir) / 'data' / 'social.db'
+    return path if path.exists() else None
+
+def migrate_users(source_dir=PROJECT_DIR, db_path='app_store.db'):
+    """Migrate users from users.json (follows from data/social.db when there is one) to database"""
+    users_file = Path(source_dir) / 'users.json'
     if not users_file.exists():
         print("⚠️ users.json not found, skipping user migration")
         return
@@ -225,7 +234,11 @@ def migrate_users():
     with open(users_file, 'r', encoding='utf-8') as f:
         users_data = json.load(f)
     
-    conn = sqlite3.connect('app_store.db')
+    # The app keeps follows in data/social.db; the lists in users.json are
+    # only what it imported on its first start
+    social_db = _social_db(source_dir)
+    
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     
     for user_id, user_data in users_data.items():
@@ -291,7 +304,7 @@ def migrate_users():
                 ))
             
             # Migrate followers/following
-            for follower_id in user_data.get('followers', []):
+            for follower_id in ([] if social_db else user_data.get('followers', [])):
                 cursor.execute('''
                     INSERT OR IGNORE INTO followers (follower_id, following_id) VALUES (?, ?)
                 ''', (follower_id, user_id))
@@ -315,13 +328,19 @@ def migrate_users():
         except Exception as e:
             print(f"❌ Error migrating user {user_id}: {e}")
     
+    if social_db:
+        cursor.executemany('''
+            INSERT OR IGNORE INTO followers (follower_id, following_id) VALUES (?, ?)
+        ''', SocialGraph(str(social_db)).edges())
+        print(f"👥 Follows migrated from {social_db.relative_to(source_dir)}")
+    
     conn.commit()
     conn.close()
     print(f"✅ Migrated {len(users_data)} users successfully!")
 
-def migrate_apps():
+def migrate_apps(source_dir=PROJECT_DIR, db_path='app_store.db'):
     """Migrate apps from apps_data.json to database"""
-    apps_file = PROJECT_DIR / 'apps_data.json'
+    apps_file = Path(source_dir) / 'apps_data.json'
     if not apps_file.exists():
         print("⚠️ apps_data.json not found, skipping apps migration")
         return
@@ -329,7 +348,7 @@ def migrate_apps():
     with open(apps_file, 'r', encoding='utf-8') as f:
         apps_data = json.load(f)
     
-    conn = sqlite3.connect('app_store.db')
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     
     for app in apps_data:
@@ -393,17 +412,26 @@ def migrate_apps():
     conn.close()
     print(f"✅ Migrated {len(apps_data)} apps successfully!")
 
-def migrate_collections():
-    """Migrate collections from collections.json to database"""
-    collections_file = PROJECT_DIR / 'collections.json'
-    if not collections_file.exists():
+def migrate_collections(source_dir=PROJECT_DIR, db_path='app_store.db'):
+    """Migrate collections from data/social.db (collections.json when there is none) to database"""
+    collections_file = Path(source_dir) / 'collections.json'
+    social_db = _social_db(source_dir)
+    if social_db:
+        # The app keeps collections in data/social.db; a database from before
+        # they moved there gets collections.json imported first, as on app start
+        store = CollectionStore(SocialGraph(str(social_db)))
+        store.import_once('collections.json', lambda: (
+            collection for _, collection in open_store(str(collections_file),
+                                                       snapshot_path(str(source_dir), 'collections')).scan()))
+        collections_data = {collection['id']: collection for collection in store.scan()}
+    elif collections_file.exists():
+        with open(collections_file, 'r', encoding='utf-8') as f:
+            collections_data = json.load(f)
+    else:
         print("⚠️ collections.json not found, skipping collections migration")
         return
     
-    with open(collections_file, 'r', encoding='utf-8') as f:
-        collections_data = json.load(f)
-    
-    conn = sqlite3.connect('app_store.db')
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     
     for collection_id, collection in collections_data.items():
@@ -436,9 +464,9 @@ def migrate_collections():
     conn.close()
     print(f"✅ Migrated {len(collections_data)} collections successfully!")
 
-def migrate_activities():
+def migrate_activities(source_dir=PROJECT_DIR, db_path='app_store.db'):
     """Migrate activities from activities.json to database"""
-    activities_file = PROJECT_DIR / 'activities.json'
+    activities_file = Path(source_dir) / 'activities.json'
     if not activities_file.exists():
         print("⚠️ activities.json not found, skipping activities migration")
         return
@@ -446,7 +474,7 @@ def migrate_activities():
     with open(activities_file, 'r', encoding='utf-8') as f:
         activities_data = json.load(f)
     
-    conn = sqlite3.connect('app_store.db')
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     
     for user_id, activities in activities_data.items():
@@ -480,21 +508,31 @@ def backup_json_files():
         'apps_data.json',
         'collections.json',
         'activities.json',
-        'analytics.json'
+        'analytics.json',
+        'data/users.snap',
+        'data/activities.snap',
+        'data/analytics.snap'
     ]
     
     for file in json_files:
         src = PROJECT_DIR / file
         if src.exists():
-            dst = backup_dir / f"{file}.backup"
+            dst = backup_dir / f"{Path(file).name}.backup"
             shutil.copy2(src, dst)
             print(f"📁 Backed up {file}")
     
+    # Follows, feeds and collections; copied with SQLite's backup API so the
+    # changes still in its WAL file are included
+    social_db = _social_db(PROJECT_DIR)
+    if social_db:
+        backup_database(str(social_db), str(backup_dir / 'social.db.backup'))
+        print("📁 Backed up data/social.db")
+    
     print("✅ All JSON files backed up successfully!")
 
-def verify_migration():
+def verify_migration(db_path='app_store.db'):
     """Verify that migration was successful"""
-    conn = sqlite3.connect('app_store.db')
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     
     tables = [
@@ -519,9 +557,13 @@ def main():
     print("🚀 Starting Database Migration...")
     print("=" * 50)
     
-    # Step 1: Backup existing JSON files
+    # Step 1: Backup existing JSON files and data/social.db, then bring the
+    # JSON up to date: the app keeps users, activities and analytics in
+    # data/*.snap, not in the JSON (follows and collections are read from
+    # data/social.db)
     print("\n📦 Step 1: Backing up JSON files...")
     backup_json_files()
+    export_snapshots(str(PROJECT_DIR))
     
     # Step 2: Create database schema
     print("\n🏗️ Step 2: Creating database schema...")
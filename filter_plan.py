@@ -0,0 +1,139 @@
+"""
+Filter Plans
+Advanced search criteria (the web's /api/search/advanced and the store
+manager's SearchEngine.advanced_filter) compiled into a single pass over the
+catalog's columns (catalog_columns.py), instead of one list comprehension per
+criterion followed by a full sort:
+
+- The most selective indexed criterion (category, minimum rating) chooses
+  the candidate apps, so a small category never visits the rest of the
+  catalog.
+- The remaining predicates run per candidate and stop at the first one that
+  fails, ordered by rank = (selectivity - 1) / cost, with selectivity
+  measured on a sample of the candidates (cheap, rejecting tests first).
+- Matches stream into a bounded heap that keeps the top ``limit`` entries;
+  the sort key of the last one is the cursor for the next page.
+
+A cursor is "<column>:<sort value>:<app id>". Ties are broken by app id, so
+a cursor still points at the same place after apps are added or removed. It
+only resumes the column it was made for. The value is the one the last app
+had when the page was served: an app whose views or downloads move across it
+between two pages may be listed twice or not at all, as with any keyset
+paging over live data.
+"""
+
+import heapq
+
+from search_text import fold
+
+SAMPLE_SIZE = 256
+MAX_LIMIT = 200
+TEXT_COST = 4  # a substring search costs about this many column lookups
+
+
+class FilterPlan:
+    """One set of criteria over one CatalogColumns"""
+
+    def __init__(self, columns, category=None, ignore_case=False, min_rating=None,
+                 min_price=None, max_price=None, free_only=False, no_ads=False, query=None):
+        self.columns = columns
+        indexed = []     # (candidate positions, the predicate checking the same criterion)
+        predicates = []  # (test, cost)
+        if category is not None:
+            codes = columns.category_codes(category, ignore_case)
+            index = columns.category_index()
+            positions = sorted(i for code in codes for i in index.get(code, ()))
+            indexed.append((positions, (_member(columns.values('category'), set(codes)), 1)))
+        if min_rating is not None:
+            min_rating = float(min_rating)
+            indexed.append((columns.rated_at_least(min_rating),
+                            (_at_least(columns.values('rating'), min_rating), 1)))
+        if min_price is not None:
+            predicates.append((_at_least(columns.values('price'), float(min_price)), 1))
+        if max_price is not None:
+            predicates.append((_at_most(columns.values('price'), float(max_price)), 1))
+        if free_only:
+            predicates.append((_at_most(columns.values('price'), 0.0), 1))
+        if no_ads:
+            ads = columns.values('contains_ads')
+            predicates.append((lambda i: not ads[i], 1))
+        query = fold(query)
+        if query:
+            texts = columns.texts
+            predicates.append((lambda i: query in texts[i], TEXT_COST))
+
+        if indexed:
+            indexed.sort(key=lambda entry: len(entry[0]))
+            self.candidates = indexed[0][0]
+            predicates.extend(predicate for _, predicate in indexed[1:])
+        else:
+            self.candidates = range(len(columns))
+        self.predicates = self._order(predicates)
+
+    def _order(self, predicates) -> list:
+        candidates = self.candidates
+        sample = candidates[::max(1, len(candidates) // SAMPLE_SIZE)]
+
+        def rank(predicate):
+            test, cost = predicate
+            selectivity = sum(1 for i in sample if test(i)) / len(sample) if sample else 0.0
+            return (selectivity - 1) / cost
+
+        return [test for test, _ in sorted(predicates, key=rank)]
+
+    def matches(self):
+        """Positions of the matching apps, in candidate order"""
+        tests = self.predicates
+        for i in self.candidates:
+            for test in tests:
+                if not test(i):
+                    break
+            else:
+                yield i
+
+    def page(self, order: str = None, descending: bool = False, limit=50, cursor: str = None):
+        """
+        Matches sorted by column ``order`` (ties, and ``order=None``, by app
+        id); returns (positions, next cursor). ``limit=None`` returns every
+        match. Raises ValueError for a malformed cursor or one made for
+        another order.
+        """
+        ids = self.columns.ids
+        if order is None:
+            keys = ((ids[i], i) for i in self.matches())
+        else:
+            values, sign = self.columns.values(order), -1 if descending else 1
+            keys = ((sign * values[i], ids[i], i) for i in self.matches())
+        if cursor:
+            after = _parse_cursor(cursor, order)
+            keys = (key for key in keys if key[:-1] > after)
+        if limit is None:
+            return [key[-1] for key in sorted(keys)], None
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        top = heapq.nsmallest(limit + 1, keys)
+        next_cursor = _cursor(order, top[limit - 1]) if len(top) > limit else None
+        return [key[-1] for key in top[:limit]], next_cursor
+
+
+def _cursor(order, key: tuple) -> str:
+    *value, app_id, _ = key
+    return f"{order or ''}:{repr(value[0]) if value else ''}:{app_id}"
+
+
+def _parse_cursor(cursor: str, order) -> tuple:
+    column, value, app_id = str(cursor).split(':', 2)
+    if column != (order or ''):
+        raise ValueError(f"cursor is for order {column!r}, not {order!r}")
+    return ((float(value),) if order else ()) + (app_id,)
+
+
+def _member(values, allowed: set):
+    return lambda i: values[i] in allowed
+
+
+def _at_least(values, bound):
+    return lambda i: values[i] >= bound
+
+
+def _at_most(values, bound):
+    return lambda i: values[i] <= bound
@@ -75,7 +75,9 @@ def fix_permissions():
     files_to_check = [
         'app.py',
         'apps_data.json',
-        'users.json'
+        'data/users.snap',
+        'data/activities.snap',
+        'data/analytics.snap'
     ]
     
     for file_path in files_to_check:
@@ -88,8 +90,9 @@ def create_default_files():
     """Create default files if they don't exist"""
     print("🔧 Creating default files...")
     
-    # Create users.json if it doesn't exist
-    if not os.path.exists('users.json'):
+    # Create users.json if there is no user store yet (a new users.json would
+    # be imported over data/users.snap on the next start)
+    if not os.path.exists('users.json') and not os.path.exists('data/users.snap'):
         default_users = {}
         with open('users.json', 'w') as f:
             json.dump(default_users, f, indent=2)
@@ -102,8 +105,8 @@ def create_default_files():
             json.dump(default_collections, f, indent=2)
         print("  Created default collections.json")
     
-    # Create activities.json if it doesn't exist
-    if not os.path.exists('activities.json'):
+    # Create activities.json if there is no activity store yet
+    if not os.path.exists('activities.json') and not os.path.exists('data/activities.snap'):
         default_activities = {}
         with open('activities.json', 'w') as f:
             json.dump(default_activities, f, indent=2)
@@ -157,7 +160,7 @@ def create_debug_info():
     important_files = [
         'app.py', 
         'apps_data.json', 
-        'users.json',
+        'data/users.snap',
         'manage_apps_enhanced.py'
     ]
     
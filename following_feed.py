@@ -0,0 +1,189 @@
+"""
+Following Feed
+What the people you follow did (downloads, reviews, new collections), kept
+next to the follow graph in data/social.db so a page is a couple of indexed
+queries instead of a walk over every followed user's activities.
+
+- Fan-out on write: an event by a user with up to ``fanout_limit`` followers
+  is stored once and its id inserted into each follower's inbox (a single
+  INSERT ... SELECT over the follows table).
+- Fan-out on read: events by accounts with more followers stay in the
+  author's outbox; a reader's page merges their inbox with the outboxes of
+  the (few) such accounts they follow.
+- Inboxes keep the newest ``inbox_size`` entries and outboxes the newest
+  ``outbox_size`` events. Every ``trim_every`` events a background thread
+  trims the ones over the limit, one user per transaction, so a publish
+  never waits for more than one user's trim.
+- Pages run newest first with a cursor (the last event id), so paging stays
+  stable while new events arrive.
+"""
+
+import heapq
+import json
+import logging
+import threading
+from datetime import datetime
+
+from social_graph import _IN_CHUNK, MAX_PAGE_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class FollowingFeed:
+    """Per-user feeds of followed users' events, on top of a SocialGraph"""
+
+    def __init__(self, graph, fanout_limit: int = 1000, inbox_size: int = 500,
+                 outbox_size: int = 500, trim_every: int = 1000):
+        self.graph = graph
+        self.fanout_limit = fanout_limit
+        self.inbox_size = inbox_size
+        self.outbox_size = outbox_size
+        self.trim_every = trim_every
+        self._trimming = threading.Lock()
+        graph.transaction(self._create_tables)
+
+    @staticmethod
+    def _create_tables(conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS feed_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                actor_id TEXT NOT NULL,
+                type TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                fanned_out INTEGER NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_feed_events_actor ON feed_events (actor_id, fanned_out, id)')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS feed_inbox (
+                user_id TEXT NOT NULL,
+                event_id INTEGER NOT NULL,
+                PRIMARY KEY (user_id, event_id)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_feed_inbox_event ON feed_inbox (event_id)')
+        # Accounts that have events left to be fanned out on read
+        conn.execute('CREATE TABLE IF NOT EXISTS feed_broadcasters (actor_id TEXT PRIMARY KEY) WITHOUT ROWID')
+
+    # ----- writing -----
+
+    def publish(self, actor_id: str, event_type: str, **payload) -> int:
+        """Record an event by ``actor_id`` and deliver it to their followers; returns its id"""
+        def work(conn):
+            row = conn.execute('SELECT followers FROM follow_counts WHERE user_id = ?', (actor_id,)).fetchone()
+            fan_out = (row[0] if row else 0) <= self.fanout_limit
+            event_id = conn.execute('''
+                INSERT INTO feed_events (actor_id, type, payload, created_at, fanned_out)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (actor_id, event_type, json.dumps(payload), datetime.now().isoformat(), int(fan_out))).lastrowid
+            if fan_out:
+                conn.execute('INSERT INTO feed_inbox (user_id, event_id) SELECT follower_id, ? FROM follows '
+                             'WHERE following_id = ?', (event_id, actor_id))
+            else:
+                conn.execute('INSERT OR IGNORE INTO feed_broadcasters (actor_id) VALUES (?)', (actor_id,))
+            return event_id
+
+        event_id = self.graph.transaction(work)
+        if event_id % self.trim_every == 0:
+            self._trim_in_background()
+        return event_id
+
+    def on_follow(self, follower_id: str, following_id: str):
+        """Backfill the new follower's inbox with the recent fanned-out events of who they followed"""
+        self.graph.transaction(lambda conn: conn.execute('''
+            INSERT OR IGNORE INTO feed_inbox (user_id, event_id)
+            SELECT ?, id FROM feed_events WHERE actor_id = ? AND fanned_out = 1 ORDER BY id DESC LIMIT ?
+        ''', (follower_id, following_id, self.inbox_size)))
+
+    def on_unfollow(self, follower_id: str, following_id: str):
+        """Take the unfollowed user's events out of the former follower's inbox"""
+        self.graph.transaction(lambda conn: conn.execute('''
+            DELETE FROM feed_inbox WHERE user_id = ?
+            AND event_id IN (SELECT id FROM feed_events WHERE actor_id = ?)
+        ''', (follower_id, following_id)))
+
+    def _trim_in_background(self):
+        if not self._trimming.acquire(blocking=False):
+            return  # this process is trimming already
+
+        def run():
+            try:
+                self.trim()
+            except Exception:
+                logger.exception("Feed trim failed")
+            finally:
+                self._trimming.release()
+
+        threading.Thread(target=run, name='feed-trim', daemon=True).start()
+
+    def trim(self):
+        """
+        Drop inbox entries and events past the size limits, and events no
+        inbox refers to any more. What to trim is found with reads only; each
+        user's deletes then run in a short transaction of their own.
+        """
+        conn = self.graph.connection()
+        over = conn.execute('SELECT user_id FROM feed_inbox GROUP BY user_id HAVING COUNT(*) > ?',
+                            (self.inbox_size,)).fetchall()
+        for (user_id,) in over:
+            self.graph.transaction(lambda conn: conn.execute('''
+                DELETE FROM feed_inbox WHERE user_id = ? AND event_id <= (
+                    SELECT event_id FROM feed_inbox WHERE user_id = ? ORDER BY event_id DESC LIMIT 1 OFFSET ?
+                )
+            ''', (user_id, user_id, self.inbox_size)))
+        over = conn.execute('SELECT actor_id FROM feed_events GROUP BY actor_id HAVING COUNT(*) > ?',
+                            (self.outbox_size,)).fetchall()
+        for (actor_id,) in over:
+            self.graph.transaction(lambda conn: self._trim_outbox(conn, actor_id))
+        # Events nobody can see any more; re-checked when deleting, since a
+        # new follower may have been given one meanwhile
+        orphans = [event_id for (event_id,) in conn.execute(
+            'SELECT id FROM feed_events WHERE fanned_out = 1 '
+            'AND NOT EXISTS (SELECT 1 FROM feed_inbox WHERE event_id = feed_events.id)')]
+        for start in range(0, len(orphans), _IN_CHUNK):
+            chunk = orphans[start:start + _IN_CHUNK]
+            self.graph.transaction(lambda conn: conn.execute(
+                f'DELETE FROM feed_events WHERE id IN ({",".join("?" * len(chunk))}) '
+                'AND NOT EXISTS (SELECT 1 FROM feed_inbox WHERE event_id = feed_events.id)', chunk))
+        self.graph.transaction(lambda conn: conn.execute(
+            'DELETE FROM feed_broadcasters WHERE NOT EXISTS '
+            '(SELECT 1 FROM feed_events WHERE actor_id = feed_broadcasters.actor_id AND fanned_out = 0)'))
+
+    def _trim_outbox(self, conn, actor_id: str):
+        """Drop the actor's events past ``outbox_size``, with their inbox entries"""
+        row = conn.execute('SELECT id FROM feed_events WHERE actor_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?',
+                           (actor_id, self.outbox_size)).fetchone()
+        if row is None:
+            return
+        conn.execute('DELETE FROM feed_inbox WHERE event_id IN '
+                     '(SELECT id FROM feed_events WHERE actor_id = ? AND id <= ?)', (actor_id, row[0]))
+        conn.execute('DELETE FROM feed_events WHERE actor_id = ? AND id <= ?', (actor_id, row[0]))
+
+    # ----- reading -----
+
+    def page(self, user_id: str, limit: int = 20, cursor=None):
+        """One page of ``user_id``'s feed, newest first; returns (events, next cursor)"""
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        before = int(cursor) if cursor else 2 ** 63 - 1
+        conn = self.graph.connection()
+        sources = [conn.execute('''
+            SELECT e.id, e.actor_id, e.type, e.payload, e.created_at
+            FROM feed_inbox i JOIN feed_events e ON e.id = i.event_id
+            WHERE i.user_id = ? AND i.event_id < ? ORDER BY i.event_id DESC LIMIT ?
+        ''', (user_id, before, limit + 1)).fetchall()]
+        broadcasters = conn.execute('''
+            SELECT following_id FROM follows WHERE follower_id = ?
+            AND following_id IN (SELECT actor_id FROM feed_broadcasters)
+        ''', (user_id,)).fetchall()
+        for (actor_id,) in broadcasters:
+            sources.append(conn.execute('''
+                SELECT id, actor_id, type, payload, created_at FROM feed_events
+                WHERE actor_id = ? AND fanned_out = 0 AND id < ? ORDER BY id DESC LIMIT ?
+            ''', (actor_id, before, limit + 1)).fetchall())
+        rows = list(heapq.merge(*sources, key=lambda row: row[0], reverse=True))[:limit + 1]
+        events = [{**json.loads(payload), 'id': event_id, 'actor_id': actor_id, 'type': event_type,
+                   'created_at': created_at}
+                  for event_id, actor_id, event_type, payload, created_at in rows[:limit]]
+        next_cursor = str(rows[limit - 1][0]) if len(rows) > limit else None
+        return events, next_cursor
@@ -0,0 +1,132 @@
+"""
+Template Fragment Cache
+A memory-bounded LRU backend for Flask-Caching plus the key helpers used by the
+{% cache %} blocks in the catalog templates. Keys embed a revision hash of the
+apps a fragment renders, so editing an app automatically stops its old
+fragments from being served; stale entries simply age out of the LRU.
+"""
+
+import hashlib
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from flask_caching.backends.base import BaseCache
+
+from search_text import SEARCH_FIELD
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+# Fields that change on every page view and are never shown in a fragment
+VOLATILE_FIELDS = ('views',)
+# Fields that are too large to hash per render; their summary fields
+# (rating, review_count) are part of the revision instead, and the search
+# representation is derived from fields that are
+BULKY_FIELDS = ('reviews', SEARCH_FIELD)
+
+
+class LRUByteCache(BaseCache):
+    """Thread-safe in-process cache evicting least recently used entries past a byte budget"""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, default_timeout: int = 300):
+        super().__init__(default_timeout)
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at, value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        kwargs['max_bytes'] = config.get('CACHE_FRAGMENT_MAX_BYTES', DEFAULT_MAX_BYTES)
+        return cls(*args, **kwargs)
+
+    def _expires_at(self, timeout):
+        if timeout is None:
+            timeout = self.default_timeout
+        return time.time() + timeout if timeout > 0 else 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._bytes -= entry[2]
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] and entry[0] < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, timeout=None):
+        size = sys.getsizeof(value) + sys.getsizeof(key)
+        if size > self.max_bytes:
+            return False
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (self._expires_at(timeout), value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+        return True
+
+    def add(self, key, value, timeout=None):
+        if self.has(key):
+            return False
+        return self.set(key, value, timeout)
+
+    def delete(self, key):
+        with self._lock:
+            return self._remove(key) is not None
+
+    def has(self, key):
+        return self.get(key) is not None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'max_bytes': self.max_bytes}
+
+
+def app_revision(app_data: dict) -> str:
+    """Short hash of everything a rendered fragment can show about an app"""
+    visible = {k: v for k, v in app_data.items() if k not in VOLATILE_FIELDS and k not in BULKY_FIELDS}
+    encoded = json.dumps(visible, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()[:12]
+
+
+def reviews_revision(app_data: dict) -> str:
+    """Reviews only grow and helpful votes only increase, so count + votes identify them"""
+    reviews = app_data.get('reviews', [])
+    votes = sum(r.get('helpful_votes', 0) for r in reviews)
+    last_id = reviews[-1].get('id', '') if reviews else ''
+    return f"r{len(reviews)}.{votes}.{last_id[:8]}"
+
+
+def _key_part(item) -> str:
+    if isinstance(item, dict):
+        return f"{item.get('id')}.{app_revision(item)}"
+    if isinstance(item, (list, tuple)):
+        joined = '|'.join(_key_part(i) for i in item)
+        return hashlib.sha1(joined.encode('utf-8')).hexdigest()[:12]
+    return str(item)
+
+
+def fragment_key(*items, theme: str = 'light') -> str:
+    """
+    Build the vary-on key for a fragment: apps contribute id + revision, lists of
+    apps or categories contribute a hash of their members, and the theme is always last.
+    """
+    return ':'.join([_key_part(item) for item in items] + [theme])
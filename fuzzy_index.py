@@ -0,0 +1,195 @@
+"""
+Fuzzy Search Index
+Typo-tolerant app search over the folded words (search_text.py) of app
+names, developers, tags, categories and descriptions, used by the web's
+search page and the store manager's SearchEngine.fuzzy_search:
+
+- Every distinct word (the vocabulary) is posted under its trigrams, padded
+  with two '$' on each side ("$$p", "$pi", "pix", ..., "l$$"). A word with
+  n trigrams shares at least n - 3k of them with any word within k edits,
+  so a query word only looks at words passing that count instead of at
+  every app's text.
+- Candidates are confirmed with a real Levenshtein distance that stops as
+  soon as it exceeds the limit: 1 edit for words of 3-5 letters, 2 from 6
+  letters on; shorter words have to match exactly.
+- Words containing the query word ("quiz" in "zequize") are found by
+  intersecting the postings of its trigrams.
+- Only apps posting a matched word are scored. Per query word an app gets
+  its best field weight x closeness (1 - distance / word length, or
+  CONTAINED_CLOSENESS); the app's score is the average over the query
+  words.
+
+Apps can be added and removed one at a time, and refresh() re-indexes only
+the apps whose text fingerprint (search_text.search_key) changed, so a saved
+index can follow the catalog without a rebuild.
+"""
+
+import heapq
+from collections import Counter
+
+from search_text import search_fields, search_key, tokenize, words
+
+INDEX_FORMAT = 1  # bump when what is indexed, or how, changes
+
+# Field -> weight of a word found there (name matches count most)
+FIELD_WEIGHTS = {'name': 1.0, 'developer': 0.8, 'tags': 0.8, 'category': 0.6, 'description': 0.6}
+DEFAULT_THRESHOLD = 0.6
+CONTAINED_CLOSENESS = 0.8
+
+
+def max_distance(word: str) -> int:
+    """Edits tolerated in a query word of this length"""
+    return 0 if len(word) < 3 else 1 if len(word) < 6 else 2
+
+
+def trigrams(word: str) -> set:
+    padded = f'$${word}$$'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def levenshtein(a: str, b: str, limit: int = None) -> int:
+    """Edit distance between ``a`` and ``b``; with ``limit``, anything larger comes back as limit + 1"""
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is not None and len(a) - len(b) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char in enumerate(a, 1):
+        current = [i]
+        for j, other in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char != other)))
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1] if limit is None else min(previous[-1], limit + 1)
+
+
+class FuzzyIndex:
+    """Word -> apps postings with a trigram index over the words"""
+
+    def __init__(self):
+        self.postings = {}  # word -> {app_id: best field weight}
+        self.grams = {}     # trigram -> words containing it
+        self.docs = {}      # app_id -> (search key, its words), to refresh or remove it
+
+    @classmethod
+    def from_apps(cls, apps) -> 'FuzzyIndex':
+        index = cls()
+        for app in apps:
+            index.add(app)
+        return index
+
+    def __len__(self):
+        return len(self.docs)
+
+    # ----- maintenance -----
+
+    def add(self, app: dict):
+        """Index ``app``, replacing what was indexed under its id before"""
+        app_id = app['id']
+        if app_id in self.docs:
+            self.remove(app_id)
+        text = search_fields(app)
+        weights = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for word in (words(' '.join(text['tags'])) if field == 'tags' else words(text[field])):
+                if weight > weights.get(word, 0):
+                    weights[word] = weight
+        for word, weight in weights.items():
+            posting = self.postings.get(word)
+            if posting is None:
+                posting = self.postings[word] = {}
+                for gram in trigrams(word):
+                    self.grams.setdefault(gram, set()).add(word)
+            posting[app_id] = weight
+        self.docs[app_id] = (text['key'], list(weights))
+
+    def remove(self, app_id: str) -> bool:
+        """Drop ``app_id`` from the index; False if it was not in it"""
+        doc = self.docs.pop(app_id, None)
+        if doc is None:
+            return False
+        for word in doc[1]:
+            posting = self.postings[word]
+            posting.pop(app_id, None)
+            if not posting:
+                del self.postings[word]
+                for gram in trigrams(word):
+                    holders = self.grams[gram]
+                    holders.discard(word)
+                    if not holders:
+                        del self.grams[gram]
+        return True
+
+    def refresh(self, apps) -> int:
+        """Re-index the apps of ``apps`` whose text changed and drop the ones that are gone; returns how many"""
+        touched, present = 0, set()
+        for app in apps:
+            present.add(app['id'])
+            doc = self.docs.get(app['id'])
+            if doc is None or doc[0] != search_key(app):
+                self.add(app)
+                touched += 1
+        for app_id in [app_id for app_id in self.docs if app_id not in present]:
+            self.remove(app_id)
+            touched += 1
+        return touched
+
+    # ----- queries -----
+
+    def matching_words(self, word: str) -> dict:
+        """Vocabulary words close to or containing ``word`` -> their closeness (0-1]"""
+        matches = {candidate: 1 - distance / max(len(word), len(candidate))
+                   for candidate, distance in self.similar_words(word).items()}
+        for candidate in self.containing(word):
+            if matches.get(candidate, 0) < CONTAINED_CLOSENESS:
+                matches[candidate] = CONTAINED_CLOSENESS
+        return matches
+
+    def containing(self, word: str) -> set:
+        """Longer vocabulary words with ``word`` inside them"""
+        inner = {word[i:i + 3] for i in range(len(word) - 2)}
+        if not inner:
+            return set()
+        holders = sorted((self.grams.get(gram, set()) for gram in inner), key=len)
+        return {candidate for candidate in holders[0].intersection(*holders[1:])
+                if word in candidate and candidate != word}
+
+    def similar_words(self, word: str) -> dict:
+        """Vocabulary words within ``max_distance(word)`` edits of ``word`` -> their distance"""
+        limit = max_distance(word)
+        if limit == 0:
+            return {word: 0} if word in self.postings else {}
+        grams = trigrams(word)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.grams.get(gram, ()))
+        needed = max(1, len(grams) - 3 * limit)
+        found = {}
+        for candidate, count in shared.items():
+            if count >= needed and abs(len(candidate) - len(word)) <= limit:
+                distance = levenshtein(word, candidate, limit)
+                if distance <= limit:
+                    found[candidate] = distance
+        return found
+
+    def search(self, query: str, threshold: float = DEFAULT_THRESHOLD, limit: int = None) -> list:
+        """(app_id, score) pairs scoring at least ``threshold``, best first"""
+        query_words = list(dict.fromkeys(tokenize(query)))
+        if not query_words:
+            return []
+        totals = Counter()
+        for word in query_words:
+            best = {}
+            for candidate, closeness in self.matching_words(word).items():
+                for app_id, weight in self.postings[candidate].items():
+                    score = weight * closeness
+                    if score > best.get(app_id, 0):
+                        best[app_id] = score
+            totals.update(best)
+        scored = [(score / len(query_words), app_id) for app_id, score in totals.items()
+                  if score / len(query_words) >= threshold]
+        ranked = heapq.nlargest(limit, scored) if limit is not None else sorted(scored, reverse=True)
+        return [(app_id, score) for score, app_id in ranked]
@@ -0,0 +1,426 @@
+"""
+Synthetic Data Generator
+Builds a realistic, reproducible store at any scale for load and performance
+testing: apps with reviews, users with favorites, wishlists, download history
+and followers, collections, activities and analytics events.
+
+Output is the same JSON layout app.py reads (apps_data.json, users.json,
+collections.json, activities.json, analytics.json) plus app_store.db built with
+the schema and mapping from database_migration.py.
+
+Popularity is Zipf-distributed, so a few apps get most of the downloads and
+reviews and a few users get most of the followers, like a real store.
+
+Usage:
+    python generate_data.py --scale medium
+    python generate_data.py --apps 10000 --users 200000 --reviews 1000000 --seed 7
+    python generate_data.py --scale small --output . --no-db   # replace the local JSON data
+
+Every user's password is SYNTHETIC_PASSWORD (hashed once and shared, since
+hashing per user would dominate generation time).
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import string
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).parent.absolute()
+DEFAULT_OUTPUT_DIR = PROJECT_DIR / 'synthetic_data'
+SYNTHETIC_PASSWORD = 'synthetic-password'
+PBKDF2_ITERATIONS = 600000  # werkzeug's default for generate_password_hash
+
+SCALES = {
+    # name: (apps, users, reviews)
+    'small': (200, 1_000, 5_000),
+    'medium': (2_000, 20_000, 100_000),
+    'large': (10_000, 100_000, 1_000_000),
+}
+
+CATEGORIES = [
+    'Games', 'Tools', 'Social', 'Education', 'Productivity', 'Entertainment', 'Music',
+    'Photography', 'Health & Fitness', 'Finance', 'Travel', 'News',
+]
+PREMIUM_CATEGORY = 'Premium Unlocked'
+PREMIUM_SHARE = 0.05
+ARABIC_SHARE = 0.1
+
+NAME_PREFIXES = ['Super', 'Smart', 'Quick', 'Pixel', 'Happy', 'Magic', 'Zen', 'Turbo', 'Bright', 'Cloud',
+                 'Tiny', 'Mega', 'Neo', 'Pocket', 'Daily', 'Epic', 'Star', 'Blue', 'Urban', 'Wild']
+NAME_NOUNS = ['Notes', 'Quiz', 'Runner', 'Chat', 'Camera', 'Wallet', 'Planner', 'Radio', 'Maps', 'Puzzle',
+              'Fitness', 'Reader', 'Editor', 'Tracker', 'Studio', 'Cleaner', 'Keyboard', 'Scanner', 'Racer', 'Tube']
+ARABIC_NAMES = ['مصحف', 'أذكار', 'طقس', 'قاموس', 'حاسبة', 'مترجم', 'ألعاب', 'أخبار', 'وصفات', 'مواقيت الصلاة']
+ARABIC_DESCRIPTIONS = [
+    'تطبيق سهل وسريع يساعدك في حياتك اليومية',
+    'أفضل تطبيق عربي مجاني بدون إعلانات مزعجة',
+    'تصميم جميل وواجهة بسيطة تناسب الجميع',
+]
+DEVELOPERS = ['Ismail mohammad', 'Nova Labs', 'Pixel Forge', 'Sahara Apps', 'BrightByte', 'Orbit Studio',
+              'Falcon Soft', 'Lumen Games', 'Atlas Mobile', 'Cedar Tech']
+DESCRIPTION_PHRASES = [
+    'A simple and fast app for everyday use.', 'Test your brain with hundreds of levels.',
+    'Works offline and keeps your data private.', 'Beautiful design with dark mode support.',
+    'Sync across devices in real time.', 'Lightweight, battery friendly and free.',
+    'Join millions of players worldwide.', 'Powerful tools made easy.',
+]
+MOD_FEATURES = ['Unlimited coins', 'No ads', 'All levels unlocked', 'Premium features unlocked', 'No root needed']
+REVIEW_COMMENTS = [
+    'Great app, works perfectly!', 'Love it', 'Too many ads', 'Crashes on startup after the update',
+    'Exactly what I needed', 'Good but could use more features', 'Best in its category',
+    'Not bad', 'Useless', 'My kids love this game', 'تطبيق رائع جدا', 'ممتاز وشكرا للمطور', '',
+]
+FIRST_NAMES = ['ahmed', 'sara', 'omar', 'lina', 'youssef', 'maria', 'ali', 'noor', 'john', 'fatima',
+               'karim', 'emma', 'hassan', 'leila', 'adam', 'zeina', 'samir', 'nadia', 'liam', 'huda']
+LOCATIONS = ['Cairo', 'Riyadh', 'Casablanca', 'Dubai', 'Amman', 'Algiers', 'London', 'Paris', 'Istanbul', '']
+ACTIVITY_TYPES = ['download', 'review', 'favorite', 'follow', 'collection_create', 'avatar_upload']
+ANALYTICS_EVENTS = ['view', 'download', 'share']
+ANALYTICS_DAYS = 30
+HISTORY_DAYS = 730
+
+
+class SyntheticStore:
+    """Generates one consistent synthetic dataset from a seed"""
+
+    def __init__(self, n_apps: int, n_users: int, n_reviews: int, seed: int = 42):
+        self.n_apps = n_apps
+        self.n_users = n_users
+        self.n_reviews = n_reviews
+        self.rng = random.Random(seed)
+        # Fixed reference time keeps output identical across runs for a seed
+        self.now = datetime(2025, 10, 1, 12, 0, 0)
+        self.apps = []
+        self.users = {}
+        self.collections = {}
+        self.activities = defaultdict(list)
+        self.analytics = defaultdict(dict)
+
+    # ----- helpers -----
+
+    def _uuid(self) -> str:
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def _past(self, max_days: int = HISTORY_DAYS) -> datetime:
+        return self.now - timedelta(seconds=self.rng.randrange(max_days * 86400))
+
+    def _password_hash(self, password: str) -> str:
+        """Werkzeug-compatible pbkdf2 hash with a seeded salt, so output is reproducible"""
+        salt = ''.join(self.rng.choice(string.ascii_letters + string.digits) for _ in range(16))
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt.encode('utf-8'), PBKDF2_ITERATIONS)
+        return f"pbkdf2:sha256:{PBKDF2_ITERATIONS}${salt}${digest.hex()}"
+
+    @staticmethod
+    def _zipf_cumulative(n: int, exponent: float = 1.1) -> list:
+        """Cumulative Zipf weights for random.choices(cum_weights=...)"""
+        total = 0.0
+        cumulative = []
+        for rank in range(1, n + 1):
+            total += 1.0 / rank ** exponent
+            cumulative.append(total)
+        return cumulative
+
+    def _pick_apps(self, k: int) -> list:
+        """k distinct app indexes, biased towards popular apps"""
+        picked = set(self.rng.choices(range(self.n_apps), cum_weights=self._app_weights, k=k))
+        return sorted(picked)
+
+    # ----- generation -----
+
+    def generate(self):
+        self._app_weights = self._zipf_cumulative(self.n_apps)
+        self._user_weights = self._zipf_cumulative(self.n_users, exponent=0.9)
+        self._generate_users()
+        self._generate_apps()
+        self._generate_reviews()
+        self._generate_user_lists()
+        self._generate_follows()
+        self._generate_collections()
+        self._generate_activities()
+        self._generate_analytics()
+        return self
+
+    def _generate_users(self):
+        password = self._password_hash(SYNTHETIC_PASSWORD)
+        for i in range(1, self.n_users + 1):
+            user_id = str(i)  # app.py assigns ids as str(len(users_db) + 1)
+            username = f"{self.rng.choice(FIRST_NAMES)}{i}"
+            self.users[user_id] = {
+                'username': username,
+                'email': f"{username}@example.com",
+                'password': password,
+                'created_at': self._past().isoformat(),
+                'is_admin': i == 1,
+                'bio': '' if self.rng.random() < 0.7 else 'App lover and reviewer',
+                'location': self.rng.choice(LOCATIONS),
+                'website': '',
+                'favorites': [],
+                'wishlist': [],
+                'downloads_history': [],
+                'followers': [],
+                'following': [],
+                'settings': {
+                    'profile_public': self.rng.random() < 0.9,
+                    'show_downloads': True,
+                    'show_collections': True,
+                    'notify_updates': True,
+                    'notify_reviews': self.rng.random() < 0.8,
+                    'notify_followers': True,
+                },
+                'notifications': [],
+            }
+
+    def _generate_apps(self):
+        used_names = set()
+        for i in range(self.n_apps):
+            premium = self.rng.random() < PREMIUM_SHARE
+            arabic = self.rng.random() < ARABIC_SHARE
+            if arabic:
+                base = self.rng.choice(ARABIC_NAMES)
+                description = self.rng.choice(ARABIC_DESCRIPTIONS)
+            else:
+                base = f"{self.rng.choice(NAME_PREFIXES)} {self.rng.choice(NAME_NOUNS)}"
+                description = ' '.join(self.rng.sample(DESCRIPTION_PHRASES, 2))
+            name = base
+            if name in used_names:
+                name = f"{base} {i}"
+            used_names.add(name)
+
+            app_id = self._uuid()
+            added = self._past()
+            # Popularity follows rank (apps are generated in popularity order)
+            popularity = 1.0 / (i + 1) ** 1.1
+            downloads = int(popularity * self.n_users * 50) + self.rng.randrange(20)
+            category = PREMIUM_CATEGORY if premium else self.rng.choice(CATEGORIES)
+            slug = f"app{i + 1}"
+            app_item = {
+                'id': app_id,
+                'name': name,
+                'developer': self.rng.choice(DEVELOPERS),
+                'is_premium_unlocked': premium,
+                'category': category,
+                'description': description,
+                'long_description': description * self.rng.randint(1, 4),
+                'app_icon': f"{slug}_icon.png",
+                'icon': f"{slug}_icon.png",
+                'is_external_icon': False,
+                'banner': f"{slug}_banner.png",
+                'is_external_banner': False,
+                'size': f"{self.rng.randint(5, 900)}MB",
+                'version': f"{self.rng.randint(1, 9)}.{self.rng.randint(0, 20)}.{self.rng.randint(0, 9)}",
+                'min_android': f"+{self.rng.randint(5, 12)}",
+                'age_rating': self.rng.choice(['+3', '+5', '+12', '+16', '+18']),
+                'downloads': downloads,
+                'views': downloads * self.rng.randint(2, 6),
+                'rating': 0,
+                'review_count': 0,
+                'reviews': [],
+                'featured': i < 12 or self.rng.random() < 0.02,
+                'release_date': added.strftime('%Y-%m-%d'),
+                'added_date': added.isoformat(),
+                'last_updated': (added + timedelta(days=self.rng.randrange(60))).strftime('%Y-%m-%d'),
+                'screenshots': [f"{slug}_screenshot{n}.png" for n in range(1, self.rng.randint(2, 6))],
+                'app_preview_photos': [f"{slug}_screenshot1.png"],
+                'tags': [name, category.lower(), self.rng.choice(NAME_NOUNS).lower()],
+                'app_file': f"{slug}.apk",
+                'app_file_path': f"Apps_Link/{slug}.apk",
+                'download_link': f"/download/{app_id}",
+                'is_external_download': False,
+                'price': '0' if self.rng.random() < 0.8 else self.rng.choice(['0.99', '1.99', '2.99', '4.99']),
+                'in_app_purchases': self.rng.random() < 0.4,
+                'contains_ads': self.rng.random() < 0.5,
+                'requirements': {'storage': f"{self.rng.randint(10, 2000)}MB",
+                                 'ram': self.rng.choice(['1GB', '2GB', '3GB', '4GB']), 'internet': True},
+                'additional_info': {'content_rating': 'Suitable for all ages', 'permissions': [],
+                                    'whats_new': 'Bug fixes and performance improvements'},
+            }
+            if premium:
+                app_item['mod_features'] = ', '.join(self.rng.sample(MOD_FEATURES, 2))
+            self.apps.append(app_item)
+
+    def _generate_reviews(self):
+        user_ids = list(self.users)
+        app_indexes = self.rng.choices(range(self.n_apps), cum_weights=self._app_weights, k=self.n_reviews)
+        for app_index in app_indexes:
+            app_item = self.apps[app_index]
+            user_id = self.rng.choice(user_ids)
+            helpful = 0 if self.rng.random() < 0.7 else min(int(self.rng.paretovariate(1.5)), 50)
+            app_item['reviews'].append({
+                'id': self._uuid(),
+                'user': self.users[user_id]['username'],
+                'user_id': user_id,
+                'rating': self.rng.choices([1, 2, 3, 4, 5], weights=[6, 4, 10, 30, 50])[0],
+                'comment': self.rng.choice(REVIEW_COMMENTS),
+                'date': self._past().isoformat(),
+                'helpful_votes': helpful,
+                'voted_users': self.rng.sample(user_ids, min(helpful, len(user_ids))),
+            })
+        for app_item in self.apps:
+            reviews = app_item['reviews']
+            reviews.sort(key=lambda r: r['date'])
+            if reviews:
+                app_item['rating'] = sum(r['rating'] for r in reviews) / len(reviews)
+            app_item['review_count'] = len(reviews)
+
+    def _generate_user_lists(self):
+        for user_id, user in self.users.items():
+            user['favorites'] = [self.apps[i]['id'] for i in self._pick_apps(self.rng.randint(0, 12))]
+            user['wishlist'] = [self.apps[i]['id'] for i in self._pick_apps(self.rng.randint(0, 8))]
+            for i in self._pick_apps(self.rng.randint(0, 25)):
+                user['downloads_history'].append({
+                    'app_id': self.apps[i]['id'],
+                    'date': self._past().isoformat(),
+                    'app_name': self.apps[i]['name'],
+                })
+            user['downloads_history'].sort(key=lambda d: d['date'])
+            for _ in range(self.rng.randint(0, 5)):
+                user['notifications'].append({
+                    'id': self._uuid(),
+                    'title': 'New update available',
+                    'message': f"{self.apps[self._pick_apps(1)[0]]['name']} has been updated",
+                    'type': 'info',
+                    'timestamp': self._past(30).isoformat(),
+                    'read': self.rng.random() < 0.6,
+                })
+
+    def _generate_follows(self):
+        """Preferential attachment: a few users collect most followers"""
+        user_ids = list(self.users)
+        for follower_id in user_ids:
+            count = min(int(self.rng.paretovariate(1.2)) - 1, 200)
+            if count <= 0:
+                continue
+            targets = set(self.rng.choices(user_ids, cum_weights=self._user_weights, k=count))
+            targets.discard(follower_id)
+            for target_id in sorted(targets, key=int):
+                self.users[follower_id]['following'].append(target_id)
+                self.users[target_id]['followers'].append(follower_id)
+
+    def _generate_collections(self):
+        for user_id in self.users:
+            if self.rng.random() >= 0.1:
+                continue
+            for n in range(self.rng.randint(1, 3)):
+                collection_id = self._uuid()
+                created = self._past()
+                self.collections[collection_id] = {
+                    'id': collection_id,
+                    'user_id': user_id,
+                    'name': f"{self.rng.choice(NAME_PREFIXES)} picks {n + 1}",
+                    'description': '',
+                    'apps': [self.apps[i]['id'] for i in self._pick_apps(self.rng.randint(3, 15))],
+                    'created_at': created.isoformat(),
+                    'updated_at': (created + timedelta(days=self.rng.randrange(30))).isoformat(),
+                    'is_public': self.rng.random() < 0.8,
+                }
+
+    def _generate_activities(self):
+        for user_id in self.users:
+            count = min(int(self.rng.paretovariate(1.0)), 100)  # log_activity keeps the last 100
+            entries = []
+            for _ in range(count):
+                activity_type = self.rng.choice(ACTIVITY_TYPES)
+                entries.append({
+                    'id': self._uuid(),
+                    'type': activity_type,
+                    'description': f"{activity_type.replace('_', ' ').capitalize()}: "
+                                   f"{self.apps[self._pick_apps(1)[0]]['name']}",
+                    'timestamp': self._past().isoformat(),
+                    'time_ago': 'Just now',
+                })
+            entries.sort(key=lambda a: a['timestamp'])
+            self.activities[user_id] = entries
+
+    def _generate_analytics(self):
+        """Daily counters in the same '<event>_<YYYY-MM-DD>' layout as /api/analytics/track"""
+        tracked = min(self.n_apps, 1000)
+        for rank, app_item in enumerate(self.apps[:tracked]):
+            scale = max(1, int(500 / (rank + 1)))
+            counters = {}
+            for day in range(ANALYTICS_DAYS):
+                date = (self.now - timedelta(days=day)).strftime('%Y-%m-%d')
+                for event in ANALYTICS_EVENTS:
+                    value = self.rng.randint(0, scale * (3 if event == 'view' else 1))
+                    if value:
+                        counters[f"{event}_{date}"] = value
+            self.analytics[app_item['id']] = counters
+
+    # ----- output -----
+
+    def write_json(self, output_dir: Path):
+        """Write the files app.py loads, formatted the way app.py saves them"""
+        output_dir.mkdir(parents=True, exist_ok=True)
+        files = {
+            'apps_data.json': (self.apps, {'indent': 2, 'ensure_ascii': False}),
+            'users.json': (self.users, {'indent': 2}),
+            'collections.json': (self.collections, {'indent': 2}),
+            'activities.json': (dict(self.activities), {'indent': 2}),
+            'analytics.json': (dict(self.analytics), {'indent': 2}),
+        }
+        for filename, (payload, options) in files.items():
+            target = output_dir / filename
+            tmp_path = output_dir / f".{filename}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(payload, f, **options)
+            os.replace(tmp_path, target)
+            print(f"✅ {filename}: {target.stat().st_size / 1024 / 1024:.1f} MB")
+
+    def write_database(self, output_dir: Path):
+        """Build app_store.db from the JSON files with the migration's schema and mapping"""
+        from database_migration import (create_database, migrate_users, migrate_apps,
+                                        migrate_collections, migrate_activities, verify_migration)
+        db_path = str(output_dir / 'app_store.db')
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        create_database(db_path)
+        migrate_users(output_dir, db_path)
+        migrate_apps(output_dir, db_path)
+        migrate_collections(output_dir, db_path)
+        migrate_activities(output_dir, db_path)
+        verify_migration(db_path)
+
+    def summary(self) -> dict:
+        return {
+            'apps': len(self.apps),
+            'users': len(self.users),
+            'reviews': sum(len(a['reviews']) for a in self.apps),
+            'follows': sum(len(u['following']) for u in self.users.values()),
+            'collections': len(self.collections),
+            'activities': sum(len(a) for a in self.activities.values()),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic store dataset for scale testing')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--apps', type=int, help='override the number of apps')
+    parser.add_argument('--users', type=int, help='override the number of users')
+    parser.add_argument('--reviews', type=int, help='override the number of reviews')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='output directory (default: synthetic_data/<scale>)')
+    parser.add_argument('--no-db', action='store_true', help='skip building app_store.db')
+    args = parser.parse_args()
+
+    n_apps, n_users, n_reviews = SCALES[args.scale]
+    n_apps = args.apps or n_apps
+    n_users = args.users or n_users
+    n_reviews = args.reviews if args.reviews is not None else n_reviews
+    output_dir = Path(args.output) if args.output else DEFAULT_OUTPUT_DIR / args.scale
+
+    print(f"🏗️ Generating {n_apps:,} apps, {n_users:,} users, {n_reviews:,} reviews (seed {args.seed})")
+    started = time.time()
+    store = SyntheticStore(n_apps, n_users, n_reviews, seed=args.seed).generate()
+    print(f"📊 {store.summary()} in {time.time() - started:.1f}s")
+    store.write_json(output_dir)
+    if not args.no_db:
+        store.write_database(output_dir)
+    print(f"🎉 Dataset written to {output_dir} (password for every user: {SYNTHETIC_PASSWORD})")
+
+
+if __name__ == '__main__':
+    main()
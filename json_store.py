@@ -0,0 +1,352 @@
+"""
+Concurrent JSON Document Store
+Safe persistence for JSON files shared by several threads, gunicorn workers
+and the CLI (apps_data.json):
+
+- Writes go to a temp file that is fsynced and renamed over the original, so
+  readers and crashes only ever see a complete document.
+- A lock file serializes writers across processes (fcntl / msvcrt).
+- Concurrent writers in one process are group-committed: while one thread
+  flushes, the others queue up and the next flush applies all of them and
+  writes the file once.
+- Loaded documents remember the version they were read at. Saving a document
+  that changed underneath is rebased with a three-way merge (records are
+  matched by id, counters are added up) instead of silently overwriting the
+  newer data; a real conflict raises StaleWriteError.
+- An optional ``prepare`` hook runs on every record just before it is
+  written, for fields derived from the others (search_text.prepare_app).
+"""
+
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+STALE_TEMP_SECONDS = 3600
+
+
+class StoreError(Exception):
+    """Base class for store errors"""
+
+
+class StoreCorruptError(StoreError):
+    """The file exists but is not valid JSON; never treat it as empty"""
+
+
+class StaleWriteError(StoreError):
+    """The same field was changed by someone else since the document was loaded"""
+
+
+class Unchanged(Exception):
+    """Raised by an update() mutation, before touching anything, to skip the write"""
+
+    def __init__(self, result=None):
+        super().__init__()
+        self.result = result
+
+
+class Document(list):
+    """
+    A loaded JSON array remembering the version it was read at. ``base`` returns
+    a fresh copy of the records as loaded (the merge base when saving it back).
+    """
+
+    def __init__(self, records=(), version=None, base=None, nbytes=0):
+        super().__init__(records)
+        self.version = version
+        self.nbytes = nbytes
+        self._base = base
+
+    def base(self) -> list:
+        return self._base() if self._base is not None else []
+
+
+class FileLock:
+    """Exclusive cross-process lock held on a separate lock file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+
+    def acquire(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if sys.platform == 'win32':
+            import msvcrt
+            while True:
+                try:
+                    msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.05)  # LK_LOCK gives up after ~10s; keep waiting
+        else:
+            import fcntl
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+
+    def release(self):
+        if self._fd is None:
+            return
+        try:
+            if sys.platform == 'win32':
+                import msvcrt
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def _file_version(st) -> tuple:
+    # Every write renames a new file into place, so the inode alone changes;
+    # mtime and size guard against inode reuse
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+@contextmanager
+def atomic_file(path: str, mode: str = 'w'):
+    """
+    Open a temp file next to ``path`` for writing; when the block succeeds it
+    is fsynced and renamed over ``path``, so readers and crashes see either
+    the old or the new file.
+    """
+    path = os.path.abspath(path)
+    directory = os.path.dirname(path)
+    tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_path, mode, **({} if 'b' in mode else {'encoding': 'utf-8'})) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    if hasattr(os, 'O_DIRECTORY'):
+        # Make the rename itself durable
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def atomic_write_json(path: str, data, **dump_kwargs) -> int:
+    """Write ``data`` as JSON through atomic_file; returns the number of bytes written"""
+    with atomic_file(path) as f:
+        json.dump(data, f, **dump_kwargs)
+        return f.tell()
+
+
+def merge_records(base: list, mine: list, latest: list, key: str = 'id', counters=()) -> list:
+    """
+    Three-way merge of lists of records: apply the changes between ``base`` and
+    ``mine`` on top of ``latest``. Fields are merged one by one; counter fields
+    changed on both sides add up, any other field changed differently on both
+    sides raises StaleWriteError.
+    """
+    base_by_key = {r.get(key): r for r in base}
+    mine_by_key = {r.get(key): r for r in mine}
+    merged = []
+    for record in latest:
+        record_key = record.get(key)
+        if record_key in base_by_key and record_key not in mine_by_key:
+            continue  # deleted by me
+        old = base_by_key.get(record_key)
+        new = mine_by_key.get(record_key)
+        if old is None or new is None or new == old:
+            merged.append(record)
+            continue
+        result = dict(record)
+        for field in set(old) | set(new):
+            if new.get(field) == old.get(field):
+                continue
+            if record.get(field) == old.get(field):
+                if field in new:
+                    result[field] = new[field]
+                else:
+                    result.pop(field, None)
+            elif field in counters:
+                result[field] = record.get(field, 0) + new.get(field, 0) - old.get(field, 0)
+            elif record.get(field) != new.get(field):
+                raise StaleWriteError(f"'{field}' of {record_key} was changed by someone else")
+        merged.append(result)
+    latest_keys = {r.get(key) for r in latest}
+    for record in mine:
+        record_key = record.get(key)
+        if record_key not in base_by_key and record_key not in latest_keys:
+            merged.append(record)  # added by me
+        elif record_key in base_by_key and record_key not in latest_keys and record != base_by_key[record_key]:
+            raise StaleWriteError(f"{record_key} was deleted by someone else")
+    return merged
+
+
+class _Pending:
+    __slots__ = ('kind', 'payload', 'done', 'result', 'error')
+
+    def __init__(self, kind, payload):
+        self.kind = kind
+        self.payload = payload
+        self.done = False
+        self.result = None
+        self.error = None
+
+
+class JsonStore:
+    """One JSON array file with atomic, locked, group-committed writes"""
+
+    def __init__(self, path: str, key: str = 'id', counters=(), dump_kwargs=None, on_write=None, prepare=None):
+        self.path = os.path.abspath(path)
+        self.key = key
+        self.counters = tuple(counters)
+        self.dump_kwargs = dump_kwargs or {}
+        self.on_write = on_write  # on_write(nbytes) after every flush, e.g. for metrics
+        self.prepare = prepare    # prepare(record) on every record before it is written, e.g. derived fields
+        self._lock_file = FileLock(f"{self.path}.lock")
+        self._cond = threading.Condition()
+        self._queue = []
+        self._flushing = False
+        self._remove_stale_temp_files()
+
+    # ----- reading -----
+
+    def version(self):
+        try:
+            return _file_version(os.stat(self.path))
+        except FileNotFoundError:
+            return None
+
+    def load(self) -> Document:
+        """Read the whole document; missing file -> empty, invalid JSON -> StoreCorruptError"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                version = _file_version(os.fstat(f.fileno()))
+                raw = f.read()
+        except FileNotFoundError:
+            return Document()
+
+        def parse():
+            return json.loads(raw) if raw.strip() else []
+
+        try:
+            records = parse()
+        except json.JSONDecodeError as e:
+            raise StoreCorruptError(f"{self.path} is not valid JSON: {e}") from e
+        return Document(records, version, base=parse, nbytes=len(raw))
+
+    # ----- writing -----
+
+    def save(self, data: list):
+        """
+        Replace the document. A Document loaded from this store is rebased onto
+        any newer version first; a plain list overwrites unconditionally.
+        """
+        self._submit(_Pending('save', data))
+
+    def update(self, mutate):
+        """
+        Apply ``mutate(records)`` to the latest document under the lock and
+        write it; returns what mutate returns. Preferred for small changes like
+        counters, since it can never conflict. Raising Unchanged(result) skips
+        the write; if mutate raises anything else, its batch is re-applied from
+        disk without it and the exception is re-raised here.
+        """
+        return self._submit(_Pending('update', mutate))
+
+    def _submit(self, pending: _Pending):
+        with self._cond:
+            self._queue.append(pending)
+            while not pending.done and self._flushing:
+                self._cond.wait()
+            if not pending.done:
+                # Become the leader and flush everything queued so far
+                self._flushing = True
+                batch, self._queue = self._queue, []
+        if not pending.done:
+            try:
+                self._flush(batch)
+            finally:
+                with self._cond:
+                    self._flushing = False
+                    self._cond.notify_all()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _apply(self, batch: list):
+        """Apply the batch to the latest document; returns (records, changed)"""
+        while True:
+            records = list(self.load())
+            changed = False
+            for pending in batch:
+                if pending.error is not None:
+                    continue
+                try:
+                    if pending.kind == 'update':
+                        pending.result = pending.payload(records)
+                    else:
+                        records = self._rebase(pending.payload, records)
+                    changed = True
+                except Unchanged as e:
+                    pending.result = e.result
+                except StaleWriteError as e:
+                    pending.error = e  # a failed rebase leaves records untouched
+                except Exception as e:
+                    # The mutation may have half-applied: start over without it
+                    pending.error = e
+                    break
+            else:
+                return records, changed
+
+    def _flush(self, batch: list):
+        try:
+            with self._lock_file:
+                records, changed = self._apply(batch)
+                if changed:
+                    self._write(records)
+        except Exception as e:
+            for pending in batch:
+                if pending.error is None:
+                    pending.error = e
+        finally:
+            for pending in batch:
+                pending.done = True
+
+    def _rebase(self, data, records):
+        if not isinstance(data, Document) or data.version is None:
+            return list(data)
+        # Merge even when the file is unchanged: the document may carry values
+        # that are not in the file (pending shared counters) on both sides
+        return merge_records(data.base(), list(data), records, key=self.key, counters=self.counters)
+
+    def _write(self, records: list):
+        if self.prepare:
+            for record in records:
+                self.prepare(record)
+        nbytes = atomic_write_json(self.path, records, **self.dump_kwargs)
+        if self.on_write:
+            self.on_write(nbytes)
+
+    def _remove_stale_temp_files(self):
+        """Temp files left behind by a process that crashed mid-write"""
+        pattern = os.path.join(os.path.dirname(self.path), f".{os.path.basename(self.path)}.*.tmp")
+        for tmp_path in glob.glob(pattern):
+            try:
+                if time.time() - os.path.getmtime(tmp_path) > STALE_TEMP_SECONDS:
+                    os.remove(tmp_path)
+            except OSError:
+                pass
@@ -35,12 +35,23 @@ from email.mime.multipart import MIMEMultipart
 import urllib.request
 import urllib.parse
 import socket
+import subprocess
 import ssl
 import certifi
 from dataclasses import dataclass, field
 from decimal import Decimal
 import asyncio
 import sys
+from page_cache import invalidate_tags
+from json_store import JsonStore, StaleWriteError, atomic_file
+from social_graph import SocialGraph, backup_database
+from collection_store import CollectionStore
+from bm25_index import BM25Index
+from catalog_columns import CatalogColumns
+from filter_plan import FilterPlan
+from fuzzy_index import INDEX_FORMAT, FuzzyIndex, levenshtein
+from search_text import SEARCH_VERSION, fold, prepare_app, public_app, search_fields, tokenize
+from static_export import SITE_DIR, export_enabled
 
 # Define directories
 STATIC_DIR = Path("static")
@@ -72,6 +83,8 @@ BETA_DB = DATA_DIR / "beta_testing.db"
 QUALITY_DB = DATA_DIR / "quality_assurance.db"
 CLOUD_DB = DATA_DIR / "cloud_sync.db"
 MONITORING_DB = DATA_DIR / "monitoring.db"
+# The web app's stores (snapshot_store.py); copies are consistent, files are replaced atomically
+STORE_SNAPSHOTS = [DATA_DIR / f"{name}.snap" for name in ('users', 'activities', 'analytics')]
 
 # Configuration
 CONFIG = {
@@ -717,11 +730,18 @@ class BackupManager:
             if os.path.exists('apps_data.json'):
                 backup_zip.write('apps_data.json')
             
-            # Backup databases
-            for db_file in [CUSTOMERS_DB, ANALYTICS_DB, PROMO_DB, INVENTORY_DB]:
+            # Backup databases and the user/activity/analytics snapshots
+            for db_file in [CUSTOMERS_DB, ANALYTICS_DB, PROMO_DB, INVENTORY_DB, *STORE_SNAPSHOTS]:
                 if db_file.exists():
                     backup_zip.write(db_file)
             
+            # The social database runs in WAL mode: zip a consistent copy, not the live file
+            if SOCIAL_DB.exists():
+                social_copy = BACKUP_DIR / f"{backup_name}_social.db"
+                backup_database(str(SOCIAL_DB), str(social_copy))
+                backup_zip.write(social_copy, arcname=str(SOCIAL_DB))
+                social_copy.unlink()
+            
             # Backup images
             for img_dir in [APP_ICONS_DIR, APP_BANNERS_DIR, SCREENSHOTS_DIR]:
                 if img_dir.exists():
@@ -764,7 +784,7 @@ class BackupManager:
     def export_data(self, format: str = 'csv') -> str:
         """Export data in various formats"""
         export_file = EXPORT_DIR / f"export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
-        apps = load_apps()
+        apps = [public_app(app) for app in load_apps()]
         
         if format == 'csv':
             with open(export_file, 'w', newline='', encoding='utf-8') as f:
@@ -785,113 +805,52 @@ class SearchEngine:
     """Advanced search and filtering system"""
     
     def __init__(self):
-        self.index_cache = CACHE_DIR / "search_index.pkl"
-        self.build_index()
+        self.index_cache = SEARCH_INDEX_FILE
+        self.index = refresh_search_index(build=True)
     
     def build_index(self):
-        """Build search index for faster queries"""
+        """Build the typo-tolerant search index over the catalog and save it"""
         apps = load_apps()
-        index = defaultdict(set)
-        
-        for app in apps:
-            # Index by name
-            for word in app['name'].lower().split():
-                index[word].add(app['id'])
-            
-            # Index by developer
-            for word in app['developer'].lower().split():
-                index[word].add(app['id'])
-            
-            # Index by category
-            index[app['category'].lower()].add(app['id'])
-            
-            # Index by tags
-            for tag in app.get('tags', []):
-                index[tag.lower()].add(app['id'])
-        
-        # Save index
-        with open(self.index_cache, 'wb') as f:
-            pickle.dump(dict(index), f)
+        self.index = FuzzyIndex.from_apps(apps)
+        write_search_index(self.index, apps.version)
+        return self.index
     
     def fuzzy_search(self, query: str, threshold: float = 0.7) -> List[Dict]:
-        """Perform fuzzy search with typo tolerance"""
-        apps = load_apps()
-        query_lower = query.lower()
-        results = []
-        
-        for app in apps:
-            # Calculate similarity scores
-            name_score = self.string_similarity(query_lower, app['name'].lower())
-            dev_score = self.string_similarity(query_lower, app['developer'].lower())
-            desc_score = self.string_similarity(query_lower, app.get('description', '').lower())
-            
-            max_score = max(name_score, dev_score * 0.8, desc_score * 0.6)
-            
-            if max_score >= threshold:
-                results.append((app, max_score))
-        
-        # Sort by relevance
-        results.sort(key=lambda x: x[1], reverse=True)
-        return [app for app, score in results]
+        """Perform fuzzy search with typo tolerance (words within 1-2 edits of the query's words)"""
+        matches = self.index.search(query, threshold)
+        apps = {app['id']: app for app in load_apps()}
+        return [apps[app_id] for app_id, score in matches if app_id in apps]
     
     def string_similarity(self, s1: str, s2: str) -> float:
-        """Calculate string similarity using Levenshtein distance"""
+        """Calculate string similarity using Levenshtein distance (containment counts as 0.9)"""
         if not s1 or not s2:
             return 0.0
         
-        # Simple character overlap for now
-        s1_chars = set(s1)
-        s2_chars = set(s2)
-        
-        if not s1_chars or not s2_chars:
-            return 0.0
-        
-        intersection = len(s1_chars.intersection(s2_chars))
-        union = len(s1_chars.union(s2_chars))
+        similarity = 1 - levenshtein(s1, s2) / max(len(s1), len(s2))
         
         # Check for substring match
         if s1 in s2 or s2 in s1:
-            return 0.9
+            return max(similarity, 0.9)
         
-        return intersection / union
+        return similarity
     
     def advanced_filter(self, **criteria) -> List[Dict]:
         """Filter apps by multiple criteria"""
         apps = load_apps()
-        filtered = apps
-        
-        # Price range
-        if 'min_price' in criteria:
-            filtered = [app for app in filtered 
-                       if float(app.get('price', 0)) >= criteria['min_price']]
-        if 'max_price' in criteria:
-            filtered = [app for app in filtered 
-                       if float(app.get('price', 0)) <= criteria['max_price']]
-        
-        # Rating
-        if 'min_rating' in criteria:
-            filtered = [app for app in filtered 
-                       if app.get('rating', 0) >= criteria['min_rating']]
-        
-        # Category
-        if 'category' in criteria:
-            filtered = [app for app in filtered 
-                       if app.get('category', '').lower() == criteria['category'].lower()]
+        # Price, rating, category and features in one pass (same plan as the web's advanced search)
+        plan = FilterPlan(catalog_columns(apps), category=criteria.get('category'), ignore_case=True,
+                          min_rating=criteria.get('min_rating'),
+                          min_price=criteria.get('min_price'),
+                          max_price=criteria.get('max_price'),
+                          free_only=criteria.get('free_only', False),
+                          no_ads=criteria.get('no_ads', False))
+        filtered = [apps[i] for i in sorted(plan.matches())]
         
         # Age rating
         if 'age_rating' in criteria:
             filtered = [app for app in filtered 
                        if app.get('age_rating', '') == criteria['age_rating']]
         
-        # Features
-        if 'no_ads' in criteria and criteria['no_ads']:
-            filtered = [app for app in filtered 
-                       if not app.get('contains_ads', False)]
-        
-        if 'free_only' in criteria and criteria['free_only']:
-            filtered = [app for app in filtered 
-                       if float(app.get('price', 0)) == 0]
-        
         return filtered
 
 # ============== REVIEW & RATING MANAGEMENT ==============
@@ -1301,27 +1260,21 @@ class AdvancedSearchEngine:
         print(f"Recognized: '{query}'")
         return query
     
-    def smart_search(self, query: str, filters: Dict = None) -> List[Dict]:
-        """Perform smart search with AI enhancements"""
+    def smart_search(self, query: str, filters: Dict = None, limit: int = 50) -> List[Dict]:
+        """Apps matching the query words, ranked by BM25 relevance plus popularity (best ``limit``)"""
         apps = load_apps()
-        results = []
         
         # Tokenize and process query
         tokens = self._tokenize_query(query)
         
-        # Search with scoring
-        for app in apps:
-            score = self._calculate_search_score(app, tokens, query)
-            
-            if filters:
-                if not self._apply_filters(app, filters):
-                    continue
-            
-            if score > 0:
-                results.append((app, score))
+        # Filters as one mask over the catalog's columns, applied while scoring
+        allowed = None
+        if filters:
+            allowed = self._filter_mask(catalog_columns(apps), filters)
         
-        # Sort by relevance
-        results.sort(key=lambda x: x[1], reverse=True)
+        # Ranked from the index's precomputed term statistics (bm25_index.py)
+        index = catalog_derived(apps, 'bm25', BM25Index.from_apps)
+        results = [apps[i] for i, score in index.search(tokens, limit=limit, allowed=allowed)]
         
         # Store search history
         self.search_history.append({
@@ -1330,69 +1283,36 @@ class AdvancedSearchEngine:
             'results_count': len(results)
         })
         
-        return [app for app, score in results]
+        return results
     
     def _tokenize_query(self, query: str) -> List[str]:
         """Tokenize search query"""
         # Remove common words
         stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for'}
-        tokens = query.lower().split()
+        tokens = tokenize(query)
         return [t for t in tokens if t not in stop_words]
     
-    def _calculate_search_score(self, app: Dict, tokens: List[str], query: str) -> float:
-        """Calculate search relevance score"""
-        score = 0.0
-        
-        # Exact match in name
-        if query.lower() in app['name'].lower():
-            score += 10.0
-        
-        # Token matches
-        for token in tokens:
-            if token in app['name'].lower():
-                score += 5.0
-            if token in app.get('description', '').lower():
-                score += 2.0
-            if token in app.get('developer', '').lower():
-                score += 3.0
-            if token in app.get('category', '').lower():
-                score += 4.0
-            for tag in app.get('tags', []):
-                if token in tag.lower():
-                    score += 3.0
-        
-        # Boost for popular apps
-        score += app.get('downloads', 0) / 1000
-        score += app.get('rating', 0) * 2
-        
-        return score
-    
-    def _apply_filters(self, app: Dict, filters: Dict) -> bool:
-        """Apply search filters"""
-        for key, value in filters.items():
-            if key == 'min_rating' and app.get('rating', 0) < value:
-                return False
-            if key == 'max_price' and float(app.get('price', 0)) > value:
-                return False
-            if key == 'category' and app.get('category', '').lower() != value.lower():
-                return False
-            if key == 'free_only' and value and float(app.get('price', 0)) > 0:
-                return False
-        return True
+    def _filter_mask(self, columns: CatalogColumns, filters: Dict):
+        """Mask of the apps passing the search filters"""
+        return columns.mask(category=filters.get('category'), ignore_case=True,
+                            min_rating=filters.get('min_rating'),
+                            max_price=filters.get('max_price'),
+                            free_only=bool(filters.get('free_only')))
     
     def get_search_suggestions(self, partial_query: str) -> List[str]:
         """Get search suggestions as user types"""
         suggestions = []
+        partial = fold(partial_query)
         
         # From search history
         for history_item in self.search_history[-50:]:
-            if partial_query.lower() in history_item['query'].lower():
+            if partial in fold(history_item['query']):
                 suggestions.append(history_item['query'])
         
         # From app names
         apps = load_apps()
         for app in apps:
-            if partial_query.lower() in app['name'].lower():
+            if partial in search_fields(app)['name']:
                 suggestions.append(app['name'])
         
         # Remove duplicates and limit
@@ -1592,6 +1512,8 @@ class SocialPlatform:
     
     def __init__(self):
         self.ensure_social_db()
+        self.graph = SocialGraph(SOCIAL_DB)  # follows, shared with the web app
+        self.collections = CollectionStore(self.graph)
     
     def ensure_social_db(self):
         """Create social features database"""
@@ -1694,34 +1616,25 @@ class SocialPlatform:
     
     def follow_user(self, follower_id: str, following_id: str):
         """Follow another user"""
+        if not self.graph.follow(follower_id, following_id):
+            print("Already following this user!")
+            return
+        
         conn = sqlite3.connect(SOCIAL_DB)
         cursor = conn.cursor()
         
-        try:
-            cursor.execute('''
-                INSERT INTO follows (follower_id, following_id)
-                VALUES (?, ?)
-            ''', (follower_id, following_id))
-            
-            # Update follower counts
-            cursor.execute('''
-                UPDATE user_profiles 
-                SET followers_count = followers_count + 1 
-                WHERE user_id = ?
-            ''', (following_id,))
-            
-            cursor.execute('''
-                UPDATE user_profiles 
-                SET following_count = following_count + 1 
-                WHERE user_id = ?
-            ''', (follower_id,))
-            
-            conn.commit()
-            print("✅ Successfully followed user!")
-        except sqlite3.IntegrityError:
-            print("Already following this user!")
-        finally:
-            conn.close()
+        # Keep the profile counts in step with the graph's
+        cursor.execute('''
+            UPDATE user_profiles SET followers_count = ? WHERE user_id = ?
+        ''', (self.graph.counts(following_id)['followers'], following_id))
+        
+        cursor.execute('''
+            UPDATE user_profiles SET following_count = ? WHERE user_id = ?
+        ''', (self.graph.counts(follower_id)['following'], follower_id))
+        
+        conn.commit()
+        conn.close()
+        print("✅ Successfully followed user!")
     
     def share_app(self, app_id: str, user_id: str, platform: str, message: str = ""):
         """Share an app on social media"""
@@ -1745,34 +1658,14 @@ class SocialPlatform:
     
     def create_collection(self, user_id: str, name: str, description: str = "", public: bool = True) -> str:
         """Create an app collection"""
-        collection_id = str(uuid.uuid4())
-        
-        conn = sqlite3.connect(SOCIAL_DB)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO user_collections (collection_id, user_id, name, description, public)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (collection_id, user_id, name, description, public))
-        
-        conn.commit()
-        conn.close()
-        
+        collection = self.collections.create(user_id, name, description, is_public=public)
         print(f"\n📚 Collection '{name}' created!")
-        return collection_id
+        return collection['id']
     
     def add_to_collection(self, collection_id: str, app_id: str, notes: str = ""):
         """Add app to collection"""
-        conn = sqlite3.connect(SOCIAL_DB)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO collection_apps (collection_id, app_id, notes)
-            VALUES (?, ?, ?)
-        ''', (collection_id, app_id, notes))
-        
-        conn.commit()
-        conn.close()
+        if not self.collections.add_app(collection_id, app_id, notes):
+            print("Already in this collection!")
     
     def award_achievement(self, user_id: str, achievement_type: str, achievement_name: str, points: int):
         """Award achievement to user"""
@@ -2279,18 +2172,113 @@ def perform_advanced_search():
         else:
             print("No apps match the criteria")
 
+# Shared with the web workers: locked, atomic writes that merge concurrent changes
+apps_store = JsonStore('apps_data.json', counters=('views', 'downloads'),
+                       dump_kwargs={'indent': 2, 'ensure_ascii': False}, prepare=prepare_app)
+
 def load_apps():
     """Load apps from the JSON file"""
-    if os.path.exists('apps_data.json'):
-        with open('apps_data.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return []
+    return apps_store.load()
+
+_catalog_derived = {}  # apps_data.json version -> {name: structure built from it}
+
+def catalog_derived(apps, name: str, build):
+    """``build(apps)`` for ``apps`` (from load_apps), reused while apps_data.json is unchanged"""
+    if apps.version is None:
+        return build(apps)
+    derived = _catalog_derived.get(apps.version)
+    if derived is None:
+        _catalog_derived.clear()
+        derived = _catalog_derived[apps.version] = {}
+    if name not in derived:
+        derived[name] = build(apps)
+    return derived[name]
+
+def catalog_columns(apps):
+    """Typed columns of ``apps`` (from load_apps), reused while apps_data.json is unchanged"""
+    return catalog_derived(apps, 'columns', CatalogColumns.from_apps)
 
 def save_apps(apps):
-    """Save apps to the JSON file"""
-    with open('apps_data.json', 'w', encoding='utf-8') as f:
-        json.dump(apps, f, indent=2, ensure_ascii=False)
+    """Save apps to the JSON file (merged onto changes made since load_apps)"""
+    try:
+        apps_store.save(apps)
+    except StaleWriteError as e:
+        print(f"❌ Not saved, the store changed while you were editing: {e}")
+        print("   Reload and apply your change again.")
+        return False
+    # Drop cached storefront pages in every running web worker
+    invalidate_tags(str(CACHE_DIR / "page_tags"), 'catalog')
+    # Patch the saved search index with the apps added, edited or removed
+    refresh_search_index()
     print("✅ Apps data saved successfully!")
+    if CONFIG['enable_cdn']:
+        update_static_export()
+    return True
+
+# The SearchEngine's index, saved with the version of apps_data.json it matches
+SEARCH_INDEX_FILE = CACHE_DIR / "search_index.pkl"
+SEARCH_INDEX_FORMAT = (INDEX_FORMAT, SEARCH_VERSION)
+
+def read_search_index():
+    """(index, catalog version) from the index file; None if missing, unreadable or of another format"""
+    try:
+        with open(SEARCH_INDEX_FILE, 'rb') as f:
+            saved = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:  # truncated or from an older layout: rebuilt by the caller
+        print(f"⚠️ Ignoring unreadable search index: {e}")
+        return None
+    if not isinstance(saved, dict) or saved.get('format') != SEARCH_INDEX_FORMAT:
+        return None
+    return saved['index'], saved['catalog_version']
+
+def write_search_index(index, catalog_version):
+    """Replace the index file atomically, so readers never see half of one"""
+    SEARCH_INDEX_FILE.parent.mkdir(exist_ok=True)
+    with atomic_file(str(SEARCH_INDEX_FILE), 'wb') as f:
+        pickle.dump({'format': SEARCH_INDEX_FORMAT, 'catalog_version': catalog_version, 'index': index},
+                    f, protocol=pickle.HIGHEST_PROTOCOL)
+
+def refresh_search_index(build=False):
+    """
+    The saved search index, brought up to date with apps_data.json: used as
+    is when it matches the catalog's version, otherwise only the apps whose
+    text changed are re-indexed. Without a saved index, one is built if
+    ``build`` is set; otherwise there is nothing to do and None is returned.
+    """
+    saved = read_search_index()
+    if saved is None:
+        if not build:
+            return None
+        apps = load_apps()
+        index = FuzzyIndex.from_apps(apps)
+        write_search_index(index, apps.version)
+        return index
+    index, catalog_version = saved
+    if catalog_version != apps_store.version():
+        apps = load_apps()
+        index.refresh(apps)
+        write_search_index(index, apps.version)
+    return index
+
+def update_static_export():
+    """Regenerate the static storefront pages affected by the last save (CDN copy)"""
+    if not export_enabled(SITE_DIR):
+        return
+    # Pages render through the storefront's own views, so the export runs in
+    # its own process instead of loading the web app (Flask, its stores and
+    # workers) into this one
+    exporter = Path(__file__).resolve().with_name('static_export.py')
+    result = subprocess.run([sys.executable, str(exporter), '--changed'], capture_output=True,
+                            encoding='utf-8', env={**os.environ, 'PYTHONIOENCODING': 'utf-8'})
+    if result.returncode != 0:
+        error = (result.stderr.strip().splitlines() or ['unknown error'])[-1]
+        print(f"⚠️ Static export failed: {error}")
+        return
+    summary = result.stdout.strip().splitlines()
+    if summary and not summary[0].startswith('✅ Regenerated 0 '):
+        print(f"🌐 Static export updated: {summary[0].lstrip('✅ ')}")
 
 def list_files_in_directory(directory, extensions):
     """List files with specific extensions in a directory"""
@@ -0,0 +1,346 @@
+"""
+Request & Storage Metrics
+Per-endpoint latency histograms, status counts and request/response bytes,
+plus call counts, durations and bytes for the JSON store operations
+(load_apps, save_apps and the users/activities/analytics writes).
+Exposed in Prometheus text format on /metrics, to scrapers sending the
+METRICS_TOKEN bearer token and to logged-in admins.
+
+Within a request, time is also split into phases (catalog load, index lookups,
+template render, persistence). With SERVER_TIMING enabled the breakdown is sent
+as a Server-Timing header, and slow requests are sampled to a rotating JSONL log.
+
+Each gunicorn worker keeps its own registry and periodically snapshots it to
+cache/metrics/<pid>.json; /metrics merges the snapshots of all live workers so
+a scrape sees the whole server, whichever worker answers it.
+"""
+
+import hmac
+import json
+import logging
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from logging.handlers import RotatingFileHandler
+
+from flask import request, g, Response, abort, has_request_context, before_render_template, template_rendered
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+SNAPSHOT_INTERVAL = 5  # seconds between worker snapshots
+
+# Request phases reported in Server-Timing and the slow log
+PHASES = {
+    'catalog': 'Catalog load',
+    'index': 'Index lookups',
+    'render': 'Template render',
+    'persist': 'Persistence',
+}
+
+METRICS = {
+    # name: (type, help, buckets)
+    'http_requests_total': ('counter', 'HTTP requests by endpoint, method and status', None),
+    'http_request_duration_seconds': ('histogram', 'HTTP request latency by endpoint', LATENCY_BUCKETS),
+    'http_request_bytes_total': ('counter', 'Request body bytes received by endpoint', None),
+    'http_response_bytes_total': ('counter', 'Response body bytes sent by endpoint', None),
+    'http_request_json_bytes': ('histogram', 'JSON store bytes read/written per request', BYTES_BUCKETS),
+    'store_operations_total': ('counter', 'JSON store operations by operation', None),
+    'store_operation_duration_seconds': ('histogram', 'JSON store operation latency', LATENCY_BUCKETS),
+    'store_bytes_total': ('counter', 'JSON store bytes by operation and direction', None),
+}
+
+
+def _label_key(labels: dict) -> str:
+    return json.dumps(sorted(labels.items()))
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(label_key: str, extra=None) -> str:
+    pairs = json.loads(label_key) + (extra or [])
+    if not pairs:
+        return ''
+    escaped = (f'{k}="{_escape(v)}"' for k, v in pairs)
+    return '{' + ','.join(escaped) + '}'
+
+
+def _fmt(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms for one process"""
+
+    def __init__(self, snapshot_dir: str = None):
+        self.snapshot_dir = snapshot_dir
+        self._lock = threading.Lock()
+        self._counters = {name: {} for name, spec in METRICS.items() if spec[0] == 'counter'}
+        # histogram values: [bucket counts..., +Inf count, sum]
+        self._histograms = {name: {} for name, spec in METRICS.items() if spec[0] == 'histogram'}
+        self._last_snapshot = 0.0
+        if snapshot_dir:
+            os.makedirs(snapshot_dir, exist_ok=True)
+
+    # ----- recording -----
+
+    def inc(self, name: str, labels: dict, value=1):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters[name]
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, labels: dict, value: float):
+        buckets = METRICS[name][2]
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms[name]
+            values = series.get(key)
+            if values is None:
+                values = series[key] = [0] * (len(buckets) + 2)
+            values[bisect_left(buckets, value)] += 1
+            values[-1] += value
+
+    def record_io(self, operation: str, direction: str, nbytes: int):
+        """Bytes read/written by a store operation, also attributed to the current request"""
+        self.inc('store_bytes_total', {'operation': operation, 'direction': direction}, nbytes)
+        try:
+            io = g.setdefault('json_io', {})
+            io[direction] = io.get(direction, 0) + nbytes
+        except RuntimeError:
+            pass  # outside a request (CLI, background threads)
+
+    def timed(self, operation: str, phase: str = None):
+        """Decorator counting calls and durations of a store operation"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    if phase is None:
+                        return func(*args, **kwargs)
+                    with self.phase(phase):
+                        return func(*args, **kwargs)
+                finally:
+                    labels = {'operation': operation}
+                    self.inc('store_operations_total', labels)
+                    self.observe('store_operation_duration_seconds', labels, time.perf_counter() - started)
+            return wrapper
+        return decorator
+
+    # ----- request phases -----
+
+    @staticmethod
+    def _enter_phase(name: str):
+        g.setdefault('phase_stack', []).append([name, time.perf_counter(), 0.0])
+
+    @staticmethod
+    def _exit_phase(name: str):
+        stack = g.get('phase_stack')
+        if not stack or not any(frame[0] == name for frame in stack):
+            return
+        # Drop frames left open by a render that raised
+        while stack[-1][0] != name:
+            stack.pop()
+        _, started, nested = stack.pop()
+        elapsed = time.perf_counter() - started
+        timings = g.setdefault('phase_timings', {})
+        # Exclusive time: a catalog load inside a render counts only as catalog
+        timings[name] = timings.get(name, 0.0) + elapsed - nested
+        if stack:
+            stack[-1][2] += elapsed
+
+    @contextmanager
+    def phase(self, name: str):
+        """Attribute the enclosed time to a request phase (also usable as a decorator)"""
+        if not has_request_context():
+            yield
+            return
+        self._enter_phase(name)
+        try:
+            yield
+        finally:
+            self._exit_phase(name)
+
+    # ----- multi-worker snapshots -----
+
+    def _state(self) -> dict:
+        with self._lock:
+            return {
+                'counters': {n: dict(s) for n, s in self._counters.items()},
+                'histograms': {n: {k: list(v) for k, v in s.items()} for n, s in self._histograms.items()},
+            }
+
+    def snapshot(self, force: bool = False):
+        """Write this worker's state so other workers can include it in /metrics"""
+        if not self.snapshot_dir:
+            return
+        now = time.time()
+        if not force and now - self._last_snapshot < SNAPSHOT_INTERVAL:
+            return
+        self._last_snapshot = now
+        path = os.path.join(self.snapshot_dir, f"{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._state(), f)
+        os.replace(tmp_path, path)
+
+    def _merged_state(self) -> dict:
+        merged = self._state()
+        if not self.snapshot_dir:
+            return merged
+        for filename in os.listdir(self.snapshot_dir):
+            if not filename.endswith('.json') or filename == f"{os.getpid()}.json":
+                continue
+            try:
+                pid = int(filename[:-5])
+                os.kill(pid, 0)  # only live workers; a restarted worker starts from zero
+                with open(os.path.join(self.snapshot_dir, filename), 'r') as f:
+                    other = json.load(f)
+            except (ValueError, OSError, json.JSONDecodeError):
+                continue
+            for name, series in other.get('counters', {}).items():
+                target = merged['counters'].setdefault(name, {})
+                for key, value in series.items():
+                    target[key] = target.get(key, 0) + value
+            for name, series in other.get('histograms', {}).items():
+                target = merged['histograms'].setdefault(name, {})
+                for key, values in series.items():
+                    if key in target:
+                        target[key] = [a + b for a, b in zip(target[key], values)]
+                    else:
+                        target[key] = list(values)
+        return merged
+
+    # ----- exposition -----
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        state = self._merged_state()
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == 'counter':
+                for key, value in sorted(state['counters'].get(name, {}).items()):
+                    lines.append(f"{name}{_format_labels(key)} {_fmt(value)}")
+                continue
+            for key, values in sorted(state['histograms'].get(name, {}).items()):
+                cumulative = 0
+                for bound, count in zip(buckets + ('+Inf',), values[:-1]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(key, [['le', str(bound)]])} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(key)} {_fmt(values[-1])}")
+                lines.append(f"{name}_count{_format_labels(key)} {cumulative}")
+        return '\n'.join(lines) + '\n'
+
+    # ----- Flask integration -----
+
+    def init_app(self, app, token: str = None, allow=None):
+        """
+        Register request hooks and the /metrics endpoint. The endpoint
+        answers requests carrying ``token`` as a bearer token, or for which
+        ``allow()`` returns True; with neither configured it is closed.
+        """
+        slow_log = SlowRequestLog(app.config['SLOW_REQUEST_LOG'],
+                                  app.config.get('SLOW_REQUEST_THRESHOLD_MS', 500),
+                                  app.config.get('SLOW_REQUEST_SAMPLE_RATE', 1.0)) \
+            if app.config.get('SLOW_REQUEST_LOG') else None
+
+        def start_render_phase(sender, template, context, **extra):
+            self._enter_phase('render')
+
+        def end_render_phase(sender, template, context, **extra):
+            self._exit_phase('render')
+
+        # Signal receivers are weakly referenced by default
+        before_render_template.connect(start_render_phase, app, weak=False)
+        template_rendered.connect(end_render_phase, app, weak=False)
+
+        @app.before_request
+        def start_request_timer():
+            g.request_started = time.perf_counter()
+
+        @app.after_request
+        def record_request_metrics(response):
+            started = g.pop('request_started', None)
+            if started is None:
+                return response
+            duration = time.perf_counter() - started
+            endpoint = request.endpoint or 'unmatched'
+            self.inc('http_requests_total', {'endpoint': endpoint, 'method': request.method,
+                                             'status': str(response.status_code)})
+            self.observe('http_request_duration_seconds', {'endpoint': endpoint}, duration)
+            if request.content_length:
+                self.inc('http_request_bytes_total', {'endpoint': endpoint}, request.content_length)
+            if response.content_length:
+                self.inc('http_response_bytes_total', {'endpoint': endpoint}, response.content_length)
+            for direction, nbytes in g.pop('json_io', {}).items():
+                self.observe('http_request_json_bytes', {'endpoint': endpoint, 'direction': direction}, nbytes)
+
+            phases = g.pop('phase_timings', {})
+            if app.config.get('SERVER_TIMING'):
+                response.headers['Server-Timing'] = server_timing_header(phases, duration)
+            if slow_log is not None:
+                slow_log.maybe_record(response, duration, phases)
+            self.snapshot()
+            return response
+
+        @app.route('/metrics')
+        def metrics_endpoint():
+            """Prometheus scrape endpoint"""
+            authorized = token and hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}")
+            if not authorized and not (allow is not None and allow()):
+                abort(403)
+            self.snapshot(force=True)
+            return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+
+def server_timing_header(phases: dict, total: float) -> str:
+    """Format phase durations (seconds) as a Server-Timing header value"""
+    entries = [f'{name};dur={phases.get(name, 0.0) * 1000:.2f};desc="{desc}"'
+               for name, desc in PHASES.items()]
+    entries.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(entries)
+
+
+class SlowRequestLog:
+    """Samples requests slower than a threshold to a size-rotated JSONL file"""
+
+    def __init__(self, path: str, threshold_ms: float = 500, sample_rate: float = 1.0,
+                 max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5):
+        self.threshold = threshold_ms / 1000
+        self.sample_rate = sample_rate
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # A dedicated logger gives us thread-safe writes and rotation for free
+        self.logger = logging.getLogger(f"slow_requests.{path}")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        if not self.logger.handlers:
+            handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                          encoding='utf-8', delay=True)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self.logger.addHandler(handler)
+
+    def maybe_record(self, response, duration: float, phases: dict):
+        if duration < self.threshold or random.random() >= self.sample_rate:
+            return
+        entry = {
+            'timestamp': datetime.now().isoformat(),
+            'method': request.method,
+            'route': request.url_rule.rule if request.url_rule else request.path,
+            'endpoint': request.endpoint,
+            'view_args': request.view_args or {},
+            'args': request.args.to_dict(flat=False),
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'phases_ms': {name: round(phases.get(name, 0.0) * 1000, 2) for name in PHASES},
+            'pid': os.getpid(),
+        }
+        self.logger.info(json.dumps(entry, ensure_ascii=False, default=str))
@@ -0,0 +1,250 @@
+"""
+Full-Page Response Cache
+Caches complete HTML responses for anonymous visitors, keyed by path, query
+string and theme cookie. Every page carries tags ('catalog', 'listings',
+'app:<id>'); invalidating a tag replaces a small marker file, so all gunicorn
+workers (and the CLI) see the change with a single stat() per tag.
+Expired or invalidated pages are served stale while one request re-renders
+them in the background, and concurrent misses for the same page wait for a
+single render instead of stampeding the backend. A page whose re-render
+ends in an HTTP error (a deleted app's 404) is dropped at once; one whose
+re-render fails otherwise is served stale for at most FAILED_STALE_TTL more
+seconds.
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, session, make_response, copy_current_request_context
+from flask_login import current_user
+from werkzeug.exceptions import HTTPException
+
+DEFAULT_FRESH_TTL = 30        # seconds a page is served without re-rendering
+DEFAULT_STALE_TTL = 600       # extra seconds a page may be served while re-rendering
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+MISS_WAIT_TIMEOUT = 10        # seconds a concurrent miss waits for the leader's render
+FAILED_STALE_TTL = 60         # seconds a page whose re-render failed may still be served stale
+
+
+def _tag_filename(tag: str) -> str:
+    return ''.join(c if c.isalnum() or c in '-_.' else '_' for c in tag)
+
+
+def invalidate_tags(tag_dir: str, *tags):
+    """Invalidate pages carrying any of the tags (safe to call from any process)"""
+    os.makedirs(tag_dir, exist_ok=True)
+    for tag in tags:
+        marker = os.path.join(tag_dir, _tag_filename(tag))
+        tmp_path = f"{marker}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(uuid.uuid4().hex)
+        # A fresh inode changes the stat token even within one mtime tick
+        os.replace(tmp_path, marker)
+
+
+class CachedPage:
+    __slots__ = ('body', 'status', 'headers', 'tags', 'tag_tokens', 'fresh_until', 'stale_until')
+
+    def __init__(self, body, status, headers, tags, tag_tokens, fresh_until, stale_until):
+        self.body = body
+        self.status = status
+        self.headers = headers
+        self.tags = tags
+        self.tag_tokens = tag_tokens
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+
+class PageCache:
+    """In-process LRU of rendered pages with tag-based invalidation"""
+
+    def __init__(self, tag_dir: str, fresh_ttl: int = DEFAULT_FRESH_TTL,
+                 stale_ttl: int = DEFAULT_STALE_TTL, max_bytes: int = DEFAULT_MAX_BYTES, logger=None):
+        self.tag_dir = tag_dir
+        self.logger = logger or logging.getLogger(__name__)
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = stale_ttl
+        self.max_bytes = max_bytes
+        self.enabled = True
+        self._pages = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._inflight = {}  # key -> threading.Event set when the render finishes
+        os.makedirs(tag_dir, exist_ok=True)
+
+    # ----- tags -----
+
+    def tag_token(self, tag: str):
+        try:
+            st = os.stat(os.path.join(self.tag_dir, _tag_filename(tag)))
+            return (st.st_ino, st.st_mtime_ns)
+        except OSError:
+            return None
+
+    def invalidate(self, *tags):
+        invalidate_tags(self.tag_dir, *tags)
+
+    # ----- storage -----
+
+    def _get(self, key):
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+            return page
+
+    def _store(self, key, page):
+        with self._lock:
+            old = self._pages.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old.body)
+            self._pages[key] = page
+            self._bytes += len(page.body)
+            while self._bytes > self.max_bytes and self._pages:
+                _, evicted = self._pages.popitem(last=False)
+                self._bytes -= len(evicted.body)
+
+    def _evict(self, key):
+        with self._lock:
+            page = self._pages.pop(key, None)
+            if page is not None:
+                self._bytes -= len(page.body)
+
+    def _expire_soon(self, key):
+        """Stop serving a page whose re-render failed within FAILED_STALE_TTL (counted from the first failure)"""
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None:
+                page.stale_until = min(page.stale_until, time.time() + FAILED_STALE_TTL)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'pages': len(self._pages), 'bytes': self._bytes, 'inflight': len(self._inflight)}
+
+    # ----- request handling -----
+
+    @staticmethod
+    def cacheable() -> bool:
+        """Only anonymous GETs without pending flash messages share cached HTML"""
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        if current_user.is_authenticated or '_flashes' in session:
+            return False
+        return True
+
+    @staticmethod
+    def make_key() -> str:
+        query = '&'.join(sorted(request.query_string.decode('utf-8', 'replace').split('&')))
+        return f"{request.path}?{query}#{request.cookies.get('theme', 'light')}"
+
+    def _render(self, key, tags, view, args, kwargs):
+        """Run the view and cache its response when it is safe to share"""
+        # Tokens are read before rendering, so an invalidation that lands
+        # mid-render leaves the new entry already out of date
+        tokens = tuple(self.tag_token(tag) for tag in tags)
+        response = make_response(view(*args, **kwargs))
+        if response.status_code != 200:
+            self._evict(key)  # e.g. the app is gone: never serve the old page again
+        elif not response.direct_passthrough and 'Set-Cookie' not in response.headers:
+            now = time.time()
+            headers = [(k, v) for k, v in response.headers.items() if k.lower() != 'content-length']
+            self._store(key, CachedPage(response.get_data(), response.status_code, headers, tags,
+                                        tokens, now + self.fresh_ttl, now + self.fresh_ttl + self.stale_ttl))
+        return response
+
+    def _respond(self, page, state):
+        response = make_response(page.body, page.status)
+        response.headers.clear()
+        for k, v in page.headers:
+            response.headers.add(k, v)
+        response.headers['X-Cache'] = state
+        return response
+
+    def _begin(self, key):
+        """Claim the render for a key; returns None if another request already has it"""
+        with self._lock:
+            if key in self._inflight:
+                return None
+            event = threading.Event()
+            self._inflight[key] = event
+            return event
+
+    def _finish(self, key):
+        with self._lock:
+            event = self._inflight.pop(key, None)
+        if event:
+            event.set()
+
+    def _revalidate_in_background(self, key, tags, view, args, kwargs):
+        if self._begin(key) is None:
+            return
+
+        @copy_current_request_context
+        def revalidate():
+            try:
+                self._render(key, tags, view, args, kwargs)
+            except HTTPException:
+                self._evict(key)  # abort(404) and friends: the page no longer exists
+            except Exception:
+                # Keep serving the stale copy for a while; the next request retries
+                self.logger.exception("Re-rendering %s for the page cache failed", key)
+                self._expire_soon(key)
+            finally:
+                self._finish(key)
+
+        threading.Thread(target=revalidate, name='page-cache-revalidate', daemon=True).start()
+
+    def cached(self, tags=('catalog',)):
+        """
+        Decorator for anonymous-cacheable views. ``tags`` is a list of tags or a
+        callable receiving the view's arguments and returning one.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled or not self.cacheable():
+                    return view(*args, **kwargs)
+
+                key = self.make_key()
+                page_tags = tuple(tags(*args, **kwargs) if callable(tags) else tags)
+                page = self._get(key)
+                now = time.time()
+
+                if page is not None and now < page.stale_until:
+                    current = page.tag_tokens == tuple(self.tag_token(t) for t in page.tags)
+                    if current and now < page.fresh_until:
+                        return self._respond(page, 'HIT')
+                    # Expired or invalidated: serve it once more while it re-renders
+                    self._revalidate_in_background(key, page_tags, view, args, kwargs)
+                    return self._respond(page, 'STALE')
+
+                event = self._begin(key)
+                if event is None:
+                    # Another request is rendering this page; wait for its result
+                    with self._lock:
+                        waiting = self._inflight.get(key)
+                    if waiting is not None:
+                        waiting.wait(MISS_WAIT_TIMEOUT)
+                    page = self._get(key)
+                    if page is not None and time.time() < page.stale_until:
+                        return self._respond(page, 'HIT')
+                    return view(*args, **kwargs)
+
+                try:
+                    response = self._render(key, page_tags, view, args, kwargs)
+                finally:
+                    self._finish(key)
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            return wrapper
+        return decorator
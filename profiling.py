@@ -0,0 +1,172 @@
+"""
+On-Demand Profiling
+A sampling profiler over every thread of the running process (output in the
+collapsed-stack format read by flamegraph.pl and speedscope) and tracemalloc
+snapshots/diffs together with the retained size of the big in-memory stores.
+
+Both are idle until an admin asks for them: the profiler only runs for the
+requested number of seconds, one run at a time, and tracemalloc switches
+itself off again after TRACEMALLOC_MAX_SECONDS.
+"""
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+MAX_PROFILE_SECONDS = 30
+DEFAULT_INTERVAL = 0.01   # 100 samples per second
+MAX_STACK_DEPTH = 64
+TRACEMALLOC_FRAMES = 10
+TRACEMALLOC_MAX_SECONDS = 15 * 60
+TOP_STATS = 25
+
+_profile_lock = threading.Lock()
+
+
+class ProfilerBusy(RuntimeError):
+    """Raised when a profile is requested while another one is running"""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ':')
+
+
+def sample_stacks(seconds: float, interval: float = DEFAULT_INTERVAL) -> Counter:
+    """
+    Sample the stack of every other thread for ``seconds``; returns
+    collapsed stack -> sample count. Only one profile runs at a time.
+    """
+    seconds = max(0.1, min(float(seconds), MAX_PROFILE_SECONDS))
+    interval = max(0.001, float(interval))
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running")
+    try:
+        own_ident = threading.get_ident()
+        stacks = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                labels = []
+                while frame is not None and len(labels) < MAX_STACK_DEPTH:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(names.get(ident, f"thread-{ident}").replace(';', ':'))
+                stacks[';'.join(reversed(labels))] += 1
+            del frame
+            time.sleep(interval)
+        return stacks
+    finally:
+        _profile_lock.release()
+
+
+def format_collapsed(stacks: Counter) -> str:
+    return ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def deep_sizeof(obj) -> int:
+    """Bytes retained by a container and everything it references (shared objects counted once)"""
+    seen = set()
+    total = 0
+    pending = [obj]
+    while pending:
+        item = pending.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            pending.extend(item.keys())
+            pending.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            pending.extend(item)
+    return total
+
+
+class MemoryTracker:
+    """tracemalloc snapshots, each diffed against the previous one"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._previous = None
+        self._stop_timer = None
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    @staticmethod
+    def _take():
+        snapshot = tracemalloc.take_snapshot()
+        return snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<unknown>'),
+        ))
+
+    @staticmethod
+    def _stat(stat) -> dict:
+        frame = stat.traceback[0]
+        entry = {'location': f"{frame.filename}:{frame.lineno}", 'size_kb': round(stat.size / 1024, 1),
+                 'count': stat.count}
+        if hasattr(stat, 'size_diff'):
+            entry['size_diff_kb'] = round(stat.size_diff / 1024, 1)
+            entry['count_diff'] = stat.count_diff
+        return entry
+
+    def snapshot(self, containers: dict = None) -> dict:
+        """
+        Start tracing if needed, otherwise return the top allocation sites and
+        the growth since the previous snapshot. ``containers`` maps a name to
+        an object (or a callable returning a number of bytes) to report
+        retained sizes for.
+        """
+        with self._lock:
+            result = {'containers_kb': {}}
+            for name, target in (containers or {}).items():
+                size = target() if callable(target) else deep_sizeof(target)
+                result['containers_kb'][name] = round(size / 1024, 1)
+
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+                self._previous = self._take()
+                self._schedule_stop()
+                result['tracing'] = 'started'
+                return result
+
+            current = self._take()
+            traced, peak = tracemalloc.get_traced_memory()
+            result.update({
+                'tracing': 'running',
+                'traced_kb': round(traced / 1024, 1),
+                'peak_kb': round(peak / 1024, 1),
+                'top': [self._stat(s) for s in current.statistics('lineno')[:TOP_STATS]],
+            })
+            if self._previous is not None:
+                diff = current.compare_to(self._previous, 'lineno')
+                result['diff'] = [self._stat(s) for s in diff[:TOP_STATS]]
+            self._previous = current
+            return result
+
+    def _schedule_stop(self):
+        if self._stop_timer is not None:
+            self._stop_timer.cancel()
+        # Tracing slows every allocation down, so never leave it on indefinitely
+        self._stop_timer = threading.Timer(TRACEMALLOC_MAX_SECONDS, self.stop)
+        self._stop_timer.daemon = True
+        self._stop_timer.start()
+
+    def stop(self):
+        with self._lock:
+            if self._stop_timer is not None:
+                self._stop_timer.cancel()
+                self._stop_timer = None
+            self._previous = None
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
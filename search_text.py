@@ -0,0 +1,110 @@
+"""
+Search Text Normalization
+One folded, tokenized search representation per app, computed when the app
+is written (JsonStore's ``prepare`` hook) and stored with it under
+``_search``, so search paths compare against ready-made text instead of
+lowercasing every field of every app on every query.
+
+Folding makes text that reads the same compare equal:
+
+- Unicode compatibility forms and case (NFKC + casefold; "Ｆｏｏ" -> "foo",
+  "Straße" -> "strasse", Arabic presentation forms -> letters).
+- Diacritics: Latin accents, Arabic harakat, shadda, sukun, superscript alef
+  and Quranic marks are dropped, as is the tatweel (kashida).
+- Arabic letter variants: alef with hamza/madda and alef wasla -> ا, alef
+  maqsura and Farsi yeh -> ي, ؤ -> و, ئ -> ي, ة -> ه, keheh -> ك, and
+  Arabic-Indic digits -> 0-9.
+- Runs of whitespace become one space.
+
+Queries go through the same fold(), so "احمد" finds "أَحْمَد".
+"""
+
+import hashlib
+import re
+import unicodedata
+
+SEARCH_FIELD = '_search'
+SEARCH_VERSION = 1
+TEXT_FIELDS = ('name', 'developer', 'description', 'category', 'mod_features')
+
+_MARKS = re.compile('[\u0300-\u036f\u0610-\u061a\u0640\u064b-\u065f\u0670\u06d6-\u06dc\u06df-\u06e8\u06ea-\u06ed]')
+_LETTERS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ی': 'ي', 'ئ': 'ي',
+    'ؤ': 'و',
+    'ة': 'ه',
+    'ک': 'ك',
+    **{chr(0x0660 + d): str(d) for d in range(10)},  # Arabic-Indic digits
+    **{chr(0x06f0 + d): str(d) for d in range(10)},  # Extended (Persian) digits
+})
+_WHITESPACE = re.compile(r'\s+')
+_TOKEN = re.compile(r'\w+')
+
+
+def fold(text) -> str:
+    """The comparable form of ``text`` (see the module docstring)"""
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKC', str(text)).casefold()
+    # Decompose so accents and hamza/madda become separate marks, then drop them
+    text = _MARKS.sub('', unicodedata.normalize('NFD', text)).translate(_LETTERS)
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFC', text)).strip()
+
+
+def tokenize(text) -> list:
+    """Words of ``text``, folded"""
+    return _TOKEN.findall(fold(text))
+
+
+def words(folded: str) -> list:
+    """Words of text that is already folded (a field of search_fields())"""
+    return _TOKEN.findall(folded)
+
+
+def _source_key(app: dict) -> str:
+    """Fingerprint of the text an app's representation is built from, checked on every write"""
+    source = '\x1f'.join([str(app.get(field) or '') for field in TEXT_FIELDS] +
+                          [str(tag) for tag in app.get('tags') or ()])
+    return hashlib.blake2b(source.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def build(app: dict) -> dict:
+    """The search representation of ``app``: folded fields, folded tags and its distinct tokens"""
+    fields = {field: fold(app.get(field, '')) for field in TEXT_FIELDS}
+    tags = [fold(tag) for tag in app.get('tags', []) or [] if tag]
+    tokens = set()
+    for text in (*fields.values(), *tags):
+        tokens.update(words(text))
+    return {'v': SEARCH_VERSION, 'key': _source_key(app), **fields, 'tags': tags, 'tokens': sorted(tokens)}
+
+
+def _stored(app: dict, key: str):
+    """The stored representation if it is current and was built from text with fingerprint ``key``"""
+    current = app.get(SEARCH_FIELD)
+    if isinstance(current, dict) and current.get('v') == SEARCH_VERSION and current.get('key') == key:
+        return current
+    return None
+
+
+def prepare_app(app: dict):
+    """JsonStore prepare hook: (re)compute the stored representation if the app's text changed"""
+    if _stored(app, _source_key(app)) is None:
+        app[SEARCH_FIELD] = build(app)
+
+
+def search_key(app: dict) -> str:
+    """Fingerprint of the app's searchable text"""
+    return _source_key(app)
+
+
+def search_fields(app: dict) -> dict:
+    """The stored representation, or a fresh one when there is none or the app's text changed since"""
+    key = _source_key(app)
+    return _stored(app, key) or build(app)
+
+
+def public_app(app: dict) -> dict:
+    """``app`` without its search representation, for JSON served to clients"""
+    if SEARCH_FIELD not in app:
+        return app
+    return {key: value for key, value in app.items() if key != SEARCH_FIELD}
@@ -0,0 +1,452 @@
+"""
+Shared Catalog Across Workers
+Every gunicorn worker used to parse apps_data.json on each request and keep
+its own view/download counts in the file. Two pieces replace that:
+
+- CatalogSnapshot: a read-only binary snapshot of the catalog
+  (cache/catalog.snap) that all workers mmap, so the pages are shared through
+  the OS page cache instead of being copied per worker. It is rebuilt when
+  apps_data.json changes and swapped in atomically with a rename; readers
+  notice the new file on their next access.
+- SharedCounters: pending view/download increments in a
+  multiprocessing.shared_memory segment shared by all workers, so every
+  worker reports the same counts. Pending increments are written to
+  apps_data.json in one batch every few seconds instead of one full file
+  rewrite per page view.
+
+Snapshot layout (little endian):
+
+    header   magic, source version of apps_data.json (ino, mtime_ns, size),
+             record count, index offset, blob offset, blob length, counts
+             offset, text key
+    index    one (id offset, id length, record offset, record length) entry
+             per app, sorted by id for binary search
+    ids      the app ids, utf-8
+    blob     the catalog as one compact JSON array; each index entry points at
+             its record inside it
+    counts   views and downloads of every app as int64, in catalog order
+
+Each mapping also carries structures derived from its version of the
+catalog (the typed columns of catalog_columns.py, the fuzzy_index.py search
+index), built the first time a request asks for them. The text key is a
+digest of the catalog without its counts: a snapshot written by a counter
+flush has the same key as the one before it and takes its derived
+structures over, with the new counts read from the counts section, instead
+of rebuilding them from every record.
+"""
+
+import atexit
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from multiprocessing import shared_memory
+
+from catalog_columns import CatalogColumns, _number
+from json_store import Document, FileLock, StoreError, atomic_file
+
+SNAPSHOT_MAGIC = b'ISCATv2\x00'
+SNAPSHOT_HEADER = struct.Struct('<8sQqQIxxxxQQQQ16s')
+SNAPSHOT_ENTRY = struct.Struct('<QIQI')
+COUNT_FIELDS = ('views', 'downloads')  # kept out of the text key, stored in the counts section
+
+COUNTERS_MAGIC = b'ISCNTv1\x00'
+COUNTERS_HEADER = struct.Struct('<8sIIqd')  # magic, capacity, used, generation, last flush
+COUNTER_ID_SIZE = 64
+DEFAULT_COUNTER_SLOTS = 16384
+DEFAULT_FLUSH_SECONDS = 30
+RESET_FILL_RATIO = 0.75  # recycle the slot table once it is this full
+
+
+class _Mapping:
+    """One mmapped snapshot file"""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            self.file_version = (st.st_ino, st.st_mtime_ns)
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, ino, mtime_ns, size, self.count, self.index_off, self.blob_off, self.blob_len,
+         self.counts_off, self.text_key) = SNAPSHOT_HEADER.unpack_from(self.mm, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise StoreError(f"{path} is not a catalog snapshot")
+        self.source_version = (ino, mtime_ns, size)
+        # name -> (structure built from this version of the catalog, its recount), see CatalogSnapshot.derived
+        self.derived = {}
+
+    def records(self) -> list:
+        return json.loads(self.mm[self.blob_off:self.blob_off + self.blob_len])
+
+    def totals(self) -> dict:
+        """Field -> count of every app in catalog order, from the counts section"""
+        totals = {}
+        for n, field in enumerate(COUNT_FIELDS):
+            start = self.counts_off + n * self.count * 8
+            column = totals[field] = array('q', self.mm[start:start + self.count * 8])
+            if sys.byteorder == 'big':
+                column.byteswap()
+        return totals
+
+    def _entry(self, i: int):
+        return SNAPSHOT_ENTRY.unpack_from(self.mm, self.index_off + i * SNAPSHOT_ENTRY.size)
+
+    def get(self, app_id: str):
+        key = app_id.encode('utf-8')
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            id_off, id_len, rec_off, rec_len = self._entry(mid)
+            found = self.mm[id_off:id_off + id_len]
+            if found == key:
+                return json.loads(self.mm[rec_off:rec_off + rec_len])
+            if found < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+
+def _without_counts(encoded: bytes, record: dict) -> bytes:
+    """A record's JSON with its counts (and their separating commas) cut out, for the text key"""
+    for field in COUNT_FIELDS:
+        if field in record:
+            value = json.dumps(record[field], ensure_ascii=False, separators=(',', ':'))
+            item = f'"{field}":{value}'.encode('utf-8')
+            # The first match is the record's own field unless a nested object before it has
+            # the same key and value; then the key just changes with the counts
+            for cut in (b',' + item, item + b',', item):
+                if cut in encoded:
+                    encoded = encoded.replace(cut, b'', 1)
+                    break
+    return encoded
+
+
+def write_snapshot(path: str, records: list, source_version: tuple):
+    """Serialize ``records`` into a snapshot file, replacing it atomically"""
+    encoded = [json.dumps(r, ensure_ascii=False, separators=(',', ':')).encode('utf-8') for r in records]
+    ids = [str(r.get('id', '')).encode('utf-8') for r in records]
+    text_key = hashlib.blake2b(digest_size=16)
+    for record, data in zip(records, encoded):
+        text_key.update(_without_counts(data, record) + b'\n')
+    counts = array('q', (int(_number(r.get(field, 0))) for field in COUNT_FIELDS for r in records))
+    if sys.byteorder == 'big':
+        counts.byteswap()
+
+    index_off = SNAPSHOT_HEADER.size
+    ids_off = index_off + len(records) * SNAPSHOT_ENTRY.size
+    blob_off = ids_off + sum(len(i) for i in ids)
+    blob = b'[' + b','.join(encoded) + b']'
+
+    entries = []
+    id_pos, rec_pos = ids_off, blob_off + 1
+    for app_id, record in zip(ids, encoded):
+        entries.append((app_id, id_pos, len(app_id), rec_pos, len(record)))
+        id_pos += len(app_id)
+        rec_pos += len(record) + 1  # the separating comma
+    entries.sort()
+
+    ino, mtime_ns, size = source_version
+    parts = [SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, ino, mtime_ns, size, len(records), index_off,
+                                  blob_off, len(blob), blob_off + len(blob), text_key.digest())]
+    parts.extend(SNAPSHOT_ENTRY.pack(*entry[1:]) for entry in entries)
+    parts.extend(ids)
+    parts.append(blob)
+    parts.append(counts.tobytes())
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with atomic_file(path, 'wb') as f:
+        f.write(b''.join(parts))
+
+
+class CatalogSnapshot:
+    """Read the catalog of a JsonStore through a shared, mmapped snapshot"""
+
+    def __init__(self, store, path: str, logger=None):
+        self.store = store
+        self.path = os.path.abspath(path)
+        self.logger = logger
+        self._mapping = None
+        self._lock = threading.Lock()
+
+    def _current(self):
+        """The mapping matching apps_data.json, remapped or rebuilt if needed"""
+        source_version = self.store.version()
+        if source_version is None:
+            return None
+        with self._lock:
+            mapping = self._mapping
+            try:
+                st = os.stat(self.path)
+                if mapping is None or mapping.file_version != (st.st_ino, st.st_mtime_ns):
+                    mapping = self._adopt(_Mapping(self.path))  # another worker swapped it
+            except (OSError, ValueError, StoreError, struct.error):
+                mapping = None
+            if mapping is not None and mapping.source_version == source_version:
+                return mapping
+            return self._publish()
+
+    def _publish(self):
+        try:
+            with FileLock(f"{self.path}.lock"):
+                # Another worker may have rebuilt it while we waited
+                try:
+                    mapping = _Mapping(self.path)
+                    if mapping.source_version == self.store.version():
+                        return self._adopt(mapping)
+                except (OSError, ValueError, StoreError, struct.error):
+                    pass
+                doc = self.store.load()
+                if doc.version is None:
+                    return None
+                write_snapshot(self.path, doc, doc.version)
+                return self._adopt(_Mapping(self.path))
+        except OSError as e:
+            # e.g. Windows refuses to replace a file that is mapped elsewhere
+            if self.logger:
+                self.logger.warning("Catalog snapshot unavailable, reading %s directly: %s", self.store.path, e)
+            return None
+
+    def _adopt(self, mapping):
+        """Make ``mapping`` current, taking over what was derived from the last one if only counts changed"""
+        previous, self._mapping = self._mapping, mapping
+        if previous is not None and previous is not mapping and previous.text_key == mapping.text_key:
+            totals = None
+            for name, (value, recount) in previous.derived.items():
+                if recount is not None and name not in mapping.derived:
+                    totals = totals or mapping.totals()
+                    mapping.derived[name] = (recount(value, totals), recount)
+        return mapping
+
+    def load(self) -> Document:
+        """All apps, as a Document that JsonStore.save() can merge back"""
+        mapping = self._current()
+        if mapping is None:
+            return self.store.load()
+        return Document(mapping.records(), mapping.source_version, base=mapping.records,
+                        nbytes=mapping.blob_len)
+
+    def get(self, app_id: str):
+        """One app by id, decoding only its own record"""
+        mapping = self._current()
+        if mapping is None:
+            return next((app for app in self.store.load() if app.get('id') == app_id), None)
+        return mapping.get(app_id)
+
+    def derived(self, name: str, build, recount=None):
+        """
+        ``build(apps)`` for the current catalog, built once per snapshot and
+        kept with its mapping. When a new snapshot only changes view/download
+        counts, ``recount(value, totals)`` turns the last value into the new
+        one (``totals``: field -> count of every app in catalog order) instead
+        of building it again; use ``unchanged`` for values without counts.
+        """
+        mapping = self._current()
+        if mapping is None:
+            return build(self.store.load())
+        entry = mapping.derived.get(name)
+        if entry is None:
+            entry = mapping.derived[name] = (build(mapping.records()), recount)
+        return entry[0]
+
+    def columns(self) -> CatalogColumns:
+        """Typed columns of the catalog for filtering and sorting"""
+        return self.derived('columns', CatalogColumns.from_apps, recount=CatalogColumns.with_totals)
+
+
+def unchanged(value, totals):
+    """``recount`` for derived values that don't depend on view/download counts"""
+    return value
+
+
+class SharedCounters:
+    """
+    Pending increments of per-app counters (views, downloads) in shared memory.
+
+    Slots are handed out in order: ids live in a fixed-size id region and the
+    counts in an int64 array next to it, so reading every pending count is a
+    single slice. Increments are serialized across processes with a lock file;
+    reads take no lock. ``flush()`` hands the pending deltas to
+    ``apply({app_id: {field: delta}})`` and subtracts them once it returned,
+    so they stay visible to every worker until they are written.
+    """
+
+    def __init__(self, name: str, lock_path: str, fields=('views', 'downloads'),
+                 slots: int = DEFAULT_COUNTER_SLOTS, flush_seconds: float = DEFAULT_FLUSH_SECONDS,
+                 apply=None, logger=None):
+        self.fields = tuple(fields)
+        self.flush_seconds = flush_seconds
+        self.apply = apply
+        self.logger = logger
+        self._lock_file = FileLock(lock_path)
+        self._local = threading.Lock()
+        # One flush at a time across workers; increments go on while it writes
+        self._flush_lock = _Locked(threading.Lock(), FileLock(f"{lock_path}.flush"))
+        self._slot_ids = []     # this process's copy of the id region
+        self._slot_index = {}
+        self._generation = None
+        with self._locked():
+            self.shm = self._open(name, slots)
+            self.capacity = COUNTERS_HEADER.unpack_from(self.shm.buf, 0)[1]
+        self._ids_off = COUNTERS_HEADER.size
+        self._counts_off = self._ids_off + self.capacity * COUNTER_ID_SIZE
+        atexit.register(self.flush)
+
+    def _open(self, name: str, slots: int):
+        size = COUNTERS_HEADER.size + slots * (COUNTER_ID_SIZE + 8 * len(self.fields))
+        try:
+            shm = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            COUNTERS_HEADER.pack_into(shm.buf, 0, COUNTERS_MAGIC, slots, 0, 0, time.time())
+        if os.name == 'posix':
+            # The segment outlives any one worker (and a restart, keeping its
+            # pending counts); don't let the resource tracker unlink it
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        if bytes(shm.buf[:8]) != COUNTERS_MAGIC:
+            shm.close()
+            raise StoreError(f"Shared memory segment {name} is not a counter table")
+        return shm
+
+    def _locked(self):
+        return _Locked(self._local, self._lock_file)
+
+    def _header(self):
+        return COUNTERS_HEADER.unpack_from(self.shm.buf, 0)
+
+    def _sync_slots(self, used: int, generation: int):
+        """Bring the local id cache up to date with slots added by other workers"""
+        if generation != self._generation:
+            self._slot_ids, self._slot_index, self._generation = [], {}, generation
+        for slot in range(len(self._slot_ids), used):
+            off = self._ids_off + slot * COUNTER_ID_SIZE
+            app_id = bytes(self.shm.buf[off:off + COUNTER_ID_SIZE]).rstrip(b'\x00').decode('utf-8')
+            self._slot_index[app_id] = slot
+            self._slot_ids.append(app_id)
+
+    def _count_offset(self, slot: int, field: str) -> int:
+        return self._counts_off + (slot * len(self.fields) + self.fields.index(field)) * 8
+
+    def add(self, app_id: str, field: str, amount: int = 1) -> bool:
+        """Count an event; False when the id doesn't fit or the table is full"""
+        key = app_id.encode('utf-8')
+        if field not in self.fields or not key or len(key) > COUNTER_ID_SIZE:
+            return False
+        flush_due = False
+        with self._locked():
+            magic, capacity, used, generation, last_flush = self._header()
+            self._sync_slots(used, generation)
+            slot = self._slot_index.get(app_id)
+            if slot is None:
+                if used >= capacity:
+                    return False
+                slot = used
+                off = self._ids_off + slot * COUNTER_ID_SIZE
+                self.shm.buf[off:off + COUNTER_ID_SIZE] = key.ljust(COUNTER_ID_SIZE, b'\x00')
+                used += 1
+                self._sync_slots(used, generation)
+            off = self._count_offset(slot, field)
+            struct.pack_into('<q', self.shm.buf, off, struct.unpack_from('<q', self.shm.buf, off)[0] + amount)
+            now = time.time()
+            if self.apply is not None and now - last_flush >= self.flush_seconds:
+                last_flush, flush_due = now, True  # this worker flushes for everyone
+            COUNTERS_HEADER.pack_into(self.shm.buf, 0, magic, capacity, used, generation, last_flush)
+        if flush_due:
+            self.flush()
+        return True
+
+    def pending(self) -> dict:
+        """{app_id: {field: pending increment}} for every app with pending counts"""
+        if not self._header()[2]:
+            return {}
+        with self._local:
+            return self._read_pending()
+
+    def _read_pending(self) -> dict:
+        _, _, used, generation, _ = self._header()
+        self._sync_slots(used, generation)
+        slot_ids = self._slot_ids
+        width = len(self.fields)
+        counts = self.shm.buf[self._counts_off:self._counts_off + used * width * 8].cast('q').tolist()
+        result = {}
+        for slot in range(min(used, len(slot_ids))):
+            row = counts[slot * width:(slot + 1) * width]
+            if any(row):
+                result[slot_ids[slot]] = {f: n for f, n in zip(self.fields, row) if n}
+        return result
+
+    def flush(self):
+        """
+        Hand the pending increments to ``apply`` and, once it returns,
+        subtract exactly those from the table. If ``apply`` fails they stay
+        pending for the next flush; if the process dies before subtracting,
+        the next flush writes them again (counted twice rather than lost).
+        """
+        if self.apply is None:
+            return
+        with self._flush_lock:
+            with self._locked():
+                deltas = self._read_pending()
+            if deltas:
+                try:
+                    self.apply(deltas)
+                except Exception:
+                    if self.logger:
+                        self.logger.exception("Failed to write shared counters")
+                    return
+            with self._locked():
+                self._subtract(deltas)
+
+    def _subtract(self, deltas: dict):
+        """Take written increments off their slots (the slots can't move: only a flush recycles them)"""
+        magic, capacity, used, generation, _ = self._header()
+        self._sync_slots(used, generation)
+        for app_id, row in deltas.items():
+            slot = self._slot_index[app_id]
+            for field, n in row.items():
+                off = self._count_offset(slot, field)
+                struct.pack_into('<q', self.shm.buf, off, struct.unpack_from('<q', self.shm.buf, off)[0] - n)
+        counts = self.shm.buf[self._counts_off:self._counts_off + used * len(self.fields) * 8]
+        if used >= capacity * RESET_FILL_RATIO and not any(counts):
+            # Nothing is pending: start handing out slots from zero again
+            used, generation = 0, generation + 1
+        counts.release()
+        COUNTERS_HEADER.pack_into(self.shm.buf, 0, magic, capacity, used, generation, time.time())
+
+
+class _Locked:
+    """Thread lock plus cross-process file lock"""
+
+    def __init__(self, local, lock_file):
+        self.local = local
+        self.lock_file = lock_file
+
+    def __enter__(self):
+        self.local.acquire()
+        try:
+            self.lock_file.acquire()
+        except BaseException:
+            self.local.release()
+            raise
+
+    def __exit__(self, *exc):
+        try:
+            self.lock_file.release()
+        finally:
+            self.local.release()
+
+
+def add_pending(records: list, pending: dict) -> list:
+    """Add pending counter increments onto app records (in place)"""
+    if pending:
+        for record in records:
+            row = pending.get(record.get('id'))
+            if row:
+                for field, n in row.items():
+                    record[field] = record.get(field, 0) + n
+    return records
@@ -0,0 +1,608 @@
+"""
+Binary Store Snapshots
+Compact on-disk format for the dict-shaped stores (users, activities,
+analytics) with a lazy startup path: opening a snapshot maps the file and
+reads its record index without parsing anything, and a record is decoded
+the first time it is used. A store can be bounded to a working set
+of recently used records (see RecordMap), so memory follows the active
+users rather than the registered ones.
+Saving re-encodes the records that were used (they may have been changed in
+place) and copies every other record byte for byte.
+
+The JSON files stay the import/export format, but the app no longer writes
+them: back up data/*.snap (files are replaced atomically, so a copy is always
+complete) or export first. A JSON file that changed outside the app
+(generate_data.py, a deploy) is imported on the next start, unless the
+snapshot has newer changes of its own; with the app stopped:
+
+    python snapshot_store.py export     # write users.json etc. from the snapshots
+    python snapshot_store.py import     # rebuild the snapshots from the JSON files
+    python snapshot_store.py info
+
+Layout (little endian):
+
+    header   magic, record count, string table / index / lookup offsets,
+             synced flag, version (ino, mtime_ns, size) of the JSON file it
+             was last imported from or exported to
+    records  u32 length, u16 key length, key (utf-8), encoded value
+    strings  u32 count, then u32 length + utf-8 bytes per string
+    index    u64 offset of every record
+    lookup   the indexed fields (e.g. username) of every record, so finding
+             a user by name doesn't decode every user
+
+Values are tagged: null, booleans, int64 (bigger ints as text), float64,
+strings, lists, and objects whose keys are numbers into the string table, so
+a key like "downloads_history" is stored once per file instead of once per
+record.
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+from json_store import StoreCorruptError, atomic_file, atomic_write_json
+
+MAGIC = b'ISSNAPv1'
+HEADER = struct.Struct('<8sIQQQ?7xQqQ')
+RECORD = struct.Struct('<IH')  # length of everything after this field, key length
+_U16 = struct.Struct('<H')
+_U32 = struct.Struct('<I')
+_I64 = struct.Struct('<q')
+_F64 = struct.Struct('<d')
+
+T_NULL, T_FALSE, T_TRUE, T_INT, T_BIGINT, T_FLOAT, T_STR, T_LIST, T_OBJECT = range(9)
+
+# JSON file -> snapshot name (stored as data/<name>.snap)
+STORE_FILES = {
+    'users': 'users.json',
+    'activities': 'activities.json',
+    'analytics': 'analytics.json',
+}
+INDEXED_FIELDS = {'users': ('username',)}
+
+
+class StringTable:
+    """Strings numbered in order of first use; ids never change once handed out"""
+
+    def __init__(self, strings=()):
+        self.strings = list(strings)
+        self.ids = {s: i for i, s in enumerate(self.strings)}
+
+    def id(self, s: str) -> int:
+        i = self.ids.get(s)
+        if i is None:
+            i = self.ids[s] = len(self.strings)
+            self.strings.append(s)
+        return i
+
+    def encode(self) -> bytes:
+        out = bytearray(_U32.pack(len(self.strings)))
+        for s in self.strings:
+            b = s.encode('utf-8')
+            out += _U32.pack(len(b))
+            out += b
+        return bytes(out)
+
+    @classmethod
+    def decode(cls, buf, pos: int) -> 'StringTable':
+        count = _U32.unpack_from(buf, pos)[0]
+        pos += 4
+        strings = []
+        for _ in range(count):
+            n = _U32.unpack_from(buf, pos)[0]
+            strings.append(str(buf[pos + 4:pos + 4 + n], 'utf-8'))
+            pos += 4 + n
+        return cls(strings)
+
+
+def encode_value(value, out: bytearray, table: StringTable):
+    if isinstance(value, str):
+        b = value.encode('utf-8')
+        out.append(T_STR)
+        out += _U32.pack(len(b))
+        out += b
+    elif isinstance(value, dict):
+        out.append(T_OBJECT)
+        out += _U32.pack(len(value))
+        for k, v in value.items():
+            out += _U32.pack(table.id(k if isinstance(k, str) else json.dumps(k)))
+            encode_value(v, out, table)
+    elif value is None:
+        out.append(T_NULL)
+    elif value is True:
+        out.append(T_TRUE)
+    elif value is False:
+        out.append(T_FALSE)
+    elif isinstance(value, int):
+        if -2 ** 63 <= value < 2 ** 63:
+            out.append(T_INT)
+            out += _I64.pack(value)
+        else:
+            b = str(value).encode('ascii')
+            out.append(T_BIGINT)
+            out += _U32.pack(len(b))
+            out += b
+    elif isinstance(value, float):
+        out.append(T_FLOAT)
+        out += _F64.pack(value)
+    elif isinstance(value, (list, tuple)):
+        out.append(T_LIST)
+        out += _U32.pack(len(value))
+        for item in value:
+            encode_value(item, out, table)
+    else:
+        raise TypeError(f"Object of type {type(value).__name__} can't be stored in a snapshot")
+
+
+def decode_value(buf, pos: int, strings: list):
+    """Decode the value at ``pos``; returns (value, position after it)"""
+    tag = buf[pos]
+    pos += 1
+    if tag == T_STR:
+        n = _U32.unpack_from(buf, pos)[0]
+        return str(buf[pos + 4:pos + 4 + n], 'utf-8'), pos + 4 + n
+    if tag == T_OBJECT:
+        n = _U32.unpack_from(buf, pos)[0]
+        pos += 4
+        obj = {}
+        for _ in range(n):
+            key = strings[_U32.unpack_from(buf, pos)[0]]
+            obj[key], pos = decode_value(buf, pos + 4, strings)
+        return obj, pos
+    if tag == T_INT:
+        return _I64.unpack_from(buf, pos)[0], pos + 8
+    if tag == T_LIST:
+        n = _U32.unpack_from(buf, pos)[0]
+        pos += 4
+        items = []
+        for _ in range(n):
+            item, pos = decode_value(buf, pos, strings)
+            items.append(item)
+        return items, pos
+    if tag == T_NULL:
+        return None, pos
+    if tag == T_TRUE:
+        return True, pos
+    if tag == T_FALSE:
+        return False, pos
+    if tag == T_FLOAT:
+        return _F64.unpack_from(buf, pos)[0], pos + 8
+    if tag == T_BIGINT:
+        n = _U32.unpack_from(buf, pos)[0]
+        return int(buf[pos + 4:pos + 4 + n]), pos + 4 + n
+    raise StoreCorruptError(f"Unknown value tag {tag} at offset {pos - 1}")
+
+
+def _lookup_value(record, field: str) -> str:
+    value = record.get(field) if isinstance(record, dict) else None
+    return value if isinstance(value, str) else ''
+
+
+class _Writer:
+    """Builds a snapshot file in memory, record by record"""
+
+    def __init__(self, strings=(), fields=()):
+        self.table = StringTable(strings)
+        self.fields = tuple(fields)
+        self.out = bytearray(HEADER.size)
+        self.offsets = []
+        self.lookup = bytearray()
+        self.rows_off = None
+
+    def add(self, key: str, value):
+        start = len(self.out)
+        self.offsets.append(start)
+        key_bytes = key.encode('utf-8')
+        self.out += bytes(RECORD.size)
+        self.out += key_bytes
+        encode_value(value, self.out, self.table)
+        RECORD.pack_into(self.out, start, len(self.out) - start - 4, len(key_bytes))
+        self._add_lookup([_lookup_value(value, field) for field in self.fields])
+
+    def add_raw(self, raw: bytes, lookup_values: list):
+        """Copy an already encoded record (strings must come from the same table)"""
+        self.offsets.append(len(self.out))
+        self.out += raw
+        self._add_lookup(lookup_values)
+
+    def _add_lookup(self, values):
+        for value in values:
+            b = value.encode('utf-8')[:0xFFFF]
+            self.lookup += _U16.pack(len(b))
+            self.lookup += b
+
+    def write(self, path: str, json_version=None, synced: bool = False) -> int:
+        strings_off = len(self.out)
+        self.out += self.table.encode()
+        index_off = len(self.out)
+        self.out += struct.pack(f'<{len(self.offsets)}Q', *self.offsets)
+        lookup_off = len(self.out)
+        encode_value(list(self.fields), self.out, self.table)  # field names, then one row per record
+        self.rows_off = len(self.out)
+        self.out += self.lookup
+        ino, mtime_ns, size = json_version or (0, 0, 0)
+        HEADER.pack_into(self.out, 0, MAGIC, len(self.offsets), strings_off, index_off, lookup_off,
+                         synced, ino, mtime_ns, size)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with atomic_file(path, 'wb') as f:
+            f.write(self.out)
+        return len(self.out)
+
+
+def _file_version(path: str):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _map(path: str, data=None):
+    """
+    The contents of a snapshot file, memory-mapped so that only the pages in
+    use count against the process. Windows can't replace a file that is
+    mapped, so there it's read (or ``data``, what was just written, is used).
+    """
+    if sys.platform == 'win32':
+        if data is not None:
+            return data
+        with open(path, 'rb') as f:
+            return f.read()
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def read_header(path: str):
+    """(count, synced, json_version) of a snapshot file, None if there is none"""
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read(HEADER.size)
+    except FileNotFoundError:
+        return None
+    if len(raw) < HEADER.size or raw[:8] != MAGIC:
+        raise StoreCorruptError(f"{path} is not a store snapshot")
+    _, count, _, _, _, synced, ino, mtime_ns, size = HEADER.unpack(raw)
+    return count, synced, (ino, mtime_ns, size)
+
+
+class RecordMap(MutableMapping):
+    """
+    A dict-like store backed by a snapshot file. Records are decoded on first
+    access and kept; changes stay in memory until save(). ``default_factory``
+    works like defaultdict's (but get() never inserts); ``wrap`` converts a
+    decoded record (e.g. into a defaultdict).
+
+    With ``max_loaded`` the decoded records form an LRU working set: past that
+    many, the least recently used ones are dropped again, except those used in
+    the last ``evict_after`` seconds (a request may still hold them). A record
+    that was changed in place is re-encoded when it is dropped and kept in that
+    compact form until the next save().
+    """
+
+    def __init__(self, path: str, default_factory=None, wrap=None, indexed_fields=(),
+                 max_loaded=None, evict_after=60.0):
+        self.path = os.path.abspath(path)
+        self.default_factory = default_factory
+        self.wrap = wrap
+        self.indexed_fields = tuple(indexed_fields)
+        self.max_loaded = max_loaded
+        self.evict_after = evict_after
+        self._lock = threading.RLock()
+        self._keys = {}     # key -> record offset in the mapped file, None if never saved
+        self._values = OrderedDict()  # records decoded or assigned, least recently used first
+        self._used = {}     # key -> time.monotonic() of the last access (bounded stores only)
+        self._pending = {}  # key -> (encoded record, lookup row) of changed records dropped before a save
+        self._buf = None
+        self._strings = StringTable()
+        self._lookup = None  # {field: {value: [keys]}} built on the first find()
+        self._rows_off = None
+        self._file_fields = ()
+        self._file_order = []  # keys in the order of the mapped file
+        self.json_version = None
+        self.synced = False
+        if os.path.exists(self.path):
+            self._open()
+
+    # ----- file access -----
+
+    def _open(self):
+        # No parsing; records are decoded from the mapped file on use
+        buf = _map(self.path)
+        if len(buf) < HEADER.size or buf[:8] != MAGIC:
+            raise StoreCorruptError(f"{self.path} is not a store snapshot")
+        (_, count, strings_off, index_off, lookup_off, self.synced,
+         ino, mtime_ns, size) = HEADER.unpack_from(buf, 0)
+        self.json_version = (ino, mtime_ns, size)
+        self._strings = StringTable.decode(buf, strings_off)
+        keys = {}
+        for off in struct.unpack_from(f'<{count}Q', buf, index_off):
+            _, key_len = RECORD.unpack_from(buf, off)
+            keys[str(buf[off + RECORD.size:off + RECORD.size + key_len], 'utf-8')] = off
+        self._keys = keys
+        self._file_order = list(keys)
+        fields, self._rows_off = decode_value(buf, lookup_off, self._strings.strings)
+        self._file_fields = tuple(fields)
+        self._buf = buf
+
+    def _swap(self, keys: list, writer: '_Writer'):
+        """Switch to the file just written without parsing it again"""
+        old, self._buf = self._buf, _map(self.path, writer.out)
+        self._keys = dict(zip(keys, writer.offsets))
+        self._file_order = keys
+        self._strings = writer.table
+        self._file_fields, self._rows_off = writer.fields, writer.rows_off
+        if isinstance(old, mmap.mmap):
+            old.close()
+
+    def _decode(self, key):
+        pending = self._pending.get(key)
+        buf, off = (pending[0], 0) if pending is not None else (self._buf, self._keys[key])
+        _, key_len = RECORD.unpack_from(buf, off)
+        value, _ = decode_value(buf, off + RECORD.size + key_len, self._strings.strings)
+        return self.wrap(value) if self.wrap else value
+
+    def _raw(self, key) -> bytes:
+        off = self._keys[key]
+        return self._buf[off:off + 4 + _U32.unpack_from(self._buf, off)[0]]
+
+    def _file_lookup(self) -> dict:
+        """key -> indexed field values, for every record in the mapped file"""
+        width = len(self._file_fields)
+        rows, pos = {}, self._rows_off
+        for key in self._file_order:
+            row = []
+            for _ in range(width):
+                n = _U16.unpack_from(self._buf, pos)[0]
+                row.append(str(self._buf[pos + 2:pos + 2 + n], 'utf-8'))
+                pos += 2 + n
+            rows[key] = row
+        return rows
+
+    # ----- working set -----
+
+    def _touch(self, key):
+        if self.max_loaded is not None:
+            self._values.move_to_end(key)
+            self._used[key] = time.monotonic()
+
+    def _evict(self):
+        if self.max_loaded is None:
+            return
+        now = time.monotonic()
+        while len(self._values) > self.max_loaded:
+            key = next(iter(self._values))
+            if now - self._used.get(key, 0) < self.evict_after:
+                break  # everything after it was used even more recently
+            self._stash(key, self._values.pop(key))
+            self._used.pop(key, None)
+
+    def _stash(self, key, value):
+        """Drop a decoded record, keeping its encoded form if it differs from the file"""
+        key_bytes = key.encode('utf-8')
+        out = bytearray(RECORD.size)
+        out += key_bytes
+        encode_value(value, out, self._strings)
+        RECORD.pack_into(out, 0, len(out) - 4, len(key_bytes))
+        if self._keys.get(key) is not None and self._raw(key) == out:
+            return
+        self._pending[key] = (bytes(out), [_lookup_value(value, f) for f in self.indexed_fields])
+
+    # ----- mapping interface -----
+
+    def __getitem__(self, key):
+        if self.max_loaded is None:
+            try:
+                return self._values[key]
+            except KeyError:
+                pass
+        with self._lock:
+            if key in self._values:
+                self._touch(key)
+                return self._values[key]
+            if key not in self._keys:
+                if self.default_factory is None:
+                    raise KeyError(key)
+                value = self[key] = self.default_factory()
+                return value
+            value = self._values[key] = self._decode(key)
+            self._pending.pop(key, None)
+            self._touch(key)
+            self._evict()
+            return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._keys.setdefault(key, None)
+            self._pending.pop(key, None)
+            self._values[key] = value
+            self._touch(key)
+            self._evict()
+
+    def __delitem__(self, key):
+        with self._lock:
+            del self._keys[key]
+            self._values.pop(key, None)
+            self._used.pop(key, None)
+            self._pending.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __iter__(self):
+        return iter(list(self._keys))
+
+    def __len__(self):
+        return len(self._keys)
+
+    def get(self, key, default=None):
+        return self[key] if key in self._keys else default
+
+    def scan(self):
+        """
+        (key, record) for every record, without adding them to the working set;
+        for read-only passes over the whole store (changes may be lost).
+        """
+        for key in list(self._keys):
+            with self._lock:
+                if key in self._values:
+                    value = self._values[key]
+                elif key in self._keys:
+                    value = self._decode(key)
+                else:
+                    continue  # deleted meanwhile
+            yield key, value
+
+    def loaded(self) -> dict:
+        """The records decoded so far (what this store costs in memory)"""
+        return self._values
+
+    def find(self, field: str, value: str):
+        """Key of the first record whose ``field`` equals ``value`` (None if there is none)"""
+        with self._lock:
+            if field not in self._file_fields:
+                return next((k for k, record in self.scan() if record.get(field) == value), None)
+            if self._lookup is None:
+                self._lookup = {f: {} for f in self._file_fields}
+                for key, row in self._file_lookup().items():
+                    for f, v in zip(self._file_fields, row):
+                        self._lookup[f].setdefault(v, []).append(key)
+            # Decoded records may have been changed in place, so check them directly
+            for key, record in self._values.items():
+                if record.get(field) == value:
+                    return key
+            for key, (_, row) in self._pending.items():
+                if field in self.indexed_fields:
+                    if row[self.indexed_fields.index(field)] == value:
+                        return key
+                elif self._decode(key).get(field) == value:
+                    return key
+            return next((k for k in self._lookup[field].get(value, ())
+                         if k in self._keys and k not in self._values and k not in self._pending), None)
+
+    # ----- persistence -----
+
+    def save(self, json_version=None, synced=False) -> int:
+        """Write the snapshot; returns its size in bytes"""
+        with self._lock:
+            writer = _Writer(self._strings.strings, self.indexed_fields)
+            reuse_lookup = self._file_fields == self.indexed_fields
+            file_lookup = self._file_lookup() if reuse_lookup else {}
+            keys = list(self._keys)
+            for key in keys:
+                if key in self._values:
+                    writer.add(key, self._values[key])
+                elif key in self._pending:
+                    writer.add_raw(*self._pending[key])
+                elif reuse_lookup:
+                    writer.add_raw(self._raw(key), file_lookup[key])
+                else:
+                    writer.add(key, self._decode(key))  # index fields changed: re-encode
+            nbytes = writer.write(self.path, json_version or self.json_version, synced)
+            self.json_version = json_version or self.json_version
+            self.synced = synced
+            self._lookup = None
+            self._pending.clear()
+            self._swap(keys, writer)
+            self._evict()
+            return nbytes
+
+    def export_json(self, json_path: str, **dump_kwargs) -> int:
+        """Write the store as JSON and mark the snapshot as in sync with it"""
+        with self._lock:
+            nbytes = atomic_write_json(json_path, dict(self.scan()), **dump_kwargs)
+            self.save(json_version=_file_version(json_path), synced=True)
+            return nbytes
+
+
+def import_json(json_path: str, snapshot_path: str, indexed_fields=()) -> int:
+    """Build a snapshot from a JSON object file (one record per top-level key)"""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        json_version = _file_version(json_path)
+        raw = f.read()
+    try:
+        data = json.loads(raw) if raw.strip() else {}
+    except json.JSONDecodeError as e:
+        raise StoreCorruptError(f"{json_path} is not valid JSON: {e}") from e
+    writer = _Writer(fields=indexed_fields)
+    for key, value in data.items():
+        writer.add(key, value)
+    return writer.write(snapshot_path, json_version, synced=True)
+
+
+def open_store(json_path: str, snapshot_path: str, logger=None, **kwargs) -> RecordMap:
+    """
+    Open the snapshot of a JSON store, importing the JSON file first when it
+    changed since the snapshot was last in sync with it.
+    """
+    json_version = _file_version(json_path)
+    try:
+        header = read_header(snapshot_path)
+    except StoreCorruptError:
+        if json_version is None:
+            raise
+        if logger:
+            logger.warning("%s is damaged, rebuilding it from %s", snapshot_path, json_path)
+        header = None
+    if json_version is not None and (header is None or header[2] != json_version):
+        if header is None or header[1]:
+            import_json(json_path, snapshot_path, kwargs.get('indexed_fields', ()))
+        elif logger:
+            logger.warning("%s changed, but %s has newer changes made by the app; keeping the snapshot "
+                           "(python snapshot_store.py import replaces it)", json_path, snapshot_path)
+    return RecordMap(snapshot_path, **kwargs)
+
+
+def snapshot_path(project_dir: str, name: str) -> str:
+    return os.path.join(project_dir, 'data', f"{name}.snap")
+
+
+def export_snapshots(project_dir: str):
+    """Write every store's JSON file from its snapshot (stop the app first: this rewrites the snapshots)"""
+    for name, filename in STORE_FILES.items():
+        snap = snapshot_path(project_dir, name)
+        if not os.path.exists(snap):
+            print(f"⚠️ {os.path.relpath(snap, project_dir)} not found, skipping")
+            continue
+        store = RecordMap(snap, indexed_fields=INDEXED_FIELDS.get(name, ()))
+        nbytes = store.export_json(os.path.join(project_dir, filename), indent=2)
+        print(f"📤 {os.path.relpath(snap, project_dir)} -> {filename} ({nbytes / 1024:.1f} KB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert the store snapshots from/to JSON (stop the app first)')
+    parser.add_argument('command', choices=['export', 'import', 'info'])
+    parser.add_argument('--dir', default=os.path.dirname(os.path.abspath(__file__)),
+                        help='project directory holding the JSON files')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        export_snapshots(args.dir)
+        return
+    for name, filename in STORE_FILES.items():
+        json_path = os.path.join(args.dir, filename)
+        snap = snapshot_path(args.dir, name)
+        if args.command == 'import':
+            if not os.path.exists(json_path):
+                print(f"⚠️ {filename} not found, skipping")
+                continue
+            nbytes = import_json(json_path, snap, INDEXED_FIELDS.get(name, ()))
+            print(f"📥 {filename} -> {os.path.relpath(snap, args.dir)} ({nbytes / 1024:.1f} KB)")
+        else:
+            header = read_header(snap)
+            if header is None:
+                print(f"{name:12} no snapshot")
+                continue
+            count, synced, _ = header
+            state = 'in sync with JSON' if synced else 'has changes not exported to JSON'
+            print(f"{name:12} {count:8} records  {os.path.getsize(snap) / 1024:10.1f} KB  {state}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,225 @@
+"""
+Social Graph
+Who follows whom, for the web app and the store manager CLI alike, kept in
+the ``follows`` table of data/social.db instead of followers/following lists
+inside every user record:
+
+- Follow checks are primary-key lookups, and "which of these N users do I
+  follow" is one indexed query instead of N list scans.
+- Follower and following counts are kept in ``follow_counts`` and updated in
+  the same transaction as the edge, so a profile never counts a list.
+- Listings are paged newest first with a cursor (the edge's rowid), so an
+  account with a million followers costs the same per page as one with ten.
+
+SQLite in WAL mode lets every gunicorn worker and the CLI read while one of
+them writes; each thread (and each forked process) gets its own connection.
+Recent changes live in the -wal file next to the database, so copy it with
+backup_database(), not as a plain file, while the app runs.
+"""
+
+import os
+import sqlite3
+import threading
+
+SCHEMA_VERSION = 1
+BUSY_TIMEOUT_SECONDS = 10
+MAX_PAGE_SIZE = 200
+_IN_CHUNK = 500  # ids per IN (...) query, well under SQLite's variable limit
+
+
+def backup_database(path: str, target: str):
+    """Consistent copy of the SQLite database at ``path`` (with its WAL) to ``target``, safe while it is in use"""
+    os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+    source = sqlite3.connect(path, timeout=BUSY_TIMEOUT_SECONDS)
+    try:
+        copy = sqlite3.connect(target)
+        try:
+            source.backup(copy)
+        finally:
+            copy.close()
+    finally:
+        source.close()
+
+
+class SocialGraph:
+    """Follow edges with materialized counts in a SQLite database"""
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._migrate()
+
+    # ----- connections -----
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            # Never reuse a connection inherited from the parent process
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def transaction(self, work):
+        """Run ``work(conn)`` in one immediate transaction; returns its result"""
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = work(conn)
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return result
+
+    def _migrate(self):
+        def migrate(conn):
+            if conn.execute('PRAGMA user_version').fetchone()[0] >= SCHEMA_VERSION:
+                return
+            # Same table the store manager has always used (data/social.db)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS follows (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    follower_id TEXT,
+                    following_id TEXT,
+                    followed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(follower_id, following_id)
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_follows_follower ON follows (follower_id)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_follows_following ON follows (following_id)')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS follow_counts (
+                    user_id TEXT PRIMARY KEY,
+                    followers INTEGER NOT NULL DEFAULT 0,
+                    following INTEGER NOT NULL DEFAULT 0
+                ) WITHOUT ROWID
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS graph_imports (
+                    name TEXT PRIMARY KEY,
+                    imported_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            self._recount(conn)
+            conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+        self.transaction(migrate)
+
+    @staticmethod
+    def _recount(conn):
+        conn.execute('DELETE FROM follow_counts')
+        conn.execute('''
+            INSERT INTO follow_counts (user_id, followers, following)
+            SELECT user_id, SUM(followers), SUM(following) FROM (
+                SELECT following_id AS user_id, COUNT(*) AS followers, 0 AS following
+                FROM follows GROUP BY following_id
+                UNION ALL
+                SELECT follower_id, 0, COUNT(*) FROM follows GROUP BY follower_id
+            ) GROUP BY user_id
+        ''')
+
+    @staticmethod
+    def _bump(conn, follower_id: str, following_id: str, delta: int):
+        conn.execute('''
+            INSERT INTO follow_counts (user_id, followers) VALUES (?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET followers = followers + excluded.followers
+        ''', (following_id, delta))
+        conn.execute('''
+            INSERT INTO follow_counts (user_id, following) VALUES (?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET following = following + excluded.following
+        ''', (follower_id, delta))
+
+    # ----- changes -----
+
+    def follow(self, follower_id: str, following_id: str) -> bool:
+        """Add the edge; False if it already existed"""
+        def work(conn):
+            cursor = conn.execute('INSERT OR IGNORE INTO follows (follower_id, following_id) VALUES (?, ?)',
+                                  (follower_id, following_id))
+            if cursor.rowcount == 0:
+                return False
+            self._bump(conn, follower_id, following_id, 1)
+            return True
+
+        return self.transaction(work)
+
+    def unfollow(self, follower_id: str, following_id: str) -> bool:
+        """Remove the edge; False if there was none"""
+        def work(conn):
+            cursor = conn.execute('DELETE FROM follows WHERE follower_id = ? AND following_id = ?',
+                                  (follower_id, following_id))
+            if cursor.rowcount == 0:
+                return False
+            self._bump(conn, follower_id, following_id, -1)
+            return True
+
+        return self.transaction(work)
+
+    def import_once(self, name: str, edges) -> int:
+        """
+        Add the (follower_id, following_id) pairs from ``edges`` unless an
+        import called ``name`` already ran; returns the number of new edges.
+        Only the first of several processes starting at once imports.
+        """
+        def work(conn):
+            if conn.execute('SELECT 1 FROM graph_imports WHERE name = ?', (name,)).fetchone():
+                return 0
+            before = conn.total_changes
+            conn.executemany('INSERT OR IGNORE INTO follows (follower_id, following_id) VALUES (?, ?)',
+                             ((a, b) for a, b in edges if a != b))
+            added = conn.total_changes - before
+            if added:
+                self._recount(conn)
+            conn.execute('INSERT INTO graph_imports (name) VALUES (?)', (name,))
+            return added
+
+        return self.transaction(work)
+
+    # ----- queries -----
+
+    def is_following(self, follower_id: str, following_id: str) -> bool:
+        return self.connection().execute('SELECT 1 FROM follows WHERE follower_id = ? AND following_id = ?',
+                                         (follower_id, following_id)).fetchone() is not None
+
+    def following_among(self, follower_id: str, user_ids) -> set:
+        """The subset of ``user_ids`` that ``follower_id`` follows"""
+        user_ids = list(dict.fromkeys(user_ids))
+        conn, found = self.connection(), set()
+        for i in range(0, len(user_ids), _IN_CHUNK):
+            chunk = user_ids[i:i + _IN_CHUNK]
+            found.update(row[0] for row in conn.execute(
+                f'SELECT following_id FROM follows WHERE follower_id = ? '
+                f'AND following_id IN ({",".join("?" * len(chunk))})', (follower_id, *chunk)))
+        return found
+
+    def edges(self):
+        """Every (follower_id, following_id) pair, oldest first"""
+        return self.connection().execute('SELECT follower_id, following_id FROM follows ORDER BY id')
+
+    def counts(self, user_id: str) -> dict:
+        row = self.connection().execute('SELECT followers, following FROM follow_counts WHERE user_id = ?',
+                                        (user_id,)).fetchone()
+        return {'followers': row[0], 'following': row[1]} if row else {'followers': 0, 'following': 0}
+
+    def followers(self, user_id: str, limit: int = 50, cursor=None):
+        """One page of the users following ``user_id``, newest first; returns (page, next cursor)"""
+        return self._page('follower_id', 'following_id', user_id, limit, cursor)
+
+    def following(self, user_id: str, limit: int = 50, cursor=None):
+        """One page of the users ``user_id`` follows, newest first; returns (page, next cursor)"""
+        return self._page('following_id', 'follower_id', user_id, limit, cursor)
+
+    def _page(self, column: str, by: str, user_id: str, limit: int, cursor):
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        before = int(cursor) if cursor else None
+        rows = self.connection().execute(
+            f'SELECT id, {column}, followed_at FROM follows WHERE {by} = ? '
+            f'{"AND id < ? " if before is not None else ""}ORDER BY id DESC LIMIT ?',
+            (user_id, before, limit + 1) if before is not None else (user_id, limit + 1)).fetchall()
+        page = [{'user_id': row[1], 'followed_at': row[2]} for row in rows[:limit]]
+        next_cursor = str(rows[limit - 1][0]) if len(rows) > limit else None
+        return page, next_cursor
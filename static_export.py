@@ -0,0 +1,255 @@
+"""
+Static Site Export
+Renders the public read path (home page, every category, every app detail page
+and the Premium Unlocked page) to plain HTML plus JSON, so nginx or any static
+host / CDN can serve the storefront without Python in the loop.
+
+After the first full export, every save_apps() call regenerates only the pages
+affected by the apps that changed since the last export.
+
+Usage:
+    python static_export.py            # full export to exports/site
+    python static_export.py --changed  # only pages affected by catalog changes
+"""
+
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime
+from urllib.parse import quote, unquote
+
+from werkzeug.exceptions import HTTPException
+
+from fragment_cache import app_revision
+from search_text import public_app
+
+SITE_DIR = os.path.join('exports', 'site')  # relative to the project
+STATE_FILE = '.export_state.json'
+PREMIUM_CATEGORY = 'Premium Unlocked'
+# The similar-apps strip shows the first 4 other apps of a category, so a
+# detail page depends on the first 5 apps of its category
+SIMILAR_DEPENDENCY_DEPTH = 5
+DEBOUNCE_SECONDS = 2
+
+
+def _category_key(name: str) -> str:
+    return (name or '').lower()
+
+
+def export_enabled(output_dir: str) -> bool:
+    """Incremental exports only run once a full export has been made"""
+    return os.path.exists(os.path.join(output_dir, STATE_FILE))
+
+
+class StaticExporter:
+    """Renders storefront pages through the Flask app into a static directory"""
+
+    def __init__(self, flask_app, output_dir: str, load_apps, index_view, category_view, detail_view):
+        self.app = flask_app
+        self.output_dir = output_dir
+        self.load_apps = load_apps
+        # Undecorated views, so exports bypass the page cache and view counting
+        self.index_view = getattr(index_view, '__wrapped__', index_view)
+        self.category_view = getattr(category_view, '__wrapped__', category_view)
+        self.detail_view = getattr(detail_view, '__wrapped__', detail_view)
+        self._lock = threading.Lock()
+        self._timer_lock = threading.Lock()
+        self._timer = None
+        self._dirty = False  # a save came in after the scheduled export started
+
+    @property
+    def enabled(self) -> bool:
+        return export_enabled(self.output_dir)
+
+    # ----- writing -----
+
+    def _write(self, rel_path: str, data: bytes):
+        target = os.path.join(self.output_dir, *rel_path.split('/'))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f"{target}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, target)
+
+    def _write_json(self, rel_path: str, payload):
+        self._write(rel_path, json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+
+    def _render(self, url_path: str, view, *args) -> bool:
+        """Render one URL to <url_path>/index.html; returns False if the page 404s"""
+        with self.app.test_request_context(url_path):
+            try:
+                response = self.app.make_response(view(*args))
+            except HTTPException:
+                return False
+        if response.status_code != 200:
+            return False
+        # Files live at the decoded path, which is what static servers look up
+        self._write(f"{unquote(url_path).strip('/')}/index.html".lstrip('/'), response.get_data())
+        return True
+
+    def _remove(self, rel_dir: str):
+        shutil.rmtree(os.path.join(self.output_dir, *rel_dir.split('/')), ignore_errors=True)
+
+    # ----- page sets -----
+
+    @staticmethod
+    def _categories(apps) -> dict:
+        """category key -> (display name, ordered app ids)"""
+        categories = {}
+        for app_item in apps:
+            name = app_item.get('category', '')
+            categories.setdefault(_category_key(name), (name, []))[1].append(app_item['id'])
+        return categories
+
+    def _export_index(self, apps):
+        self._render('/', self.index_view)
+        self._write_json('apps_data.json', [public_app(a) for a in apps])
+        self._write_json('api/categories.json', sorted({a.get('category', '') for a in apps if a.get('category')}))
+
+    def _export_category(self, name: str):
+        self._render(f"/category/{quote(name)}", self.category_view, name)
+
+    def _export_app(self, app_item: dict):
+        app_id = app_item['id']
+        if self._render(f"/app/{quote(app_id)}", self.detail_view, app_id):
+            self._write_json(f"api/apps/{app_id}.json", public_app(app_item))
+
+    def _save_state(self, apps):
+        state = {
+            'generated_at': datetime.now().isoformat(),
+            'apps': {a['id']: [app_revision(a), _category_key(a.get('category'))] for a in apps},
+            'categories': {key: name for key, (name, _) in self._categories(apps).items()},
+        }
+        self._write(STATE_FILE, json.dumps(state).encode('utf-8'))
+
+    def _load_state(self) -> dict:
+        try:
+            with open(os.path.join(self.output_dir, STATE_FILE), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    # ----- public API -----
+
+    def export_all(self, apps=None) -> int:
+        """Render every public page; returns the number of app pages written"""
+        with self._lock:
+            apps = self.load_apps() if apps is None else apps
+            os.makedirs(self.output_dir, exist_ok=True)
+            self._export_index(apps)
+            names = {name for name, _ in self._categories(apps).values()}
+            names.add(PREMIUM_CATEGORY)
+            for name in names:
+                self._export_category(name)
+            for app_item in apps:
+                self._export_app(app_item)
+            self._save_state(apps)
+            return len(apps)
+
+    def export_changed(self, apps=None) -> list:
+        """Regenerate only the pages affected by apps changed since the last export"""
+        with self._lock:
+            apps = self.load_apps() if apps is None else apps
+            state = self._load_state()
+            previous = state.get('apps', {})
+            current = {a['id']: a for a in apps}
+
+            changed = {app_id for app_id, a in current.items()
+                       if previous.get(app_id, [None])[0] != app_revision(a)}
+            removed = set(previous) - set(current)
+            if not changed and not removed:
+                return []
+
+            # Categories touched by the change (old and new category of each app)
+            touched = {previous[i][1] for i in (changed | removed) if i in previous}
+            touched |= {_category_key(current[i].get('category')) for i in changed}
+
+            categories = self._categories(apps)
+            old_heads = {}
+            for app_id, (_, key) in previous.items():
+                old_heads.setdefault(key, []).append(app_id)
+
+            detail_pages = set(changed)
+            for key in touched:
+                ids = categories.get(key, ('', []))[1]
+                head = set(ids[:SIMILAR_DEPENDENCY_DEPTH]) | set(old_heads.get(key, [])[:SIMILAR_DEPENDENCY_DEPTH])
+                # Every page in the category shows these apps in its similar strip
+                if head & (changed | removed):
+                    detail_pages.update(ids)
+
+            regenerated = ['/']
+            self._export_index(apps)
+            previous_names = state.get('categories', {})
+            for key in touched:
+                if key in categories or key == _category_key(PREMIUM_CATEGORY):
+                    name = categories[key][0] if key in categories else PREMIUM_CATEGORY
+                    self._export_category(name)
+                    regenerated.append(f"/category/{name}")
+                elif key in previous_names:
+                    # The last app left this category
+                    self._remove(f"category/{previous_names[key]}")
+                    regenerated.append(f"-/category/{previous_names[key]}")
+            for app_id in detail_pages:
+                self._export_app(current[app_id])
+                regenerated.append(f"/app/{app_id}")
+            for app_id in removed:
+                self._remove(f"app/{app_id}")
+                try:
+                    os.remove(os.path.join(self.output_dir, 'api', 'apps', f"{app_id}.json"))
+                except OSError:
+                    pass
+                regenerated.append(f"-/app/{app_id}")
+
+            self._save_state(apps)
+            return regenerated
+
+    def schedule(self):
+        """Coalesce bursts of saves into one incremental export on a background thread"""
+        if not self.enabled:
+            return
+        with self._timer_lock:
+            if self._timer is not None:
+                # Waiting or exporting: the export may have loaded the apps already, so run once more after it
+                self._dirty = True
+                return
+            self._arm()
+
+    def _arm(self):
+        self._timer = threading.Timer(DEBOUNCE_SECONDS, self._run_scheduled)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _run_scheduled(self):
+        with self._timer_lock:
+            self._dirty = False  # saves made until now are in this export
+        try:
+            self.export_changed()
+        except Exception as e:
+            print(f"Static export failed: {e}", file=sys.stderr)
+        finally:
+            with self._timer_lock:
+                if self._dirty:
+                    self._arm()
+                else:
+                    self._timer = None
+
+
+def main():
+    from app import static_exporter
+
+    started = time.time()
+    if '--changed' in sys.argv:
+        pages = static_exporter.export_changed()
+        print(f"✅ Regenerated {len(pages)} pages in {time.time() - started:.1f}s")
+        for page in pages:
+            print(f"   {page}")
+    else:
+        count = static_exporter.export_all()
+        print(f"✅ Exported {count} apps to {static_exporter.output_dir} in {time.time() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Request-Scoped Unit of Work
+Routes change the in-memory stores (users_db, activities_db, ...) and mark
+them dirty instead of writing the whole JSON file after every change; each
+dirty store is written once when the request ends. A download that touches
+the user's history and logs an activity, or a follow that logs two
+activities, costs one write per touched file instead of one per change.
+
+Outside a request (CLI, background jobs) marking a store dirty writes it
+right away, as before.
+"""
+
+from flask import g, has_request_context
+
+
+class UnitOfWork:
+    """Collects dirty stores during a request and flushes each one at most once"""
+
+    def __init__(self, app=None):
+        self._writers = {}  # store name -> write function, in registration (flush) order
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.logger = app.logger
+        # after_request hooks run in reverse order of registration, so when this
+        # is set up after MetricsRegistry the writes still count towards the
+        # request's duration and its persist phase
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def store(self, name: str):
+        """Decorator registering the function that writes the store ``name``"""
+        def decorator(write):
+            self._writers[name] = write
+            return write
+        return decorator
+
+    def mark_dirty(self, name: str):
+        if name not in self._writers:
+            raise KeyError(f"Unknown store: {name}")
+        if has_request_context() and not g.get('_uow_closed'):
+            g.setdefault('_dirty_stores', {})[name] = True
+        else:
+            self._writers[name]()
+
+    def flush(self):
+        """Write every store marked dirty in this request"""
+        if not has_request_context():
+            return
+        dirty = g.pop('_dirty_stores', {})
+        error = None
+        for name, write in self._writers.items():
+            if name in dirty:
+                try:
+                    write()
+                except Exception as e:
+                    # Still try the other stores; report the first failure
+                    error = error or e
+        if error is not None:
+            raise error
+
+    def _after_request(self, response):
+        self.flush()
+        return response
+
+    def _teardown_request(self, exc):
+        # A view that raised has still changed the in-memory stores; anything
+        # marked from here on (other teardown hooks) is written immediately
+        g._uow_closed = True
+        try:
+            self.flush()
+        except Exception:
+            self.logger.exception("Failed to write stores at the end of the request")